@@ -17,3 +17,4 @@ from .output_config import (
     set_output_station_attrs,  # noqa
 )  # noqa
 from .default_config import DEFAULT_NEXRAD_RADARS  # noqa
+from .default_config import DEFAULT_DATASTREAM_PREFIX  # noqa
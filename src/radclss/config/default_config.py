@@ -264,6 +264,19 @@ DEFAULT_DISCARD_VAR = {
 
 DEFAULT_NEXRAD_RADARS = {"bnf": "KHTX", "sgp": "KVNX"}
 
+# Define the prefix added to the variables of each datastream in the output.
+# Radars are prefixed with their name (i.e. radar_csapr2 -> csapr2_).
+DEFAULT_DATASTREAM_PREFIX = {
+    "sonde": "sonde_",
+    "nexrad": "nexrad_",
+    "kazr2": "kazr2_",
+    "ld": "ldquants_",
+    "vd": "vdisquants_",
+    "met": None,
+    "pluvio": None,
+    "wxt": None,
+}
+
 
 def set_discarded_variables(instrument, var_list):
     """
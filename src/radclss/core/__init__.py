@@ -9,9 +9,11 @@ This package contains the core functions for RadCLss.
     :toctree: generated/
 
     radclss_core
+    planner
 
 """
 
 from .radclss_core import radclss  # noqa: F401
+from .planner import plan_radclss, compare_plan, calibrate_plan  # noqa: F401
 
-__all__ = ["radclss"]
+__all__ = ["radclss", "plan_radclss", "compare_plan", "calibrate_plan"]
@@ -0,0 +1,373 @@
+import os
+
+import numpy as np
+
+from ..io.header import classify_radar_header
+from ..util.scheduling import FileCostModel
+
+# Prior coefficients of the stages that are not modelled per radar file.
+# Times are in seconds and sizes in MB.
+DEFAULT_PLAN_COEFFICIENTS = {
+    # Download, read and extraction of one NEXRAD volume
+    "nexrad_seconds_per_column": 6.0,
+    # Reading and matching of the in-situ datastreams
+    "insitu_seconds_per_file": 0.2,
+    "insitu_seconds_per_mb": 0.05,
+    # Concatenation, reindexing and merging of the columns
+    "assembly_seconds_per_mb": 0.05,
+    "assembly_seconds": 2.0,
+    # Scheduling overhead of each Dask task
+    "task_overhead_seconds": 0.1,
+    # Time to start a local Dask cluster
+    "cluster_startup_seconds": 5.0,
+    # Peak worker memory relative to the decoded radar volume
+    "worker_memory_factor": 3.0,
+    # Peak client memory relative to the extracted columns, on top of the
+    # memory of the interpreter and its libraries (in bytes)
+    "assembly_memory_factor": 3.0,
+    "client_base_memory": 5e8,
+}
+
+PLAN_STAGES = ["radar_extraction", "nexrad", "assembly", "insitu"]
+
+
+def _file_list(files):
+    if files is None:
+        return []
+    if isinstance(files, str):
+        return [files]
+    return list(files)
+
+
+def _file_size(filename):
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def _available_memory():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().total
+
+
+def plan_radclss(
+    volumes,
+    input_site_dict,
+    time_coords=None,
+    height_bins=np.arange(500, 8500, 250),
+    nexrad=True,
+    cost_model=None,
+    coefficients=None,
+    max_workers=None,
+    memory_limit=None,
+    pack_columns=True,
+    tasks_per_worker=4,
+):
+    """
+    Estimate the time and peak memory of a RadCLss run without reading any
+    radar field, and recommend how to run it.
+
+    Only the radar file headers are read (see
+    :func:`radclss.io.read_radar_header`). The cost of each radar file is
+    estimated with the FileCostModel, and the other stages with the
+    DEFAULT_PLAN_COEFFICIENTS, which can be calibrated against the metrics
+    of previous runs with :func:`calibrate_plan`.
+
+    Parameters
+    ----------
+    volumes : dict
+        Dictionary containing the files of each instrument, as given to
+        :func:`radclss.core.radclss`.
+    input_site_dict : dict
+        Dictionary containing site information for each site being processed.
+    time_coords : str or None, optional
+        The radar key used as the time basis. Its number of volumes sets the
+        number of NEXRAD columns. Set to None to use the radar with the most
+        files. Default is None.
+    height_bins : numpy.ndarray, optional
+        The height bins of the columns. Default is np.arange(500, 8500, 250).
+    nexrad : bool, optional
+        Set to True if the NEXRAD columns are added. Default is True.
+    cost_model : radclss.util.FileCostModel or None, optional
+        Model used to estimate the cost of each radar file. Set to None to
+        use a model with the default coefficients. Default is None.
+    coefficients : dict or None, optional
+        Coefficients of the other stages. Set to None to use
+        DEFAULT_PLAN_COEFFICIENTS. Default is None.
+    max_workers : int or None, optional
+        Maximum number of Dask workers. Set to None to use the number of
+        CPUs. Default is None.
+    memory_limit : int or None, optional
+        Memory in bytes available to the run. Set to None to use the total
+        memory of the machine, if psutil is installed. Default is None.
+    pack_columns : bool, optional
+        Set to True if the columns are packed to their DOD storage dtype,
+        which halves their size. Default is True.
+    tasks_per_worker : int, optional
+        Target number of batches per worker, as in
+        :func:`radclss.util.schedule_files`. Default is 4.
+
+    Returns
+    -------
+    plan : dict
+        The estimate, with the per datastream inputs ('radars', 'insitu'),
+        the estimated seconds of each stage ('stage_seconds'), the estimated
+        total time of a serial and a parallel run ('serial_seconds',
+        'parallel_seconds'), the estimated peak memory of a worker and of
+        the client ('worker_memory', 'client_memory') in bytes, and the
+        'recommendation' of 'serial', 'n_workers', 'batch_volumes',
+        'tasks_per_worker' and 'memory_budget'.
+    """
+    if cost_model is None:
+        cost_model = FileCostModel()
+    coefs = dict(DEFAULT_PLAN_COEFFICIENTS)
+    if coefficients is not None:
+        coefs.update(coefficients)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if memory_limit is None:
+        memory_limit = _available_memory()
+
+    nstations = len(input_site_dict)
+    nbins = len(height_bins)
+    itemsize = 4 if pack_columns else 8
+
+    radars = {}
+    file_costs = []
+    worker_memory = 0
+    column_bytes = 0
+    for k, files in volumes.items():
+        if "radar" not in k:
+            continue
+        files = _file_list(files)
+        costs = []
+        nskipped = 0
+        for nfile in files:
+            header = cost_model.header(nfile)
+            if classify_radar_header(header) in ["rhi", "empty"]:
+                nskipped += 1
+                continue
+            costs.append(cost_model.estimate(header))
+            nrays = header["nrays"] or 0
+            ngates = header["ngates"] or 0
+            nfields = header["nfields"] or 0
+            worker_memory = max(
+                worker_memory,
+                coefs["worker_memory_factor"] * nrays * ngates * nfields * 4,
+            )
+            column_bytes += nstations * nbins * max(nfields, 1) * itemsize
+        radars[k] = {
+            "nfiles": len(files),
+            "nskipped": nskipped,
+            "size_mb": sum(_file_size(x) for x in files) / 1e6,
+            "seconds": float(np.sum(costs)),
+        }
+        file_costs.extend(costs)
+
+    if time_coords is None and len(radars) > 0:
+        time_coords = max(radars, key=lambda x: radars[x]["nfiles"])
+    ntimes = 0
+    if time_coords in radars:
+        ntimes = radars[time_coords]["nfiles"] - radars[time_coords]["nskipped"]
+    nexrad_columns = ntimes if nexrad else 0
+    # NEXRAD columns have a similar number of fields as the radar columns
+    if nexrad_columns > 0 and len(file_costs) > 0:
+        column_bytes += nexrad_columns * column_bytes / len(file_costs)
+
+    insitu = {}
+    for k, files in volumes.items():
+        if k in ["date", "sonde"] or "radar" in k:
+            continue
+        files = _file_list(files)
+        insitu[k] = {
+            "nfiles": len(files),
+            "size_mb": sum(_file_size(x) for x in files) / 1e6,
+        }
+
+    insitu_costs = [
+        coefs["insitu_seconds_per_file"] * x["nfiles"]
+        + coefs["insitu_seconds_per_mb"] * x["size_mb"]
+        for x in insitu.values()
+    ]
+    stage_seconds = {
+        "radar_extraction": float(np.sum(file_costs)),
+        "nexrad": nexrad_columns * coefs["nexrad_seconds_per_column"],
+        "assembly": coefs["assembly_seconds"]
+        + coefs["assembly_seconds_per_mb"] * column_bytes / 1e6,
+        "insitu": sum(insitu_costs),
+    }
+    column_memory = coefs["assembly_memory_factor"] * column_bytes
+    client_memory = coefs["client_base_memory"] + column_memory
+
+    # Largest number of workers that fit in memory and have work to do
+    n_workers = max(1, min(max_workers, len(file_costs) + nexrad_columns))
+    if memory_limit is not None and worker_memory > 0:
+        n_workers = max(
+            1, min(n_workers, int((memory_limit - client_memory) // worker_memory))
+        )
+    serial_seconds = sum(stage_seconds.values())
+    parallel_seconds = _parallel_seconds(
+        file_costs,
+        nexrad_columns,
+        insitu_costs,
+        stage_seconds,
+        coefs,
+        n_workers,
+        tasks_per_worker,
+    )
+    serial = n_workers < 2 or parallel_seconds >= serial_seconds
+
+    # Batching volumes pays off when there are many volumes per parallel
+    # task. A serial run would extract all the volumes of a scan geometry at
+    # once, holding their samples in memory, so it is not batched.
+    nbatches = n_workers * tasks_per_worker
+    batch_volumes = not serial and len(file_costs) >= 2 * nbatches
+
+    # Spill the columns when assembling them could use half of the memory
+    memory_budget = None
+    if memory_limit is not None and client_memory > memory_limit / 2:
+        memory_budget = max(
+            0,
+            int(
+                (memory_limit / 2 - coefs["client_base_memory"])
+                / coefs["assembly_memory_factor"]
+            ),
+        )
+
+    return {
+        "radars": radars,
+        "insitu": insitu,
+        "time_coords": time_coords,
+        "nexrad_columns": nexrad_columns,
+        "nstations": nstations,
+        "nbins": nbins,
+        "stage_seconds": stage_seconds,
+        "serial_seconds": serial_seconds,
+        "parallel_seconds": parallel_seconds,
+        "worker_memory": float(worker_memory),
+        "client_memory": float(client_memory),
+        "memory_limit": memory_limit,
+        "recommendation": {
+            "serial": bool(serial),
+            "n_workers": 1 if serial else int(n_workers),
+            "batch_volumes": bool(batch_volumes),
+            "tasks_per_worker": tasks_per_worker,
+            "memory_budget": memory_budget,
+        },
+    }
+
+
+def _parallel_seconds(
+    file_costs,
+    nexrad_columns,
+    insitu_costs,
+    stage_seconds,
+    coefs,
+    n_workers,
+    tasks_per_worker,
+):
+    # The radar, NEXRAD and in-situ stages are spread over the workers,
+    # bounded by the longest task, the assembly runs on the client
+    ntasks = min(len(file_costs), n_workers * tasks_per_worker)
+    extraction = stage_seconds["radar_extraction"] / n_workers
+    if len(file_costs) > 0:
+        extraction = max(extraction, max(file_costs))
+    extraction += coefs["task_overhead_seconds"] * ntasks / n_workers
+    nexrad = stage_seconds["nexrad"] / n_workers
+    nexrad += coefs["task_overhead_seconds"] * nexrad_columns / n_workers
+    insitu = stage_seconds["insitu"] / n_workers
+    if len(insitu_costs) > 0:
+        insitu = max(insitu, max(insitu_costs))
+    return (
+        coefs["cluster_startup_seconds"]
+        + extraction
+        + nexrad
+        + stage_seconds["assembly"]
+        + insitu
+    )
+
+
+def compare_plan(plan, metrics):
+    """
+    Compare the estimate of a plan with the metrics of the run.
+
+    Parameters
+    ----------
+    plan : dict
+        Plan returned by :func:`plan_radclss`.
+    metrics : dict
+        Metrics populated by :func:`radclss.core.radclss`.
+
+    Returns
+    -------
+    comparison : dict
+        Dictionary with the 'estimated' and 'actual' seconds of each stage
+        and their 'ratio' (actual / estimated), and the same for the total
+        time ('total') and the peak client memory ('client_memory').
+    """
+    comparison = {}
+    actual_stages = metrics.get("stage_seconds", {})
+    estimated_total = (
+        plan["serial_seconds"]
+        if plan["recommendation"]["serial"]
+        else plan["parallel_seconds"]
+    )
+    pairs = {
+        stage: (plan["stage_seconds"][stage], actual_stages.get(stage))
+        for stage in PLAN_STAGES
+    }
+    pairs["total"] = (estimated_total, metrics.get("total_seconds"))
+    pairs["client_memory"] = (plan["client_memory"], metrics.get("peak_memory"))
+    for name, (estimated, actual) in pairs.items():
+        ratio = None
+        if actual is not None and estimated > 0:
+            ratio = actual / estimated
+        comparison[name] = {"estimated": estimated, "actual": actual, "ratio": ratio}
+    return comparison
+
+
+def calibrate_plan(plan, metrics, coefficients=None, weight=0.5):
+    """
+    Calibrate the stage coefficients of the planner from the metrics of a
+    run. The radar extraction is calibrated by the FileCostModel itself,
+    and the memory coefficients are left unchanged since the measured peak
+    memory includes the rest of the process.
+
+    Parameters
+    ----------
+    plan : dict
+        Plan returned by :func:`plan_radclss` for the run.
+    metrics : dict
+        Metrics populated by :func:`radclss.core.radclss` for the run.
+    coefficients : dict or None, optional
+        The coefficients used for the plan. Set to None to use
+        DEFAULT_PLAN_COEFFICIENTS. Default is None.
+    weight : float, optional
+        Weight of the observed run against the previous coefficients,
+        between 0 and 1. Default is 0.5.
+
+    Returns
+    -------
+    coefficients : dict
+        The calibrated coefficients.
+    """
+    coefs = dict(DEFAULT_PLAN_COEFFICIENTS)
+    if coefficients is not None:
+        coefs.update(coefficients)
+    comparison = compare_plan(plan, metrics)
+    scaled = {
+        "nexrad": ["nexrad_seconds_per_column"],
+        "assembly": ["assembly_seconds", "assembly_seconds_per_mb"],
+        "insitu": ["insitu_seconds_per_file", "insitu_seconds_per_mb"],
+    }
+    for name, keys in scaled.items():
+        ratio = comparison[name]["ratio"]
+        if ratio is None:
+            continue
+        for key in keys:
+            coefs[key] *= (1 - weight) + weight * ratio
+    return coefs
@@ -1,14 +1,199 @@
 import logging
+import os
 import time
 import xarray as xr
 import act
 import numpy as np
 import pandas as pd
 
-from ..util.column_utils import subset_points, match_datasets_act, get_nexrad_column
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from ..util.column_utils import (
+    subset_points,
+    subset_points_batch,
+    resample_ground_datasets,
+    prepare_ground_datasets,
+    merge_matched_dataset,
+    get_fill_values,
+    get_nexrad_column,
+)
 from ..config.default_config import DEFAULT_DISCARD_VAR
 from ..config.output_config import get_output_config
-from dask.distributed import Client, as_completed
+from ..util.scheduling import FileCostModel, schedule_files
+from ..util.spill import ColumnStore, enforce_memory_budget
+from ..util.cache import DiskCache
+from ..util.events import ProgressTracker
+from ..util.profiling import RunProfiler
+from ..util.dod_utils import (
+    get_dod_variables,
+    get_read_allowlist,
+    get_dod_encoding,
+    unpack_variables,
+)
+from ..io.header import classify_radar_header
+from ..io.catalog import FileCatalog
+from .planner import plan_radclss, compare_plan
+from dask.distributed import Client, LocalCluster, as_completed
+from dask.utils import parse_bytes
+
+# In-situ instruments matched to the columns, with the key of their variables
+# in discard_var, the resampling method, the prefix of their variables and
+# whether they are always binned onto the radar times (for the multi-GB daily
+# KAZR files, which are reduced in chunks)
+INSITU_MATCH_CONFIG = {
+    "kazr2": {
+        "discard": "kazr2",
+        "resample": "mean",
+        "prefix": "kazr2_",
+        "binned": True,
+    },
+    "met": {"discard": "met", "resample": "mean", "prefix": None, "binned": False},
+    "pluvio": {
+        "discard": "pluvio",
+        "resample": "sum",
+        "prefix": None,
+        "binned": False,
+    },
+    "ld": {
+        "discard": "ldquants",
+        "resample": "mean",
+        "prefix": "ldquants_",
+        "binned": False,
+    },
+    "vd": {
+        "discard": "vdisquants",
+        "resample": "mean",
+        "prefix": "vdisquants_",
+        "binned": False,
+    },
+    "wxt": {"discard": "wxt", "resample": "mean", "prefix": None, "binned": False},
+}
+
+
+def _subset_points_batch(files, batch_volumes=False, **kwargs):
+    """
+    Run subset_points over a batch of radar files, returning a list of
+    (files, column, elapsed seconds, error) tuples so that a failed file
+    does not discard the rest of its batch. With batch_volumes, the whole
+    batch is extracted at once with subset_points_batch, falling back to
+    one file at a time if that fails.
+    """
+    if batch_volumes:
+        start = time.perf_counter()
+        try:
+            result = subset_points_batch(files, **kwargs)
+            return [(files, result, time.perf_counter() - start, None)]
+        except Exception as err:
+            logging.warning(
+                f"Batched extraction failed ({err!r}), processing files one at a time."
+            )
+    out = []
+    for nfile in files:
+        start = time.perf_counter()
+        try:
+            result = subset_points(nfile, **kwargs)
+            error = None
+        except Exception as err:
+            result = None
+            error = repr(err)
+        out.append(([nfile], result, time.perf_counter() - start, error))
+    return out
+
+
+def _peak_memory():
+    """Peak resident memory of the process in bytes, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _files_nbytes(files, cost_model=None):
+    """Total size in bytes of a file or list of files."""
+    if files is None:
+        return 0
+    if isinstance(files, str):
+        files = [files]
+    nbytes = 0
+    for nfile in files:
+        if cost_model is not None:
+            nbytes += cost_model.header(nfile)["size"]
+        elif os.path.exists(nfile):
+            nbytes += os.path.getsize(nfile)
+    return nbytes
+
+
+def _volume_times(columns):
+    """
+    Get the start time of every radar volume of a column store. Columns
+    extracted a batch at a time hold several volumes along time.
+    """
+    times = [
+        np.ravel(x["base_time"].isel(station=0).values)
+        for x in columns
+        if x is not None
+    ]
+    return np.concatenate(times).astype("datetime64[s]")
+
+
+def _check_memory_budget(stores, memory_budget, metrics, verbose=False):
+    """
+    Spill the column stores to disk when the columns held in memory exceed
+    the memory budget, recording the spilled bytes in metrics.
+    """
+    if memory_budget is None:
+        return
+    if sum(store.nbytes for store in stores) <= memory_budget:
+        return
+    spilled = enforce_memory_budget(stores, memory_budget)
+    if spilled > 0:
+        metrics["spilled_bytes"] += spilled
+        if verbose:
+            print(f"  Memory budget exceeded, spilled {spilled / 1e6:.1f} MB to disk")
+
+
+def _set_catalog_headers(volumes, cost_model, catalog):
+    """
+    Set the headers of the radar files recorded in a catalog in the cost
+    model, so that they are not read from the files.
+    """
+    opened = isinstance(catalog, str)
+    if opened:
+        catalog = FileCatalog(catalog)
+    try:
+        for k in volumes.keys():
+            if "radar" not in k:
+                continue
+            for nfile in volumes[k]:
+                header = catalog.header(nfile)
+                if header is not None:
+                    cost_model.set_header(nfile, header)
+    finally:
+        if opened:
+            catalog.close()
+
+
+def _filter_radar_files(files, cost_model, metrics, rad_key, verbose=False):
+    """
+    Drop the radar files whose header shows they cannot produce a column
+    (RHIs and empty scans) before any full read, recording them in metrics.
+    """
+    usable = []
+    scan_types = {}
+    for nfile in files:
+        scan_type = classify_radar_header(cost_model.header(nfile))
+        scan_types[scan_type] = scan_types.get(scan_type, 0) + 1
+        if scan_type in ["rhi", "empty"]:
+            metrics["skipped_files"].setdefault(rad_key, []).append((nfile, scan_type))
+            if verbose:
+                print(f"  Skipping {nfile.split('/')[-1]} ({scan_type})")
+        else:
+            usable.append(nfile)
+    metrics["scan_types"][rad_key] = scan_types
+    return usable
 
 
 def radclss(
@@ -24,6 +209,22 @@ def radclss(
     nexrad=True,
     nexrad_site=None,
     height_bins=np.arange(500, 8500, 250),
+    vertical_method="interp",
+    batch_volumes=False,
+    cost_model=None,
+    metrics=None,
+    use_dod_allowlist=True,
+    pack_columns=True,
+    memory_budget=None,
+    scratch_dir=None,
+    subset_kwargs=None,
+    callbacks=None,
+    profile=None,
+    binned_insitu=False,
+    insitu_cache=None,
+    prefetch_insitu=None,
+    column_cache=None,
+    catalog=None,
 ):
     """
     Extracted Radar Columns and In-Situ Sensors
@@ -57,9 +258,13 @@ def radclss(
         in minutes or seconds. For example "radar_csapr2cmac" will use the CSAPR2 times as
         the time coordinate for all of the data. NEXRAD is currently not supported as a time coordinate, but can be used as a reference for reindexing.
          If the specified time coordinate is not found in the volumes, then an error will be raised.
-    serial : bool, optional
+    serial : bool or str, optional
         Option to denote serial processing. Set to False to use dask cluster for
-        subsetting columns in parallel. Default is True.
+        subsetting columns in parallel. Set to 'auto' to let the planner
+        (see :func:`radclss.core.plan_radclss`) choose between serial and
+        parallel processing, the batching of volumes and the memory budget.
+        In 'auto' mode, a local Dask cluster with the recommended number of
+        workers is started if there is no active Dask client. Default is True.
     dod_version : str, optional
         Option to supply a Data Object Description version to verify standards.
         If this is an empty string, then the latest version will be used. Default is '1.2'.
@@ -80,6 +285,110 @@ def radclss(
     height_bins : numpy.ndarray, optional
         The height bins in meters to provide the column over.
         Default is np.arange(500, 8500, 250).
+    vertical_method : str, optional
+        How the radar and NEXRAD columns are regridded to the height bins.
+        'interp' linearly interpolates between the sweeps. 'mean' and 'max'
+        reduce the sweeps falling in each height bin, which is faster.
+        Default is 'interp'.
+    batch_volumes : bool, optional
+        Set to True to extract the columns of radar volumes that share a scan
+        geometry together (see :func:`radclss.util.subset_points_batch`)
+        instead of one file at a time. In parallel mode, each scheduled
+        batch of files is extracted at once. Default is False.
+    cost_model : radclss.util.FileCostModel or None, optional
+        Model used to estimate the cost of each radar file. In parallel mode,
+        files are submitted longest-first and small files are batched together
+        according to this model. The observed cost of each file is recorded
+        into the model, so reusing the same model across runs improves the
+        schedule. Set to None to use a model with the default coefficients.
+        Default is None.
+    metrics : dict or None, optional
+        If a dictionary is supplied, it is populated with statistics of the run,
+        such as the number of radar files of each scan type ('scan_types'),
+        the radar files skipped by the header pre-filter ('skipped_files'),
+        the seconds spent in each stage ('stage_seconds') and in total
+        ('total_seconds'), the peak memory of the client in bytes
+        ('peak_memory'), the pre-flight estimate of the run ('plan') and its
+        comparison with the run ('plan_comparison', see
+        :func:`radclss.core.compare_plan`). The estimate is only made when
+        metrics are requested or serial is 'auto'. Default is None.
+    use_dod_allowlist : bool, optional
+        Set to True to only read the variables of each datastream that are
+        in the output DOD (with the datastream prefix stripped). Set to False
+        to read every variable that is not in discard_var. Default is True.
+    pack_columns : bool, optional
+        Set to True to pack the radar columns to their storage dtype in the
+        output DOD (float32, or scaled integers) right after extraction, so
+        they stay compact through the concatenation, reindexing and merging.
+        Packed integers are restored to floats when populating the output
+        dataset. Default is True.
+    memory_budget : int, str or None, optional
+        Memory budget for the extracted radar and NEXRAD columns held by the
+        client, in bytes or as a string such as '16GB'. When it is exceeded,
+        the completed columns are spilled to netCDF files in a scratch
+        directory and the final assembly streams them from disk.
+        Set to None to keep all columns in memory. Default is None.
+    scratch_dir : str or None, optional
+        Directory in which the scratch files of spilled columns are written.
+        Set to None to use the system temporary directory. Default is None.
+    subset_kwargs : dict or None, optional
+        Additional keyword arguments passed to
+        :func:`radclss.util.subset_points` for every radar file, such as
+        {'backend': 'xradar', 'file_format': 'cfradial1'}. Default is None.
+    callbacks : list or callable or None, optional
+        Callables receiving the :class:`radclss.util.ProgressEvent` of the
+        run: stage transitions, started, finished and failed tasks, bytes
+        read and the rolling throughput and ETA of each stage. See
+        :class:`radclss.util.ProgressBar` and
+        :class:`radclss.util.JSONLinesWriter` for built-in consumers.
+        Default is None.
+    profile : str or None, optional
+        Path to the output file of the run. If set, the column extraction
+        and assembly are profiled and the summary is saved next to it as
+        '<name>.profile.json' and stored in metrics['profile']. In parallel
+        mode the summary holds the duration and result size of each Dask
+        task, the peak memory of each worker and the time spent in each
+        phase of the workers' extraction tasks, and the Dask performance
+        report is saved as '<name>.profile.html' when Bokeh is installed.
+        In serial mode the run is profiled with cProfile. See
+        :class:`radclss.util.RunProfiler`. Default is None.
+    binned_insitu : bool, optional
+        Set to True to average (or sum) the in-situ samples in the 5 minutes
+        before each radar time in one pass, instead of resampling them to a
+        5 minute grid and interpolating to the radar times. The KAZR is always
+        binned, with its range gates averaged into the height bins. See
+        :func:`radclss.util.resample_ground_datasets`. Default is False.
+    insitu_cache : str, radclss.util.DiskCache or None, optional
+        Directory (or cache) in which the resampled in-situ datasets are
+        cached across runs, keyed by the input files and the matching
+        parameters, so that reruns of a day only redo the interpolation to
+        the radar times. In parallel mode the directory must be reachable
+        by the workers. Set to None to not cache. Default is None.
+    prefetch_insitu : bool or None, optional
+        Set to True to read and resample the in-situ data in the background
+        while the radar columns are extracted, so that STEP 9 only
+        interpolates them to the radar times. In parallel mode they are read
+        on the workers; in serial mode they are read in a background thread,
+        which requires a thread-safe build of HDF5 since Py-ART reads the
+        radar files at the same time. Binned instruments (i.e. the KAZR) are
+        not prefetched. Set to None to prefetch in parallel mode only.
+        Default is None.
+    column_cache : str, radclss.util.DiskCache or None, optional
+        Directory (or cache) in which the extracted radar and NEXRAD columns
+        are cached across runs, keyed by the input files, the nearest
+        radiosonde, the sites, the height bins, the extraction parameters
+        and the library versions. Reprocessing a day that only changes the
+        in-situ or output side (i.e. adding a ground instrument) reuses the
+        columns instead of reading the radar files again. Use a
+        :class:`radclss.util.DiskCache` to set a size limit. In parallel
+        mode the directory must be reachable by the workers. Set to None to
+        not cache. Default is None.
+    catalog : str, radclss.io.FileCatalog or None, optional
+        Catalog (or path to the SQLite database of a catalog) of the input
+        files. The headers of the radar files recorded in the catalog are
+        taken from it instead of opening the files to plan the run and skip
+        RHIs and empty scans. See :meth:`radclss.io.FileCatalog.get_volumes`
+        to build the volumes from a catalog. Default is None.
 
     Returns
     -------
@@ -93,170 +402,143 @@ def radclss(
     if "sonde" not in volumes.keys():
         volumes["sonde"] = None
 
-    if verbose:
-        print("=" * 80)
-        print(f"RadCLss Processing for {volumes['date']}")
-        print("=" * 80)
-        print(f"Start time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Serial mode: {serial}")
-        print(f"NEXRAD enabled: {nexrad}")
-        print(f"Time coordinates: {time_coords}")
-        print(f"Number of sites: {len(input_site_dict)}")
-        print(f"Sites: {list(input_site_dict.keys())}")
-        print(
-            f"Height bins: {len(height_bins)} levels from {height_bins[0]}m to {height_bins[-1]}m"
-        )
-        print("-" * 80)
+    if cost_model is None:
+        cost_model = FileCostModel()
 
-    if "radar" in time_coords:
-        if time_coords not in volumes.keys():
-            raise IndexError(
-                f"{time_coords} is not a valid time basis! Please choose a radar or an "
-                + "Interval"
-            )
-        if verbose:
-            print(f"Using {time_coords} as time basis")
-            print(f"Number of {time_coords} files: {len(volumes[time_coords])}")
-    else:
-        raise NotImplementedError(
-            "Currently, only radar-based time coordinates are supported. Please specify a radar key from the volumes dictionary as the time_coords argument."
-        )
-    # Call Subset Points
-    columns = {}
-    if verbose:
-        print("\n" + "=" * 80)
-        print("STEP 1: Extracting radar columns")
-        print("=" * 80)
+    if catalog is not None:
+        _set_catalog_headers(volumes, cost_model, catalog)
 
-    if not serial:
-        if current_client is None:
-            try:
-                current_client = Client.current()
-            except ValueError:
-                raise RuntimeError(
-                    "No Dask client found. Please start a Dask client before running in parallel mode."
-                )
-        for k in volumes.keys():
-            if "radar" in k:
-                if verbose:
-                    print(f"\nProcessing radar: {k}")
-                    print(f"  Number of files: {len(volumes[k])}")
-                    print(f"  Submitting {len(volumes[k])} tasks to dask cluster...")
-                columns[k] = []
-                results = current_client.map(
-                    subset_points,
-                    volumes[k],
-                    sonde=volumes["sonde"],
-                    input_site_dict=input_site_dict,
-                    height_bins=height_bins,
-                    rad_key=k,
-                )
+    if subset_kwargs is None:
+        subset_kwargs = {}
 
-                successful_count = 0
-                failed_count = 0
-                for done_work in as_completed(results, with_results=False):
-                    try:
-                        columns[k].append(done_work.result())
-                        successful_count += 1
-                        if verbose and successful_count % 10 == 0:
-                            print(
-                                f"  Completed {successful_count}/{len(volumes[k])} files..."
-                            )
-                    except Exception:
-                        failed_count += 1
-                        if verbose:
-                            print(
-                                f"  ERROR processing file (total failures: {failed_count})"
-                            )
+    # The plan is only estimated in auto mode or when it is reported
+    plan_requested = metrics is not None
+    if metrics is None:
+        metrics = {}
+    metrics.update(scan_types={}, skipped_files={}, spilled_bytes=0, stage_seconds={})
+    run_start = time.perf_counter()
+    tracker = ProgressTracker(callbacks)
 
-                if verbose:
-                    print(
-                        f"  Finished {k}: {successful_count} successful, {failed_count} failed"
+    output_config = get_output_config()
+    output_platform = output_config["platform"]
+    output_level = output_config["level"]
+
+    # Derive the variables to read and the storage dtypes of each datastream
+    # from the output DOD
+    read_allowlist = {}
+    dod_encoding = {}
+    output_encoding = None
+    if use_dod_allowlist or pack_columns:
+        try:
+            dod_variables = get_dod_variables(
+                f"{output_platform}.{output_level}", dod_version
+            )
+        except OSError as error:
+            logging.warning(
+                f"Unable to get the DOD for {output_platform}.{output_level}, "
+                + f"reading all variables: {error}"
+            )
+        else:
+            for k in list(volumes.keys()) + ["nexrad"]:
+                if k == "date":
+                    continue
+                if use_dod_allowlist:
+                    read_allowlist[k] = get_read_allowlist(
+                        dod_variables, k, required=["alt"] if k == "sonde" else None
                     )
-    else:
-        for k in volumes.keys():
-            if "radar" in k:
-                if verbose:
-                    print(f"\nProcessing radar: {k}")
-                    print(f"  Number of files: {len(volumes[k])}")
-                columns[k] = []
-                file_count = 0
-                for rad in volumes[k]:
-                    file_count += 1
-                    if verbose:
-                        print(
-                            f"  [{file_count}/{len(volumes[k])}] Processing: {rad.split('/')[-1]}"
+                if pack_columns:
+                    dod_encoding[k] = get_dod_encoding(dod_variables, k)
+            if pack_columns:
+                output_encoding = get_dod_encoding(dod_variables)
+
+    # Estimate the cost of the run from the file headers, and let the
+    # estimate pick the execution strategy in auto mode
+    plan = None
+    schedule_options = {}
+    if serial == "auto" or plan_requested:
+        plan = plan_radclss(
+            volumes,
+            input_site_dict,
+            time_coords=time_coords,
+            height_bins=height_bins,
+            nexrad=nexrad,
+            cost_model=cost_model,
+            pack_columns=pack_columns,
+        )
+        metrics["plan"] = plan
+        schedule_options["tasks_per_worker"] = plan["recommendation"][
+            "tasks_per_worker"
+        ]
+    # The cluster started in auto mode is closed even if the run fails
+    with ExitStack() as cluster_stack:
+        if serial == "auto":
+            recommendation = plan["recommendation"]
+            serial = recommendation["serial"]
+            batch_volumes = batch_volumes or recommendation["batch_volumes"]
+            if memory_budget is None:
+                memory_budget = recommendation["memory_budget"]
+            if not serial and current_client is None:
+                try:
+                    current_client = Client.current()
+                except ValueError:
+                    local_cluster = cluster_stack.enter_context(
+                        LocalCluster(
+                            n_workers=recommendation["n_workers"], threads_per_worker=1
                         )
-                    result = subset_points(
-                        rad,
-                        sonde=volumes["sonde"],
-                        input_site_dict=input_site_dict,
-                        height_bins=height_bins,
-                        rad_key=k,
-                    )
-                    columns[k].append(result)
-                    if verbose:
-                        if result is not None:
-                            print(
-                                f"    ✓ Success - extracted {result.dims.get('time', 0)} time steps"
-                            )
-                        else:
-                            print("    ✗ Failed - no data extracted")
-
-                if verbose:
-                    successful = sum(1 for c in columns[k] if c is not None)
-                    print(
-                        f"  Finished {k}: {successful}/{len(columns[k])} successful extractions"
                     )
-
-    # Assemble individual columns into single DataSet
-    # try:
-    # Concatenate all extracted columns across time dimension to form daily timeseries
-
-    if verbose:
-        print("\n" + "=" * 80)
-        print("STEP 2: Assembling columns and determining time range")
-        print("=" * 80)
-
-    output_config = get_output_config()
-    nexrad_columns = []
-    min_times = {}
-    max_times = {}
-    for k in columns.keys():
-        if "radar" in k and len(columns[k]) > 0:
-            times = np.array([x["base_time"].values[0] for x in columns[k]])
-            min_times[k] = np.min(times)
-            max_times[k] = np.max(times)
+                    current_client = cluster_stack.enter_context(Client(local_cluster))
             if verbose:
-                print(f"  {k}: {len(columns[k])} columns")
-                print(f"    Time range: {min_times[k]} to {max_times[k]}")
-
-    min_time = min(np.array([x for x in min_times.values()]))
-    max_time = max(np.array([x for x in max_times.values()]))
-
-    if verbose:
-        print(f"\nOverall time range: {min_time} to {max_time}")
+                print(
+                    f"Planner estimate: {plan['serial_seconds']:.0f} s serial, "
+                    + f"{plan['parallel_seconds']:.0f} s parallel, "
+                    + f"{plan['client_memory'] / 1e6:.0f} MB of columns"
+                )
+        if isinstance(memory_budget, str):
+            memory_budget = parse_bytes(memory_budget)
 
-    if nexrad:
         if verbose:
-            print("\n" + "=" * 80)
-            print("STEP 3: Fetching NEXRAD data")
             print("=" * 80)
+            print(f"RadCLss Processing for {volumes['date']}")
+            print("=" * 80)
+            print(f"Start time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"Serial mode: {serial}")
+            print(f"NEXRAD enabled: {nexrad}")
+            print(f"Time coordinates: {time_coords}")
+            print(f"Number of sites: {len(input_site_dict)}")
+            print(f"Sites: {list(input_site_dict.keys())}")
             print(
-                f"  NEXRAD site: {nexrad_site if nexrad_site else 'auto-detect from ARM site'}"
+                f"Height bins: {len(height_bins)} levels from {height_bins[0]}m to {height_bins[-1]}m"
             )
+            print("-" * 80)
 
         if "radar" in time_coords:
-            time_list = sorted(
-                [
-                    str(x["base_time"].dt.strftime("%Y-%m-%dT%H:%M:%S").values[0])
-                    for x in columns[time_coords]
-                ]
+            if time_coords not in volumes.keys():
+                raise IndexError(
+                    f"{time_coords} is not a valid time basis! Please choose a radar or an "
+                    + "Interval"
+                )
+            if verbose:
+                print(f"Using {time_coords} as time basis")
+                print(f"Number of {time_coords} files: {len(volumes[time_coords])}")
+        else:
+            raise NotImplementedError(
+                "Currently, only radar-based time coordinates are supported. Please specify a radar key from the volumes dictionary as the time_coords argument."
             )
-
+        # Call Subset Points
+        columns = {}
+        stage_start = time.perf_counter()
         if verbose:
-            print(f"  Number of NEXRAD time steps to fetch: {len(time_list)}")
-            print(f"  Time list: {time_list[0]} to {time_list[-1]}")
+            print("\n" + "=" * 80)
+            print("STEP 1: Extracting radar columns")
+            print("=" * 80)
+
+        # Skip RHIs and empty scans using only the file headers
+        radar_files = {}
+        for k in volumes.keys():
+            if "radar" in k:
+                radar_files[k] = _filter_radar_files(
+                    volumes[k], cost_model, metrics, k, verbose=verbose
+                )
 
         if not serial:
             if current_client is None:
@@ -266,464 +548,937 @@ def radclss(
                     raise RuntimeError(
                         "No Dask client found. Please start a Dask client before running in parallel mode."
                     )
-            if verbose:
-                print(f"  Submitting {len(time_list)} NEXRAD tasks to dask cluster...")
-
-            def _get_nexrad_wrapper(time_str):
-                return get_nexrad_column(
-                    time_str,
-                    output_config["site"],
-                    input_site_dict,
-                    nexrad_radar=nexrad_site,
+            n_workers = max(1, len(current_client.scheduler_info()["workers"]))
+
+        # The profiler and the background reader are closed even if the run
+        # fails
+        with ExitStack() as stack:
+            profiler = None
+            if profile is not None:
+                profiler = stack.enter_context(
+                    RunProfiler(profile, client=None if serial else current_client)
                 )
 
-            results = current_client.map(_get_nexrad_wrapper, time_list)
+            # Group the in-situ datastreams of each instrument over the sites, so
+            # that each instrument is read, resampled and written at once
+            insitu_groups = {}
+            for k in volumes.keys():
+                if k == "sonde":
+                    continue
+                if len(volumes[k]) == 0:
+                    if verbose:
+                        print(f"No files found for instrument/site: {k}")
+                    continue
+                if "_" in k:
+                    instrument, site = k.split("_", 1)
+                else:
+                    instrument = k
+                    site = base_station
+                if instrument not in INSITU_MATCH_CONFIG:
+                    continue
+                group = insitu_groups.setdefault(
+                    instrument, {"keys": [], "grounds": {}, "keep_variables": {}}
+                )
+                group["keys"].append(k)
+                group["grounds"][site.upper()] = volumes[k]
+                group["keep_variables"][site.upper()] = read_allowlist.get(k)
+
+            if isinstance(insitu_cache, str):
+                insitu_cache = DiskCache(insitu_cache)
+            if isinstance(column_cache, str):
+                column_cache = DiskCache(column_cache)
+            if prefetch_insitu is None:
+                prefetch_insitu = not serial
+            # The resampled grids of the in-situ instruments do not depend on the
+            # radar times, so they are read while the columns are extracted and only
+            # interpolated to the radar times in STEP 9. Binned instruments need the
+            # radar times and are matched in STEP 9.
+            prefetched = {}
+            prefetch_executor = None
+            if prefetch_insitu:
+                heights = xr.DataArray(height_bins, dims="height")
+                for instrument, group in insitu_groups.items():
+                    config = INSITU_MATCH_CONFIG[instrument]
+                    if binned_insitu or config["binned"]:
+                        continue
+                    prepare_args = (
+                        group["grounds"],
+                        heights,
+                        discard_var[config["discard"]],
+                    )
+                    prepare_kwargs = dict(
+                        resample=config["resample"],
+                        prefix=config["prefix"],
+                        keep_variables=group["keep_variables"],
+                        cache=insitu_cache,
+                    )
+                    if serial:
+                        if prefetch_executor is None:
+                            prefetch_executor = stack.enter_context(
+                                ThreadPoolExecutor(max_workers=1)
+                            )
+                        prefetched[instrument] = prefetch_executor.submit(
+                            prepare_ground_datasets, *prepare_args, **prepare_kwargs
+                        )
+                    else:
+                        prefetched[instrument] = current_client.submit(
+                            prepare_ground_datasets,
+                            *prepare_args,
+                            pure=False,
+                            **prepare_kwargs,
+                        )
+                if verbose and prefetched:
+                    print(f"Reading in-situ data in the background: {list(prefetched)}")
 
-            successful_count = 0
-            failed_count = 0
-            for done_work in as_completed(results, with_results=False):
-                try:
-                    nexrad_columns.append(done_work.result())
-                    successful_count += 1
-                    if verbose and successful_count % 5 == 0:
-                        print(
-                            f"  Completed {successful_count}/{len(time_list)} NEXRAD columns..."
+            if not serial:
+                for k in volumes.keys():
+                    if "radar" in k:
+                        if verbose:
+                            print(f"\nProcessing radar: {k}")
+                            print(f"  Number of files: {len(radar_files[k])}")
+                            print(
+                                f"  Submitting {len(radar_files[k])} tasks to dask cluster..."
+                            )
+                        columns[k] = ColumnStore(scratch_dir=scratch_dir)
+                        batches = schedule_files(
+                            radar_files[k], n_workers, cost_model, **schedule_options
                         )
-                except Exception as error:
-                    failed_count += 1
-                    if verbose:
-                        print(
-                            f"  ERROR fetching NEXRAD data (total failures: {failed_count})"
+                        if verbose:
+                            print(
+                                f"  Scheduled into {len(batches)} batches (largest first)"
+                            )
+                        tracker.stage_started(
+                            "radar_extraction", total=len(radar_files[k]), key=k
+                        )
+                        for batch in batches:
+                            tracker.task_started(
+                                "radar_extraction", batch[0].split("/")[-1], key=k
+                            )
+                        results = current_client.map(
+                            _subset_points_batch,
+                            batches,
+                            sonde=volumes["sonde"],
+                            input_site_dict=input_site_dict,
+                            height_bins=height_bins,
+                            vertical_method=vertical_method,
+                            rad_key=k,
+                            include_fields=read_allowlist.get(k),
+                            sonde_fields=read_allowlist.get("sonde"),
+                            dod_encoding=dod_encoding.get(k),
+                            batch_volumes=batch_volumes,
+                            cache=column_cache,
+                            **subset_kwargs,
                         )
-                    logging.exception(error)
+
+                        successful_count = 0
+                        failed_count = 0
+                        for done_work in as_completed(results, with_results=False):
+                            try:
+                                batch_results = done_work.result()
+                            except Exception as error:
+                                failed_count += 1
+                                tracker.task_failed(
+                                    "radar_extraction", None, key=k, error=error
+                                )
+                                if verbose:
+                                    print(
+                                        f"  ERROR processing batch (total failures: {failed_count})"
+                                    )
+                                continue
+                            for batch_files, result, elapsed, error in batch_results:
+                                if error is not None:
+                                    failed_count += 1
+                                    tracker.task_failed(
+                                        "radar_extraction",
+                                        batch_files[0].split("/")[-1],
+                                        key=k,
+                                        error=error,
+                                        count=len(batch_files),
+                                    )
+                                    if verbose:
+                                        print(
+                                            f"  ERROR processing file (total failures: {failed_count})"
+                                        )
+                                    continue
+                                for nfile in batch_files:
+                                    cost_model.record(nfile, elapsed / len(batch_files))
+                                columns[k].append(result)
+                                _check_memory_budget(
+                                    list(columns.values()),
+                                    memory_budget,
+                                    metrics,
+                                    verbose,
+                                )
+                                tracker.task_finished(
+                                    "radar_extraction",
+                                    batch_files[0].split("/")[-1],
+                                    key=k,
+                                    elapsed=elapsed,
+                                    nbytes=_files_nbytes(batch_files, cost_model),
+                                    count=len(batch_files),
+                                )
+                                successful_count += len(batch_files)
+                                if verbose and successful_count % 10 == 0:
+                                    print(
+                                        f"  Completed {successful_count}/{len(radar_files[k])} files..."
+                                    )
+
+                        tracker.stage_finished("radar_extraction", key=k)
+                        if verbose:
+                            print(
+                                f"  Finished {k}: {successful_count} successful, {failed_count} failed"
+                            )
+            else:
+                for k in volumes.keys():
+                    if "radar" in k:
+                        if verbose:
+                            print(f"\nProcessing radar: {k}")
+                            print(f"  Number of files: {len(radar_files[k])}")
+                        columns[k] = ColumnStore(scratch_dir=scratch_dir)
+                        tracker.stage_started(
+                            "radar_extraction", total=len(radar_files[k]), key=k
+                        )
+                        if batch_volumes:
+                            batch_results = _subset_points_batch(
+                                radar_files[k],
+                                batch_volumes=True,
+                                sonde=volumes["sonde"],
+                                input_site_dict=input_site_dict,
+                                height_bins=height_bins,
+                                vertical_method=vertical_method,
+                                rad_key=k,
+                                include_fields=read_allowlist.get(k),
+                                sonde_fields=read_allowlist.get("sonde"),
+                                dod_encoding=dod_encoding.get(k),
+                                cache=column_cache,
+                                **subset_kwargs,
+                            )
+                            for batch_files, result, elapsed, error in batch_results:
+                                if error is not None:
+                                    logging.warning(f"{batch_files[0]} failed: {error}")
+                                    tracker.task_failed(
+                                        "radar_extraction",
+                                        batch_files[0].split("/")[-1],
+                                        key=k,
+                                        error=error,
+                                        count=len(batch_files),
+                                    )
+                                    continue
+                                for nfile in batch_files:
+                                    cost_model.record(nfile, elapsed / len(batch_files))
+                                columns[k].append(result)
+                                _check_memory_budget(
+                                    list(columns.values()),
+                                    memory_budget,
+                                    metrics,
+                                    verbose,
+                                )
+                                tracker.task_finished(
+                                    "radar_extraction",
+                                    batch_files[0].split("/")[-1],
+                                    key=k,
+                                    elapsed=elapsed,
+                                    nbytes=_files_nbytes(batch_files, cost_model),
+                                    count=len(batch_files),
+                                )
+                            tracker.stage_finished("radar_extraction", key=k)
+                            if verbose:
+                                print(
+                                    f"  Finished {k}: batched extraction of {len(radar_files[k])} files"
+                                )
+                            continue
+                        file_count = 0
+                        for rad in radar_files[k]:
+                            file_count += 1
+                            if verbose:
+                                print(
+                                    f"  [{file_count}/{len(radar_files[k])}] Processing: {rad.split('/')[-1]}"
+                                )
+                            tracker.task_started(
+                                "radar_extraction", rad.split("/")[-1], key=k
+                            )
+                            start = time.perf_counter()
+                            result = subset_points(
+                                rad,
+                                sonde=volumes["sonde"],
+                                input_site_dict=input_site_dict,
+                                height_bins=height_bins,
+                                vertical_method=vertical_method,
+                                rad_key=k,
+                                include_fields=read_allowlist.get(k),
+                                sonde_fields=read_allowlist.get("sonde"),
+                                dod_encoding=dod_encoding.get(k),
+                                cache=column_cache,
+                                **subset_kwargs,
+                            )
+                            elapsed = time.perf_counter() - start
+                            cost_model.record(rad, elapsed)
+                            columns[k].append(result)
+                            _check_memory_budget(
+                                list(columns.values()), memory_budget, metrics, verbose
+                            )
+                            if result is not None:
+                                tracker.task_finished(
+                                    "radar_extraction",
+                                    rad.split("/")[-1],
+                                    key=k,
+                                    elapsed=elapsed,
+                                    nbytes=_files_nbytes(rad, cost_model),
+                                )
+                            else:
+                                tracker.task_failed(
+                                    "radar_extraction", rad.split("/")[-1], key=k
+                                )
+                            if verbose:
+                                if result is not None:
+                                    print(
+                                        f"    ✓ Success - extracted {result.dims.get('time', 0)} time steps"
+                                    )
+                                else:
+                                    print("    ✗ Failed - no data extracted")
+
+                        tracker.stage_finished("radar_extraction", key=k)
+                        if verbose:
+                            successful = sum(1 for c in columns[k] if c is not None)
+                            print(
+                                f"  Finished {k}: {successful}/{len(columns[k])} successful extractions"
+                            )
+
+            metrics["stage_seconds"]["radar_extraction"] = (
+                time.perf_counter() - stage_start
+            )
+            stage_start = time.perf_counter()
+
+            # Assemble individual columns into single DataSet
+            # try:
+            # Concatenate all extracted columns across time dimension to form daily timeseries
 
             if verbose:
-                print(
-                    f"  Finished NEXRAD: {successful_count} successful, {failed_count} failed"
-                )
-        else:
+                print("\n" + "=" * 80)
+                print("STEP 2: Assembling columns and determining time range")
+                print("=" * 80)
+
+            nexrad_columns = ColumnStore(scratch_dir=scratch_dir)
+            nexrad_store = nexrad_columns
+            min_times = {}
+            max_times = {}
+            for k in columns.keys():
+                if "radar" in k and len(columns[k]) > 0:
+                    times = _volume_times(columns[k])
+                    min_times[k] = np.min(times)
+                    max_times[k] = np.max(times)
+                    if verbose:
+                        print(f"  {k}: {len(columns[k])} columns")
+                        print(f"    Time range: {min_times[k]} to {max_times[k]}")
+
+            min_time = min(np.array([x for x in min_times.values()]))
+            max_time = max(np.array([x for x in max_times.values()]))
+
             if verbose:
-                print("  Processing NEXRAD columns in serial mode...")
-            for i, time_str in enumerate(time_list, 1):
-                if verbose and i % 5 == 0:
-                    print(f"  [{i}/{len(time_list)}] Fetching NEXRAD for {time_str}")
-                nexrad_columns.append(
-                    get_nexrad_column(
-                        time_str,
-                        output_config["site"],
-                        input_site_dict,
+                print(f"\nOverall time range: {min_time} to {max_time}")
+
+            if nexrad:
+                nexrad_start = time.perf_counter()
+                if verbose:
+                    print("\n" + "=" * 80)
+                    print("STEP 3: Fetching NEXRAD data")
+                    print("=" * 80)
+                    print(
+                        f"  NEXRAD site: {nexrad_site if nexrad_site else 'auto-detect from ARM site'}"
                     )
-                )
 
-        if verbose:
-            valid_nexrad = sum(1 for x in nexrad_columns if x is not None)
-            print(f"  Concatenating {valid_nexrad} valid NEXRAD columns...")
+                if "radar" in time_coords:
+                    time_list = sorted(
+                        np.datetime_as_string(
+                            _volume_times(columns[time_coords]), unit="s"
+                        )
+                    )
 
-        nexrad_columns = xr.concat(
-            [data for data in nexrad_columns if data], dim="time"
-        )
-    else:
-        nexrad_columns = None
+                tracker.stage_started("nexrad", total=len(time_list))
+                if verbose:
+                    print(f"  Number of NEXRAD time steps to fetch: {len(time_list)}")
+                    print(f"  Time list: {time_list[0]} to {time_list[-1]}")
+
+                if not serial:
+                    if current_client is None:
+                        try:
+                            current_client = Client.current()
+                        except ValueError:
+                            raise RuntimeError(
+                                "No Dask client found. Please start a Dask client before running in parallel mode."
+                            )
+                    if verbose:
+                        print(
+                            f"  Submitting {len(time_list)} NEXRAD tasks to dask cluster..."
+                        )
 
-    if verbose:
-        print("\n" + "=" * 80)
-        print("STEP 4: Concatenating and processing time coordinates")
-        print("=" * 80)
+                    def _get_nexrad_wrapper(time_str):
+                        return get_nexrad_column(
+                            time_str,
+                            output_config["site"],
+                            input_site_dict,
+                            nexrad_radar=nexrad_site,
+                            include_fields=read_allowlist.get("nexrad"),
+                            vertical_method=vertical_method,
+                            dod_encoding=dod_encoding.get("nexrad"),
+                            cache=column_cache,
+                        )
 
-    output_platform = output_config["platform"]
-    output_level = output_config["level"]
+                    results = current_client.map(_get_nexrad_wrapper, time_list)
+                    result_times = dict(zip(results, time_list))
+                    for time_str in time_list:
+                        tracker.task_started("nexrad", time_str)
+
+                    successful_count = 0
+                    failed_count = 0
+                    for done_work in as_completed(results, with_results=False):
+                        try:
+                            nexrad_columns.append(done_work.result())
+                            _check_memory_budget(
+                                list(columns.values()) + [nexrad_store],
+                                memory_budget,
+                                metrics,
+                                verbose,
+                            )
+                            tracker.task_finished("nexrad", result_times[done_work])
+                            successful_count += 1
+                            if verbose and successful_count % 5 == 0:
+                                print(
+                                    f"  Completed {successful_count}/{len(time_list)} NEXRAD columns..."
+                                )
+                        except Exception as error:
+                            failed_count += 1
+                            tracker.task_failed(
+                                "nexrad", result_times[done_work], error=error
+                            )
+                            if verbose:
+                                print(
+                                    f"  ERROR fetching NEXRAD data (total failures: {failed_count})"
+                                )
+                            logging.exception(error)
 
-    # Convert time variables to something xarray understands
-    ds_concat = {}
-    for k in columns.keys():
-        if verbose:
-            print(f"  Processing {k}...")
-        ds_concat[k] = xr.concat([data for data in columns[k] if data], dim="time")
-        if verbose:
-            print(
-                f"    Concatenated dimensions: time={ds_concat[k].dims['time']}, station={ds_concat[k].dims['station']}, height={ds_concat[k].dims['height']}"
-            )
-        ds_concat[k]["time"] = ds_concat[k].sel(station=base_station).base_time
-        ds_concat[k]["base_time"] = (
-            ds_concat[k].sel(station=base_station).isel(time=0).base_time
-        )
-        ds_concat[k] = ds_concat[k].sortby("time")
+                    if verbose:
+                        print(
+                            f"  Finished NEXRAD: {successful_count} successful, {failed_count} failed"
+                        )
+                else:
+                    if verbose:
+                        print("  Processing NEXRAD columns in serial mode...")
+                    for i, time_str in enumerate(time_list, 1):
+                        if verbose and i % 5 == 0:
+                            print(
+                                f"  [{i}/{len(time_list)}] Fetching NEXRAD for {time_str}"
+                            )
+                        tracker.task_started("nexrad", time_str)
+                        start = time.perf_counter()
+                        nexrad_columns.append(
+                            get_nexrad_column(
+                                time_str,
+                                output_config["site"],
+                                input_site_dict,
+                                include_fields=read_allowlist.get("nexrad"),
+                                vertical_method=vertical_method,
+                                dod_encoding=dod_encoding.get("nexrad"),
+                                cache=column_cache,
+                            )
+                        )
+                        tracker.task_finished(
+                            "nexrad", time_str, elapsed=time.perf_counter() - start
+                        )
+                        _check_memory_budget(
+                            list(columns.values()) + [nexrad_store],
+                            memory_budget,
+                            metrics,
+                            verbose,
+                        )
 
-    if nexrad:
-        if verbose:
-            print("  Processing NEXRAD columns...")
-            print(
-                f"    NEXRAD dimensions: time={nexrad_columns.dims['time']}, station={nexrad_columns.dims['station']}, height={nexrad_columns.dims['height']}"
-            )
-        nexrad_columns["time"] = nexrad_columns.sel(station=base_station).base_time
-        nexrad_columns["base_time"] = (
-            nexrad_columns.sel(station=base_station).isel(time=0).base_time
-        )
-        nexrad_columns = nexrad_columns.sortby("time")
-        nexrad_columns = nexrad_columns.drop_duplicates(dim="time")
-        if verbose:
-            print(
-                f"    After removing duplicates: {nexrad_columns.dims['time']} time steps"
-            )
+                if verbose:
+                    valid_nexrad = sum(1 for x in nexrad_columns if x is not None)
+                    print(f"  Concatenating {valid_nexrad} valid NEXRAD columns...")
 
-    # Do the time resampling
-    if verbose:
-        print("\n" + "=" * 80)
-        print("STEP 5: Time resampling and alignment")
-        print("=" * 80)
-        print(f"  Time coordinate method: {time_coords}")
+                nexrad_columns = nexrad_columns.concat("time")
+                metrics["stage_seconds"]["nexrad"] = time.perf_counter() - nexrad_start
+                tracker.stage_finished("nexrad")
+            else:
+                nexrad_columns = None
+                metrics["stage_seconds"]["nexrad"] = 0.0
 
-    if "radar" in time_coords:
-        if verbose:
-            print(f"  Reindexing all datasets to {time_coords} time coordinates")
-            print(f"    Reference time steps: {len(ds_concat[time_coords]['time'])}")
-        for k in ds_concat.keys():
-            if not k == time_coords:
+            tracker.stage_started("assembly")
+            if verbose:
+                print("\n" + "=" * 80)
+                print("STEP 4: Concatenating and processing time coordinates")
+                print("=" * 80)
+
+            # Convert time variables to something xarray understands
+            ds_concat = {}
+            for k in columns.keys():
                 if verbose:
-                    print(f"    Reindexing {k}...")
-                ds_concat[k] = ds_concat[k].reindex(
-                    time=ds_concat[time_coords]["time"], method="nearest"
+                    print(f"  Processing {k}...")
+                ds_concat[k] = columns[k].concat("time")
+                if verbose:
+                    print(
+                        f"    Concatenated dimensions: time={ds_concat[k].dims['time']}, station={ds_concat[k].dims['station']}, height={ds_concat[k].dims['height']}"
+                    )
+                ds_concat[k]["time"] = ds_concat[k].sel(station=base_station).base_time
+                ds_concat[k]["base_time"] = (
+                    ds_concat[k].sel(station=base_station).isel(time=0).base_time
                 )
+                ds_concat[k] = ds_concat[k].sortby("time")
 
-        if nexrad:
-            if verbose:
-                print("    Reindexing NEXRAD columns...")
-            nexrad_columns = nexrad_columns.reindex(
-                time=ds_concat[time_coords]["time"], method="nearest"
-            )
-    elif time_coords.lower() == "nexrad":
-        if verbose:
-            print("  Reindexing all datasets to NEXRAD time coordinates")
-            print(f"    Reference time steps: {len(nexrad_columns['time'])}")
-        for k in ds_concat.keys():
-            if verbose:
-                print(f"    Reindexing {k}...")
-            ds_concat[k] = ds_concat[k].reindex(
-                time=nexrad_columns["time"], method="nearest"
-            )
-    else:
-        if verbose:
-            print(f"  Resampling to {time_coords} intervals")
-        for k in ds_concat.keys():
-            ds_concat[k] = ds_concat[k].resample(time=time_coords)
-        if nexrad:
-            nexrad_columns = nexrad_columns.resample(time=time_coords)
-
-        # Then, reindex to the largest of the time arrays
-        new_coordinates = pd.date_range(min_time, max_time, time_coords)
-        if verbose:
-            print(f"    Creating new time grid: {len(new_coordinates)} time steps")
-        for k in ds_concat.keys():
-            ds_concat[k] = ds_concat[k].reindex(time=new_coordinates)
-        if nexrad:
-            nexrad_columns = nexrad_columns.reindex(time=new_coordinates)
+            if nexrad:
+                if verbose:
+                    print("  Processing NEXRAD columns...")
+                    print(
+                        f"    NEXRAD dimensions: time={nexrad_columns.dims['time']}, station={nexrad_columns.dims['station']}, height={nexrad_columns.dims['height']}"
+                    )
+                nexrad_columns["time"] = nexrad_columns.sel(
+                    station=base_station
+                ).base_time
+                nexrad_columns["base_time"] = (
+                    nexrad_columns.sel(station=base_station).isel(time=0).base_time
+                )
+                nexrad_columns = nexrad_columns.sortby("time")
+                nexrad_columns = nexrad_columns.drop_duplicates(dim="time")
+                if verbose:
+                    print(
+                        f"    After removing duplicates: {nexrad_columns.dims['time']} time steps"
+                    )
 
-    # Rename all variables according to their radar name
-    if verbose:
-        print("\n" + "=" * 80)
-        print("STEP 6: Renaming variables and merging datasets")
-        print("=" * 80)
+            # Do the time resampling
+            if verbose:
+                print("\n" + "=" * 80)
+                print("STEP 5: Time resampling and alignment")
+                print("=" * 80)
+                print(f"  Time coordinate method: {time_coords}")
 
-    for k in ds_concat.keys():
-        radar_name = k.split("_")[1:]
-        if verbose:
-            print(f"  Renaming {k} variables with prefix: {'_'.join(radar_name)}_")
-        for var in ds_concat[k].data_vars:
-            if var not in [
-                "time",
-                "time_offset",
-                "base_time",
-                "height",
-                "lat",
-                "lon",
-                "alt",
-                "latitude",
-                "longitude",
-            ]:
-                if "sonde_" not in var:
-                    ds_concat[k] = ds_concat[k].rename_vars(
-                        {var: f"{radar_name[0]}_{var}"}
+            if "radar" in time_coords:
+                if verbose:
+                    print(
+                        f"  Reindexing all datasets to {time_coords} time coordinates"
                     )
+                    print(
+                        f"    Reference time steps: {len(ds_concat[time_coords]['time'])}"
+                    )
+                for k in ds_concat.keys():
+                    if not k == time_coords:
+                        if verbose:
+                            print(f"    Reindexing {k}...")
+                        ds_concat[k] = ds_concat[k].reindex(
+                            time=ds_concat[time_coords]["time"], method="nearest"
+                        )
 
-    if nexrad_columns is not None:
-        if verbose:
-            print("  Renaming NEXRAD variables with prefix: nexrad_")
-        for var in nexrad_columns.data_vars:
-            if var not in [
-                "time",
-                "time_offset",
-                "base_time",
-                "height",
-                "lat",
-                "lon",
-                "alt",
-                "latitude",
-                "longitude",
-            ]:
-                if "sonde_" not in var:
-                    nexrad_columns = nexrad_columns.rename_vars({var: f"nexrad_{var}"})
+                if nexrad:
+                    if verbose:
+                        print("    Reindexing NEXRAD columns...")
+                    nexrad_columns = nexrad_columns.reindex(
+                        time=ds_concat[time_coords]["time"], method="nearest"
+                    )
+            elif time_coords.lower() == "nexrad":
+                if verbose:
+                    print("  Reindexing all datasets to NEXRAD time coordinates")
+                    print(f"    Reference time steps: {len(nexrad_columns['time'])}")
+                for k in ds_concat.keys():
+                    if verbose:
+                        print(f"    Reindexing {k}...")
+                    ds_concat[k] = ds_concat[k].reindex(
+                        time=nexrad_columns["time"], method="nearest"
+                    )
+            else:
+                if verbose:
+                    print(f"  Resampling to {time_coords} intervals")
+                for k in ds_concat.keys():
+                    ds_concat[k] = ds_concat[k].resample(time=time_coords)
+                if nexrad:
+                    nexrad_columns = nexrad_columns.resample(time=time_coords)
+
+                # Then, reindex to the largest of the time arrays
+                new_coordinates = pd.date_range(min_time, max_time, time_coords)
+                if verbose:
+                    print(
+                        f"    Creating new time grid: {len(new_coordinates)} time steps"
+                    )
+                for k in ds_concat.keys():
+                    ds_concat[k] = ds_concat[k].reindex(time=new_coordinates)
+                if nexrad:
+                    nexrad_columns = nexrad_columns.reindex(time=new_coordinates)
 
-    if verbose:
-        print(f"  Merging {len(ds_concat)} radar datasets...")
+            # Rename all variables according to their radar name
+            if verbose:
+                print("\n" + "=" * 80)
+                print("STEP 6: Renaming variables and merging datasets")
+                print("=" * 80)
 
-    # Drop time_offset since we won't need it until we write the final dataset
-    for k in ds_concat.keys():
-        if verbose:
-            print(f" Time arrays from {k}:")
-            print(ds_concat[k]["base_time"])
-        ds_concat[k] = ds_concat[k].drop(["time_offset", "base_time"])
-    nexrad_columns = nexrad_columns.drop(["time_offset", "base_time"])
-    first_key = list(ds_concat.keys())[0]
-    for k in list(ds_concat.keys())[1:]:
-        for var in ds_concat[k].data_vars:
-            if var in ds_concat[first_key].data_vars:
+            for k in ds_concat.keys():
+                radar_name = k.split("_")[1:]
                 if verbose:
-                    print(f"Dropping {var} from {k}")
-                ds_concat[k] = ds_concat[k].drop(var)
+                    print(
+                        f"  Renaming {k} variables with prefix: {'_'.join(radar_name)}_"
+                    )
+                for var in ds_concat[k].data_vars:
+                    if var not in [
+                        "time",
+                        "time_offset",
+                        "base_time",
+                        "height",
+                        "lat",
+                        "lon",
+                        "alt",
+                        "latitude",
+                        "longitude",
+                    ]:
+                        if "sonde_" not in var:
+                            ds_concat[k] = ds_concat[k].rename_vars(
+                                {var: f"{radar_name[0]}_{var}"}
+                            )
 
-    for var in nexrad_columns.data_vars:
-        for k in ds_concat.keys():
-            if var in ds_concat[k].data_vars:
+            if nexrad_columns is not None:
                 if verbose:
-                    print(f"Dropping {var} from nexrad_columns")
-                nexrad_columns = nexrad_columns.drop(var)
+                    print("  Renaming NEXRAD variables with prefix: nexrad_")
+                for var in nexrad_columns.data_vars:
+                    if var not in [
+                        "time",
+                        "time_offset",
+                        "base_time",
+                        "height",
+                        "lat",
+                        "lon",
+                        "alt",
+                        "latitude",
+                        "longitude",
+                    ]:
+                        if "sonde_" not in var:
+                            nexrad_columns = nexrad_columns.rename_vars(
+                                {var: f"nexrad_{var}"}
+                            )
 
-    ds_concat = xr.merge([x for x in ds_concat.values()])
-    if verbose:
-        print("Output xarray dataset so far:")
-        print(ds_concat)
+            if verbose:
+                print(f"  Merging {len(ds_concat)} radar datasets...")
 
-    if nexrad_columns is not None:
-        if verbose:
-            print("  Merging NEXRAD data into combined dataset...")
-        ds_concat = xr.merge([ds_concat, nexrad_columns])
-    
-    if verbose:
-        print(f"  Total variables in merged dataset: {len(ds_concat.data_vars)}")
-        print("\n" + "=" * 80)
-        print("STEP 7: Creating output dataset from ARM DOD")
-        print("=" * 80)
-        print(f"  Platform/Level: {output_platform}.{output_level}")
-        print(f"  DOD version: {dod_version}")
-        print("Variables in merged dataset:")
-        for vars in ds_concat.data_vars:
-            print(vars)
-    ds = act.io.create_ds_from_arm_dod(
-        f"{output_platform}.{output_level}",
-        {
-            "time": ds_concat.sizes["time"],
-            "height": ds_concat.sizes["height"],
-            "station": ds_concat.sizes["station"],
-        },
-        version=dod_version,
-    )
+            # Drop time_offset since we won't need it until we write the final dataset
+            for k in ds_concat.keys():
+                if verbose:
+                    print(f" Time arrays from {k}:")
+                    print(ds_concat[k]["base_time"])
+                ds_concat[k] = ds_concat[k].drop(["time_offset", "base_time"])
+            nexrad_columns = nexrad_columns.drop(["time_offset", "base_time"])
+            first_key = list(ds_concat.keys())[0]
+            for k in list(ds_concat.keys())[1:]:
+                for var in ds_concat[k].data_vars:
+                    if var in ds_concat[first_key].data_vars:
+                        if verbose:
+                            print(f"Dropping {var} from {k}")
+                        ds_concat[k] = ds_concat[k].drop(var)
 
-    if verbose:
-        print("  Created output dataset with dimensions:")
-        print(f"    time: {ds.sizes['time']}")
-        print(f"    height: {ds.sizes['height']}")
-        print(f"    station: {ds.sizes['station']}")
-        print("\n  Assigning coordinate variables...")
-
-    # Calculate base_time as the first timestamp
-    ds["time"] = ds_concat["time"]
-    ds["base_time"] = ds_concat.time[0]
-
-    # Calculate time as seconds since base_time
-    ds["time_offset"] = ds["time"]
-    ds["station"] = ds_concat["station"]
-    ds["height"] = ds_concat["height"]
-    ds["lat"][:] = ds_concat.isel(time=0)["lat"][:]
-    ds["lon"][:] = ds_concat.isel(time=0)["lon"][:]
-    ds["alt"][:] = ds_concat.isel(time=0)["alt"][:]
+            for var in nexrad_columns.data_vars:
+                for k in ds_concat.keys():
+                    if var in ds_concat[k].data_vars:
+                        if verbose:
+                            print(f"Dropping {var} from nexrad_columns")
+                        nexrad_columns = nexrad_columns.drop(var)
 
-    if verbose:
-        print("\n" + "=" * 80)
-        print("STEP 8: Populating output dataset with radar variables")
-        print("=" * 80)
+            ds_concat = xr.merge([x for x in ds_concat.values()])
+            if verbose:
+                print("Output xarray dataset so far:")
+                print(ds_concat)
 
-    for var in ds_concat.data_vars:
-        if var not in ["time", "time_offset", "base_time", "lat", "lon", "alt"]:
-            if var in ds.data_vars:
+            if nexrad_columns is not None:
                 if verbose:
-                    print(f"Adding variable to output dataset: {var}")
-                    print(
-                        f"Original dtype: {ds[var].dtype}, New dtype: {ds_concat[var].dtype}"
-                    )
-                old_type = ds[var].dtype
-
-                # Assign data and convert to original dtype
-                ds[var][:] = ds_concat[var][:]
-                ds[var] = ds[var].astype(old_type)
-                if "_FillValue" in ds[var].attrs:
-                    if isinstance(ds[var].attrs["_FillValue"], str):
-                        if ds[var].dtype == "float32":
-                            ds[var].attrs["_FillValue"] = np.float32(
-                                ds[var].attrs["_FillValue"]
-                            )
-                        elif ds[var].dtype == "float64":
-                            ds[var].attrs["_FillValue"] = np.float64(
-                                ds[var].attrs["_FillValue"]
-                            )
-                        elif ds[var].dtype == "int32":
-                            ds[var].attrs["_FillValue"] = np.int32(
-                                ds[var].attrs["_FillValue"]
-                            )
-                        elif ds[var].dtype == "int64":
-                            ds[var].attrs["_FillValue"] = np.int64(
-                                ds[var].attrs["_FillValue"]
-                            )
-                    ds[var] = ds[var].fillna(ds[var].attrs["_FillValue"]).astype(float)
-                if "missing_value" in ds[var].attrs:
-                    if isinstance(ds[var].attrs["missing_value"], str):
-                        if ds[var].dtype == "float32":
-                            ds[var].attrs["missing_value"] = np.float32(
-                                ds[var].attrs["missing_value"]
-                            )
-                        elif ds[var].dtype == "float64":
-                            ds[var].attrs["missing_value"] = np.float64(
-                                ds[var].attrs["missing_value"]
+                    print("  Merging NEXRAD data into combined dataset...")
+                ds_concat = xr.merge([ds_concat, nexrad_columns])
+
+            if verbose:
+                print(
+                    f"  Total variables in merged dataset: {len(ds_concat.data_vars)}"
+                )
+                print("\n" + "=" * 80)
+                print("STEP 7: Creating output dataset from ARM DOD")
+                print("=" * 80)
+                print(f"  Platform/Level: {output_platform}.{output_level}")
+                print(f"  DOD version: {dod_version}")
+                print("Variables in merged dataset:")
+                for vars in ds_concat.data_vars:
+                    print(vars)
+            ds = act.io.create_ds_from_arm_dod(
+                f"{output_platform}.{output_level}",
+                {
+                    "time": ds_concat.sizes["time"],
+                    "height": ds_concat.sizes["height"],
+                    "station": ds_concat.sizes["station"],
+                },
+                version=dod_version,
+            )
+
+            if verbose:
+                print("  Created output dataset with dimensions:")
+                print(f"    time: {ds.sizes['time']}")
+                print(f"    height: {ds.sizes['height']}")
+                print(f"    station: {ds.sizes['station']}")
+                print("\n  Assigning coordinate variables...")
+
+            # Calculate base_time as the first timestamp
+            ds["time"] = ds_concat["time"]
+            ds["base_time"] = ds_concat.time[0]
+
+            # Calculate time as seconds since base_time
+            ds["time_offset"] = ds["time"]
+            ds["station"] = ds_concat["station"]
+            ds["height"] = ds_concat["height"]
+            ds["lat"][:] = ds_concat.isel(time=0)["lat"][:]
+            ds["lon"][:] = ds_concat.isel(time=0)["lon"][:]
+            ds["alt"][:] = ds_concat.isel(time=0)["alt"][:]
+
+            if verbose:
+                print("\n" + "=" * 80)
+                print("STEP 8: Populating output dataset with radar variables")
+                print("=" * 80)
+
+            # Widen the columns packed to integers back to floats with NaNs
+            ds_concat = unpack_variables(ds_concat, output_encoding)
+
+            for var in ds_concat.data_vars:
+                if var not in ["time", "time_offset", "base_time", "lat", "lon", "alt"]:
+                    if var in ds.data_vars:
+                        if verbose:
+                            print(f"Adding variable to output dataset: {var}")
+                            print(
+                                f"Original dtype: {ds[var].dtype}, New dtype: {ds_concat[var].dtype}"
                             )
-                        elif ds[var].dtype == "int32":
-                            ds[var].attrs["missing_value"] = np.int32(
-                                ds[var].attrs["missing_value"]
+                        old_type = ds[var].dtype
+
+                        # Assign data and convert to original dtype
+                        ds[var][:] = ds_concat[var][:]
+                        ds[var] = ds[var].astype(old_type)
+                        if "_FillValue" in ds[var].attrs:
+                            if isinstance(ds[var].attrs["_FillValue"], str):
+                                if ds[var].dtype == "float32":
+                                    ds[var].attrs["_FillValue"] = np.float32(
+                                        ds[var].attrs["_FillValue"]
+                                    )
+                                elif ds[var].dtype == "float64":
+                                    ds[var].attrs["_FillValue"] = np.float64(
+                                        ds[var].attrs["_FillValue"]
+                                    )
+                                elif ds[var].dtype == "int32":
+                                    ds[var].attrs["_FillValue"] = np.int32(
+                                        ds[var].attrs["_FillValue"]
+                                    )
+                                elif ds[var].dtype == "int64":
+                                    ds[var].attrs["_FillValue"] = np.int64(
+                                        ds[var].attrs["_FillValue"]
+                                    )
+                            ds[var] = (
+                                ds[var]
+                                .fillna(ds[var].attrs["_FillValue"])
+                                .astype(float)
                             )
-                        elif ds[var].dtype == "int64":
-                            ds[var].attrs["missing_value"] = np.int64(
-                                ds[var].attrs["missing_value"]
+                        if "missing_value" in ds[var].attrs:
+                            if isinstance(ds[var].attrs["missing_value"], str):
+                                if ds[var].dtype == "float32":
+                                    ds[var].attrs["missing_value"] = np.float32(
+                                        ds[var].attrs["missing_value"]
+                                    )
+                                elif ds[var].dtype == "float64":
+                                    ds[var].attrs["missing_value"] = np.float64(
+                                        ds[var].attrs["missing_value"]
+                                    )
+                                elif ds[var].dtype == "int32":
+                                    ds[var].attrs["missing_value"] = np.int32(
+                                        ds[var].attrs["missing_value"]
+                                    )
+                                elif ds[var].dtype == "int64":
+                                    ds[var].attrs["missing_value"] = np.int64(
+                                        ds[var].attrs["missing_value"]
+                                    )
+                            ds[var] = (
+                                ds[var]
+                                .fillna(ds[var].attrs["missing_value"])
+                                .astype(float)
                             )
-                    ds[var] = (
-                        ds[var].fillna(ds[var].attrs["missing_value"]).astype(float)
+
+            # Remove all the unused CMAC variables
+            # Drop duplicate latitude and longitude
+            if verbose:
+                print("\n  Freeing memory: deleting intermediate datasets...")
+            ds_concat.close()
+            # The prefetched in-situ grids and the worker profiles are collected
+            # before restarting the workers
+            for instrument, future in list(prefetched.items()):
+                try:
+                    prefetched[instrument] = future.result()
+                except Exception as error:
+                    logging.warning(
+                        f"Reading the {instrument} data in the background failed "
+                        + f"({error}), it will be matched after the columns."
+                    )
+                    del prefetched[instrument]
+            metrics["prefetched_insitu"] = list(prefetched)
+        if profiler is not None:
+            metrics["profile"] = profiler.summary
+        if serial is not True:
+            if current_client is None:
+                try:
+                    current_client = Client.current()
+                except ValueError:
+                    raise RuntimeError(
+                        "No Dask client found. Please start a Dask client before running in parallel mode."
                     )
+            current_client.restart()
+        del ds_concat
 
-    # Remove all the unused CMAC variables
-    # Drop duplicate latitude and longitude
-    if verbose:
-        print("\n  Freeing memory: deleting intermediate datasets...")
-    ds_concat.close()
-    if serial is not True:
-        if current_client is None:
-            try:
-                current_client = Client.current()
-            except ValueError:
-                raise RuntimeError(
-                    "No Dask client found. Please start a Dask client before running in parallel mode."
-                )
-        current_client.restart()
-    del ds_concat
-    
-    
-    # Free up Memory
-    del columns
-
-    # If successful column extraction, apply in-situ
-    if ds:
-        # Depending on how Dask is behaving, may be to resort time
-        ds = ds.sortby("time")
+        # Free up Memory and remove the spilled columns
+        for store in list(columns.values()) + [nexrad_store]:
+            store.close()
+        del columns, nexrad_store
 
-        if verbose:
-            print("\n" + "=" * 80)
-            print("STEP 9: Matching in-situ ground instruments")
-            print("=" * 80)
-            print(f"  Radar processing completed at: {time.strftime('%H:%M:%S')}")
+        # The assembly excludes the time spent fetching the NEXRAD columns
+        metrics["stage_seconds"]["assembly"] = (
+            time.perf_counter() - stage_start - metrics["stage_seconds"]["nexrad"]
+        )
+        tracker.stage_finished("assembly")
+        stage_start = time.perf_counter()
 
-        # Find all of the met stations and match to columns
-        vol_keys = list(volumes.keys())
-        for k in vol_keys:
-            if k == "sonde":
-                continue
-            if len(volumes[k]) == 0:
-                if verbose:
-                    print(f"No files found for instrument/site: {k}")
-                continue
-            if "_" in k:
-                instrument, site = k.split("_", 1)
-            else:
-                instrument = k
-                site = base_station
+        # If successful column extraction, apply in-situ
+        if ds:
+            # Depending on how Dask is behaving, may be to resort time
+            ds = ds.sortby("time")
 
-            if instrument == "kazr2":
-                if verbose:
-                    print(f"Matching KAZR2 data for site: {site}")
-                ds = match_datasets_act(
-                    ds,
-                    volumes[k],
-                    site.upper(),
-                    discard=discard_var["kazr2"],
-                    resample="mean",
-                    prefix="kazr2_",
-                    verbose=verbose,
-                )
-            if instrument == "met":
-                if verbose:
-                    print(f"Matching MET data for site: {site}")
-                ds = match_datasets_act(
-                    ds,
-                    volumes[k][0],
-                    site.upper(),
-                    resample="mean",
-                    discard=discard_var["met"],
-                    verbose=verbose,
-                )
+            if verbose:
+                print("\n" + "=" * 80)
+                print("STEP 9: Matching in-situ ground instruments")
+                print("=" * 80)
+                print(f"  Radar processing completed at: {time.strftime('%H:%M:%S')}")
 
-            if instrument == "pluvio":
-                # Weighing Bucket Rain Gauge
-                ds = match_datasets_act(
-                    ds,
-                    volumes[k],
-                    site.upper(),
-                    resample="sum",
-                    discard=discard_var["pluvio"],
-                    verbose=verbose,
-                )
+            tracker.stage_started(
+                "insitu", total=sum(len(x["keys"]) for x in insitu_groups.values())
+            )
 
-            if instrument == "ld":
-                ds = match_datasets_act(
-                    ds,
-                    volumes[k],
-                    site.upper(),
-                    discard=discard_var["ldquants"],
-                    resample="mean",
-                    prefix="ldquants_",
-                    verbose=verbose,
+            # Fill values of the output variables, looked up once for all writes
+            fill_values = get_fill_values(ds)
+            insitu_jobs = []
+            for instrument, group in insitu_groups.items():
+                config = INSITU_MATCH_CONFIG[instrument]
+                match_kwargs = dict(
+                    discard=discard_var[config["discard"]],
+                    resample=config["resample"],
+                    prefix=config["prefix"],
+                    keep_variables=group["keep_variables"],
+                    binned=binned_insitu or config["binned"],
+                    cache=insitu_cache,
                 )
+                insitu_jobs.append((instrument, group, match_kwargs))
 
-            if instrument == "vd":
-                # Laser Disdrometer - Supplemental Site
-                ds = match_datasets_act(
-                    ds,
-                    volumes[k],
-                    site.upper(),
-                    discard=discard_var["vdisquants"],
-                    resample="mean",
-                    prefix="vdisquants_",
-                    verbose=verbose,
-                )
+            if serial:
+                for instrument, group, match_kwargs in insitu_jobs:
+                    tracker.task_started("insitu", instrument)
+                    insitu_start = time.perf_counter()
+                    if verbose:
+                        print(
+                            f"Matching {instrument} data for sites: "
+                            + f"{list(group['grounds'])}"
+                        )
+                    if instrument in prefetched:
+                        matched = prefetched.pop(instrument).interp(
+                            time=ds["time"], method="linear"
+                        )
+                    else:
+                        matched = resample_ground_datasets(
+                            group["grounds"], ds["time"], ds["height"], **match_kwargs
+                        )
+                    ds = merge_matched_dataset(ds, matched, fill_values=fill_values)
+                    tracker.task_finished(
+                        "insitu",
+                        instrument,
+                        elapsed=time.perf_counter() - insitu_start,
+                        nbytes=sum(_files_nbytes(x) for x in group["grounds"].values()),
+                        count=len(group["keys"]),
+                    )
+            else:
+                # Read, resample and interpolate every instrument on the cluster,
+                # then write them into the columns one at a time
+                if verbose:
+                    print(
+                        f"  Matching {len(insitu_jobs)} in-situ instruments in parallel"
+                    )
+                futures = {}
+                for instrument, group, match_kwargs in insitu_jobs:
+                    tracker.task_started("insitu", instrument)
+                    if instrument in prefetched:
+                        continue
+                    future = current_client.submit(
+                        resample_ground_datasets,
+                        group["grounds"],
+                        ds["time"],
+                        ds["height"],
+                        pure=False,
+                        **match_kwargs,
+                    )
+                    futures[future] = (instrument, group)
+                insitu_start = time.perf_counter()
+                matched = {}
+                for future in as_completed(futures):
+                    instrument, group = futures[future]
+                    if future.status == "error":
+                        error = future.exception()
+                        tracker.task_failed(
+                            "insitu", instrument, error=error, count=len(group["keys"])
+                        )
+                        logging.warning(
+                            f"Matching the {instrument} data failed ({error!r}), skipping it."
+                        )
+                        continue
+                    matched[instrument] = future.result()
+                    tracker.task_finished(
+                        "insitu",
+                        instrument,
+                        elapsed=time.perf_counter() - insitu_start,
+                        nbytes=sum(_files_nbytes(x) for x in group["grounds"].values()),
+                        count=len(group["keys"]),
+                    )
+                for instrument, group, match_kwargs in insitu_jobs:
+                    if verbose:
+                        print(
+                            f"Matching {instrument} data for sites: "
+                            + f"{list(group['grounds'])}"
+                        )
+                    if instrument in prefetched:
+                        matched[instrument] = prefetched.pop(instrument).interp(
+                            time=ds["time"], method="linear"
+                        )
+                        tracker.task_finished(
+                            "insitu",
+                            instrument,
+                            elapsed=time.perf_counter() - insitu_start,
+                            nbytes=sum(
+                                _files_nbytes(x) for x in group["grounds"].values()
+                            ),
+                            count=len(group["keys"]),
+                        )
+                    elif instrument not in matched:
+                        continue
+                    ds = merge_matched_dataset(
+                        ds, matched.pop(instrument), fill_values=fill_values
+                    )
+            tracker.stage_finished("insitu")
 
-            if instrument == "wxt":
-                # Laser Disdrometer - Supplemental Site
-                ds = match_datasets_act(
-                    ds,
-                    volumes[k],
-                    site.upper(),
-                    discard=discard_var["wxt"],
-                    resample="mean",
-                    verbose=verbose,
-                )
+        else:
+            # There is no column extraction
+            raise RuntimeError(": RadCLss FAILURE (All Columns Failed to Extract): ")
+        metrics["stage_seconds"]["insitu"] = time.perf_counter() - stage_start
 
-    else:
-        # There is no column extraction
-        raise RuntimeError(": RadCLss FAILURE (All Columns Failed to Extract): ")
+        if verbose:
+            print("\n" + "=" * 80)
+            print("STEP 10: Finalizing dataset")
+            print("=" * 80)
+            print("  Removing time unit attributes...")
 
-    if verbose:
-        print("\n" + "=" * 80)
-        print("STEP 10: Finalizing dataset")
-        print("=" * 80)
-        print("  Removing time unit attributes...")
+        del ds["base_time"].attrs["units"]
+        del ds["time_offset"].attrs["units"]
+        del ds["time"].attrs["units"]
 
-    del ds["base_time"].attrs["units"]
-    del ds["time_offset"].attrs["units"]
-    del ds["time"].attrs["units"]
+        metrics["total_seconds"] = time.perf_counter() - run_start
+        metrics["peak_memory"] = _peak_memory()
+        if plan is not None:
+            metrics["plan_comparison"] = compare_plan(plan, metrics)
 
     if verbose:
         print("\n" + "=" * 80)
@@ -1,3 +1,20 @@
 from .write import write_radclss_output  # noqa
+from .header import (
+    read_radar_header,
+    classify_radar_header,
+    classify_radar_file,
+)  # noqa
+from .read import read_radar, datatree_to_radar, subset_radar  # noqa
+from .catalog import FileCatalog, parse_arm_filename  # noqa
 
-__all__ = ["write_radclss_output"]
+__all__ = [
+    "write_radclss_output",
+    "read_radar_header",
+    "classify_radar_header",
+    "classify_radar_file",
+    "read_radar",
+    "datatree_to_radar",
+    "subset_radar",
+    "FileCatalog",
+    "parse_arm_filename",
+]
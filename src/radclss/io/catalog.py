@@ -0,0 +1,479 @@
+import fnmatch
+import logging
+import os
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from netCDF4 import Dataset, num2date
+
+from .header import read_radar_header, classify_radar_header
+
+# Version of the catalog schema. Catalogs written with another version are
+# rebuilt on the next scan.
+CATALOG_VERSION = 1
+
+# ARM file names: <site><instrument class><facility>.<level>.<YYYYMMDD>.<hhmmss>.<ext>
+_ARM_FILENAME = re.compile(
+    r"^(?P<site>[a-z]{3})(?P<instrument>[a-z0-9]+?)(?P<facility>[A-Z]+\d*)"
+    + r"\.(?P<level>[a-z0-9]{2})\.(?P<date>\d{8})\.(?P<time>\d{6})\."
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    datastream TEXT,
+    site TEXT,
+    instrument TEXT,
+    facility TEXT,
+    start_time INTEGER,
+    end_time INTEGER,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    scan_type TEXT,
+    nsweeps INTEGER,
+    nrays INTEGER,
+    ngates INTEGER,
+    nfields INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_datastream_time
+    ON files (datastream, start_time, end_time);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+"""
+
+_COLUMNS = [
+    "path",
+    "directory",
+    "datastream",
+    "site",
+    "instrument",
+    "facility",
+    "start_time",
+    "end_time",
+    "size",
+    "mtime",
+    "scan_type",
+    "nsweeps",
+    "nrays",
+    "ngates",
+    "nfields",
+]
+
+
+def parse_arm_filename(filename):
+    """
+    Parse the datastream, facility and start time of an ARM file name
+    (i.e. 'bnfcsapr2cmacS3.c1.20250520.000003.nc').
+
+    Parameters
+    ----------
+    filename : str
+        Path or name of the file.
+
+    Returns
+    -------
+    info : dict or None
+        Dictionary with the 'datastream' (i.e. 'bnfcsapr2cmacS3.c1'),
+        'site', 'instrument', 'facility', 'level' and 'start_time' (a
+        numpy datetime64) of the file, or None if the name does not follow
+        the ARM naming convention.
+    """
+    match = _ARM_FILENAME.match(os.path.basename(filename))
+    if match is None:
+        return None
+    info = match.groupdict()
+    date, hms = info.pop("date"), info.pop("time")
+    try:
+        info["start_time"] = np.datetime64(
+            f"{date[:4]}-{date[4:6]}-{date[6:]}T{hms[:2]}:{hms[2:4]}:{hms[4:]}", "ns"
+        )
+    except ValueError:
+        return None
+    info["datastream"] = (
+        f"{info['site']}{info['instrument']}{info['facility']}.{info['level']}"
+    )
+    return info
+
+
+class FileCatalog:
+    """
+    SQLite index of the radar, radiosonde and in-situ files of datastream
+    directories.
+
+    Each file is recorded once with its datastream, facility, start and end
+    time, size and modification time, and for radar files the scan type
+    (see :func:`radclss.io.classify_radar_header`) and header dimensions.
+    Rescanning a directory only opens new and modified files, so the files
+    of a day are found with indexed queries instead of globbing the
+    archive and opening the files on every run.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite database. It is created if needed. Use
+        ':memory:' for a catalog that is not saved.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != CATALOG_VERSION:
+            # Rebuilt from scratch by the next scan
+            self._conn.execute("DROP TABLE IF EXISTS files")
+            self._conn.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def __contains__(self, filename):
+        return self.entry(filename) is not None
+
+    def close(self):
+        """Close the database."""
+        self._conn.close()
+
+    def scan(self, directory, pattern="*", recursive=True):
+        """
+        Add the files of a directory to the catalog, or update them.
+
+        Only files that are new or whose size or modification time changed
+        since the last scan are opened. Files of the directory that no
+        longer exist are removed from the catalog.
+
+        Parameters
+        ----------
+        directory : str
+            The directory to scan, i.e. the directory of a datastream.
+        pattern : str, optional
+            Glob pattern of the file names to catalog. Default is '*'.
+        recursive : bool, optional
+            Set to True to also scan the subdirectories. Default is True.
+
+        Returns
+        -------
+        counts : dict
+            Number of files 'added', 'updated', 'removed' and 'unchanged'.
+        """
+        directory = os.path.abspath(directory)
+        known = {
+            path: (size, mtime)
+            for path, size, mtime in self._conn.execute(
+                "SELECT path, size, mtime FROM files "
+                + "WHERE directory = ? OR directory LIKE ? ESCAPE '\\'",
+                (directory, _escape_like(directory + os.sep) + "%"),
+            )
+        }
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        seen = set()
+        rows = []
+        for root, dirs, names in os.walk(directory):
+            if not recursive:
+                dirs[:] = []
+            for name in sorted(names):
+                if not fnmatch.fnmatch(name, pattern):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                seen.add(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated" if path in known else "added"] += 1
+                rows.append(_read_entry(path, root, stat))
+        removed = [
+            (path,)
+            for path in known
+            if path not in seen
+            and (recursive or os.path.dirname(path) == directory)
+            and fnmatch.fnmatch(os.path.basename(path), pattern)
+        ]
+        counts["removed"] = len(removed)
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO files ({', '.join(_COLUMNS)}) "
+                + f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [[row[x] for x in _COLUMNS] for row in rows],
+            )
+            self._conn.executemany("DELETE FROM files WHERE path = ?", removed)
+        return counts
+
+    def entry(self, filename):
+        """
+        Get the catalog entry of a file.
+
+        Returns
+        -------
+        entry : dict or None
+            The recorded fields of the file, with the times as numpy
+            datetime64, or None if the file is not in the catalog.
+        """
+        cursor = self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM files WHERE path = ?",
+            (os.path.abspath(filename),),
+        )
+        row = cursor.fetchone()
+        return None if row is None else _to_entry(row)
+
+    def header(self, filename):
+        """
+        Get the radar header of a file from the catalog, in the form returned
+        by :func:`radclss.io.read_radar_header` with the recorded 'scan_type'.
+        The per sweep entries are not recorded and are set to None.
+
+        Returns
+        -------
+        header : dict or None
+            The header, or None if the file is not in the catalog or is not
+            a radar file.
+        """
+        entry = self.entry(filename)
+        if entry is None or entry["scan_type"] is None:
+            return None
+        return {
+            "filename": filename,
+            "size": entry["size"],
+            "nsweeps": entry["nsweeps"],
+            "nrays": entry["nrays"],
+            "ngates": entry["ngates"],
+            "nfields": entry["nfields"],
+            "sweep_mode": None,
+            "fixed_angle": None,
+            "sweep_start_ray_index": None,
+            "sweep_end_ray_index": None,
+            "scan_type": entry["scan_type"],
+        }
+
+    def datastreams(self):
+        """List the datastreams in the catalog."""
+        cursor = self._conn.execute(
+            "SELECT DISTINCT datastream FROM files "
+            + "WHERE datastream IS NOT NULL ORDER BY datastream"
+        )
+        return [row[0] for row in cursor]
+
+    def query(
+        self,
+        datastream=None,
+        start=None,
+        end=None,
+        facility=None,
+        exclude_scan_types=None,
+    ):
+        """
+        Find the files of a datastream overlapping a time range.
+
+        Parameters
+        ----------
+        datastream : str or None, optional
+            The datastream (i.e. 'bnfmetM1.b1'), or a glob pattern of
+            datastreams (i.e. 'bnfmet*.b1'). Set to None for all files.
+        start, end : str, datetime or numpy datetime64, optional
+            The time range. Files whose data ends before start or starts at
+            or after end are left out. Files without a recorded end time
+            are selected by their start time. Set to None for no bound.
+        facility : str or None, optional
+            Only select files of this facility (i.e. 'M1').
+        exclude_scan_types : list or None, optional
+            Scan types of the radar files to leave out (i.e. ['rhi',
+            'empty']). Default is None.
+
+        Returns
+        -------
+        files : list
+            Paths of the files, sorted by start time.
+        """
+        where = []
+        params = []
+        if datastream is not None:
+            if any(x in datastream for x in "*?["):
+                where.append("datastream GLOB ?")
+            else:
+                where.append("datastream = ?")
+            params.append(datastream)
+        if facility is not None:
+            where.append("facility = ?")
+            params.append(facility)
+        if start is not None:
+            where.append("COALESCE(end_time, start_time) >= ?")
+            params.append(_to_ns(start))
+        if end is not None:
+            where.append("start_time < ?")
+            params.append(_to_ns(end))
+        if exclude_scan_types:
+            where.append(
+                "(scan_type IS NULL OR scan_type NOT IN "
+                + f"({', '.join('?' * len(exclude_scan_types))}))"
+            )
+            params.extend(exclude_scan_types)
+        sql = "SELECT path FROM files"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY start_time, path"
+        return [row[0] for row in self._conn.execute(sql, params)]
+
+    def files_for_date(
+        self, datastream, date, margin=None, facility=None, exclude_scan_types=None
+    ):
+        """
+        Find the files of a datastream with data on a day, including files
+        that started the day before and cross midnight.
+
+        Parameters
+        ----------
+        datastream : str
+            The datastream, or a glob pattern of datastreams.
+        date : str
+            The day, as 'YYYYMMDD' or 'YYYY-MM-DD'.
+        margin : str, timedelta, numpy timedelta64 or None, optional
+            Extends the day on both sides, i.e. '12h' to also find the
+            radiosondes launched in the evening before. Default is None.
+        facility, exclude_scan_types : optional
+            See :meth:`query`.
+
+        Returns
+        -------
+        files : list
+            Paths of the files, sorted by start time.
+        """
+        date = str(date).replace("-", "")
+        start = np.datetime64(f"{date[:4]}-{date[4:6]}-{date[6:8]}", "ns")
+        end = start + np.timedelta64(1, "D")
+        if margin is not None:
+            margin = _to_timedelta(margin)
+            start, end = start - margin, end + margin
+        return self.query(
+            datastream,
+            start=start,
+            end=end,
+            facility=facility,
+            exclude_scan_types=exclude_scan_types,
+        )
+
+    def get_volumes(self, date, datastreams, margins=None):
+        """
+        Build the volumes dictionary of :func:`radclss.core.radclss` for a
+        day from the catalog.
+
+        Parameters
+        ----------
+        date : str
+            The day, as 'YYYYMMDD'.
+        datastreams : dict
+            The datastream (or glob pattern) of each key of the volumes
+            dictionary, i.e. {'radar_csapr2': 'bnfcsapr2cmacS3.c1',
+            'sonde': 'bnfsondewnpnM1.b1', 'met_M1': 'bnfmetM1.b1'}. RHI
+            and empty radar files are left out.
+        margins : dict or None, optional
+            The margin of each key (see :meth:`files_for_date`). The
+            radiosondes default to a margin of 12 hours so that the sonde
+            nearest to the first radar volumes is found. Default is None.
+
+        Returns
+        -------
+        volumes : dict
+            The files of each key, and the 'date'.
+        """
+        if margins is None:
+            margins = {}
+        volumes = {"date": str(date).replace("-", "")}
+        for key, datastream in datastreams.items():
+            margin = margins.get(key, "12h" if key == "sonde" else None)
+            exclude = ["rhi", "empty"] if "radar" in key else None
+            volumes[key] = self.files_for_date(
+                datastream, date, margin=margin, exclude_scan_types=exclude
+            )
+        return volumes
+
+
+def _read_entry(path, directory, stat):
+    # Reads the catalog entry of a file, opening it once for the time range
+    # and once more for the header of radar files
+    entry = dict.fromkeys(_COLUMNS)
+    entry.update(path=path, directory=directory, size=stat.st_size)
+    entry["mtime"] = stat.st_mtime_ns
+    info = parse_arm_filename(path)
+    if info is not None:
+        entry.update({x: info[x] for x in ["datastream", "site", "instrument"]})
+        entry["facility"] = info["facility"]
+        entry["start_time"] = _to_ns(info["start_time"])
+    is_radar = False
+    try:
+        with Dataset(path, "r") as nc:
+            is_radar = "range" in nc.dimensions and "time" in nc.dimensions
+            times = _read_time_range(nc)
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        logging.warning(f"Unable to read the times of {path} ({error}).")
+        times = None
+    if times is not None:
+        entry["start_time"] = _to_ns(times[0])
+        entry["end_time"] = _to_ns(times[1])
+    if is_radar:
+        try:
+            header = read_radar_header(path)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logging.warning(f"Unable to read the radar header of {path} ({error}).")
+        else:
+            entry["scan_type"] = classify_radar_header(header)
+            for key in ["nsweeps", "nrays", "ngates", "nfields"]:
+                entry[key] = header[key]
+    return entry
+
+
+def _read_time_range(nc):
+    if "time" not in nc.variables or nc.variables["time"].size == 0:
+        return None
+    var = nc.variables["time"]
+    units = getattr(var, "units", None)
+    if units is None or "since" not in units:
+        return None
+    var.set_auto_mask(False)
+    values = np.asarray(var[:], dtype="float64").ravel()
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+    times = num2date(
+        np.array([values.min(), values.max()]),
+        units,
+        calendar=getattr(var, "calendar", "standard"),
+        only_use_cftime_datetimes=False,
+        only_use_python_datetimes=True,
+    )
+    return np.array(times, dtype="datetime64[ns]")
+
+
+def _to_entry(row):
+    entry = dict(zip(_COLUMNS, row))
+    for key in ["start_time", "end_time"]:
+        if entry[key] is not None:
+            entry[key] = np.datetime64(entry[key], "ns")
+    return entry
+
+
+def _to_ns(value):
+    return int(np.datetime64(value, "ns").astype("int64"))
+
+
+def _to_timedelta(value):
+    if isinstance(value, str):
+        return pd.to_timedelta(value).to_timedelta64()
+    return np.timedelta64(value, "ns")
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,125 @@
+import os
+import logging
+
+import numpy as np
+
+from netCDF4 import Dataset, chartostring
+
+
+def read_radar_header(filename):
+    """
+    Read the dimensions and sweep metadata of a CF/Radial radar file
+    without decoding any of the radar fields.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the radar file.
+
+    Returns
+    -------
+    header : dict
+        Dictionary containing the file size in bytes ('size'), the number
+        of sweeps, rays and gates ('nsweeps', 'nrays', 'ngates'), the number
+        of (time, range) fields ('nfields'), and the per sweep 'sweep_mode',
+        'fixed_angle', 'sweep_start_ray_index' and 'sweep_end_ray_index'.
+        Entries that could not be determined (i.e. the file is not netCDF)
+        are set to None.
+    """
+    header = {
+        "filename": filename,
+        "size": os.path.getsize(filename),
+        "nsweeps": None,
+        "nrays": None,
+        "ngates": None,
+        "nfields": None,
+        "sweep_mode": None,
+        "fixed_angle": None,
+        "sweep_start_ray_index": None,
+        "sweep_end_ray_index": None,
+    }
+    try:
+        nc = Dataset(filename, "r")
+    except OSError:
+        logging.warning(f"Unable to read the netCDF header of {filename}.")
+        return header
+
+    with nc:
+        nc.set_auto_mask(False)
+        dims = nc.dimensions
+        if "time" in dims:
+            header["nrays"] = dims["time"].size
+        if "range" in dims:
+            header["ngates"] = dims["range"].size
+        if "sweep" in dims:
+            header["nsweeps"] = dims["sweep"].size
+        header["nfields"] = sum(
+            1
+            for var in nc.variables.values()
+            if var.dimensions[:2] == ("time", "range")
+        )
+        if "sweep_mode" in nc.variables:
+            sweep_mode = nc.variables["sweep_mode"][:]
+            if sweep_mode.dtype.kind == "S":
+                sweep_mode = chartostring(sweep_mode)
+            header["sweep_mode"] = [str(x).strip().lower() for x in sweep_mode]
+        for key in ["fixed_angle", "sweep_start_ray_index", "sweep_end_ray_index"]:
+            if key in nc.variables:
+                # Keep the mask so unset sweeps in single sweep files show up
+                nc.variables[key].set_auto_mask(True)
+                header[key] = nc.variables[key][:]
+
+    return header
+
+
+def classify_radar_header(header):
+    """
+    Classify a radar file from its header as a usable PPI volume,
+    a single sweep scan, an RHI or an empty file.
+
+    Parameters
+    ----------
+    header : dict
+        Header returned by :func:`read_radar_header`, or by
+        :meth:`radclss.io.FileCatalog.header` which holds the recorded
+        'scan_type'.
+
+    Returns
+    -------
+    scan_type : str
+        One of 'ppi', 'single_sweep', 'rhi', 'empty', or 'unknown' if the
+        header could not be read (e.g. the file is not netCDF).
+    """
+    if header.get("scan_type") is not None:
+        return header["scan_type"]
+    if header["nrays"] is None:
+        return "unknown"
+    if header["nrays"] == 0 or header["ngates"] == 0 or header["nfields"] == 0:
+        return "empty"
+    sweep_mode = header["sweep_mode"]
+    if sweep_mode and all("rhi" in mode for mode in sweep_mode):
+        return "rhi"
+    start_index = header["sweep_start_ray_index"]
+    if header["nsweeps"] == 1 or (
+        start_index is not None and np.ma.is_masked(start_index[1:])
+    ):
+        return "single_sweep"
+    return "ppi"
+
+
+def classify_radar_file(filename):
+    """
+    Classify a radar file as a usable PPI volume, a single sweep scan,
+    an RHI or an empty file by only reading its netCDF header.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the radar file.
+
+    Returns
+    -------
+    scan_type : str
+        One of 'ppi', 'single_sweep', 'rhi', 'empty' or 'unknown'.
+    """
+    return classify_radar_header(read_radar_header(filename))
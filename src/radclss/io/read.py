@@ -0,0 +1,372 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pyart
+import xradar as xd
+
+from netCDF4 import default_fillvals
+from pyart.config import get_fillvalue, get_metadata
+from pyart.io.common import make_time_unit_str
+
+# Py-ART readers for the file formats that can be given as a hint to
+# read_radar, skipping Py-ART's format auto-detection.
+PYART_READERS = {
+    "cfradial1": pyart.io.read_cfradial,
+    "nexradlevel2": pyart.io.read_nexrad_archive,
+    "iris": pyart.io.read_sigmet,
+    "uf": pyart.io.read_uf,
+    "odim": pyart.aux_io.read_odim_h5,
+    "gamic": pyart.aux_io.read_gamic,
+}
+
+# xradar DataTree openers for each supported file format.
+XRADAR_OPENERS = {
+    "cfradial1": xd.io.open_cfradial1_datatree,
+    "nexradlevel2": xd.io.open_nexradlevel2_datatree,
+    "iris": xd.io.open_iris_datatree,
+    "uf": xd.io.open_uf_datatree,
+    "odim": xd.io.open_odim_datatree,
+    "gamic": xd.io.open_gamic_datatree,
+}
+
+
+def read_radar(
+    filename,
+    backend="pyart",
+    file_format=None,
+    include_fields=None,
+    exclude_fields=None,
+    sweeps=None,
+    selector=None,
+):
+    """
+    Read a radar file into a Py-ART Radar object.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the radar file.
+    backend : str, optional
+        'pyart' to read the file with Py-ART, or 'xradar' to open the file
+        lazily with xradar and only load the selected sweeps and fields.
+        Default is 'pyart'.
+    file_format : str or None, optional
+        The format of the file (one of 'cfradial1', 'nexradlevel2', 'iris',
+        'uf', 'odim' or 'gamic'). Giving the format skips format
+        auto-detection. It is required for the xradar backend unless the
+        file is CF/Radial. Default is None.
+    include_fields : list or None, optional
+        List of fields to read. Set to None to read all fields.
+    exclude_fields : list or None, optional
+        List of fields to skip.
+    sweeps : list or None, optional
+        List of sweep indices to read with the xradar backend. Set to None
+        to read all sweeps.
+    selector : callable or None, optional
+        Function taking a Radar object and returning the (sweeps, rays, gates)
+        to keep, as accepted by :func:`subset_radar`. With the xradar backend,
+        the selector is given a Radar with only the coordinates loaded, so
+        only the selected data are read from disk. With the Py-ART backend,
+        the radar is subset right after reading. Default is None.
+
+    Returns
+    -------
+    radar : pyart.core.Radar
+        The radar object.
+    """
+    if backend == "pyart":
+        if file_format is None:
+            radar = pyart.io.read(
+                filename,
+                exclude_fields=exclude_fields,
+                include_fields=include_fields,
+            )
+        elif file_format in PYART_READERS:
+            radar = PYART_READERS[file_format](
+                filename, exclude_fields=exclude_fields, include_fields=include_fields
+            )
+        else:
+            raise ValueError(f"Unsupported radar file format: {file_format}")
+        # Check for single sweep scans
+        if np.ma.is_masked(radar.sweep_start_ray_index["data"][1:]):
+            radar.sweep_start_ray_index["data"] = np.ma.array([0])
+            radar.sweep_end_ray_index["data"] = np.ma.array([radar.nrays])
+        if selector is not None and radar.nrays > 0:
+            radar = subset_radar(radar, *selector(radar))
+        return radar
+    elif backend == "xradar":
+        if file_format is None:
+            file_format = "cfradial1"
+        if file_format not in XRADAR_OPENERS:
+            raise ValueError(f"Unsupported radar file format: {file_format}")
+        dtree = XRADAR_OPENERS[file_format](filename, first_dim="time")
+        rays = None
+        gates = None
+        if selector is not None:
+            geometry = datatree_to_radar(dtree, include_fields=[], sweeps=sweeps)
+            sweep_index, rays, gates = selector(geometry)
+            if sweeps is not None:
+                sweep_index = [sweeps[i] for i in sweep_index]
+            sweeps = sweep_index
+        return datatree_to_radar(
+            dtree,
+            include_fields=include_fields,
+            exclude_fields=exclude_fields,
+            sweeps=sweeps,
+            rays=rays,
+            gates=gates,
+        )
+    else:
+        raise ValueError(
+            f"Invalid radar reader backend: {backend}. Please choose 'pyart' or 'xradar'."
+        )
+
+
+def _sweep_names(dtree):
+    return [name for name in dtree.children if name.startswith("sweep_")]
+
+
+def _field_names(sweep, include_fields=None, exclude_fields=None):
+    fields = [
+        var
+        for var in sweep.data_vars
+        if sweep[var].ndim == 2 and sweep[var].dims[-1] == "range"
+    ]
+    if include_fields is not None:
+        fields = [var for var in fields if var in include_fields]
+    if exclude_fields is not None:
+        fields = [var for var in fields if var not in exclude_fields]
+    return fields
+
+
+def datatree_to_radar(
+    dtree, include_fields=None, exclude_fields=None, sweeps=None, rays=None, gates=None
+):
+    """
+    Convert a lazily opened xradar DataTree into a Py-ART Radar object,
+    only loading the selected sweeps, rays, gates and fields from disk.
+
+    Parameters
+    ----------
+    dtree : xarray.DataTree
+        The radar DataTree opened with xradar using first_dim='time'.
+    include_fields : list or None, optional
+        List of fields to load. Set to None to load all fields.
+    exclude_fields : list or None, optional
+        List of fields to skip.
+    sweeps : list or None, optional
+        List of sweep indices to load. Set to None to load all sweeps.
+    rays : list or None, optional
+        For each loaded sweep, the indices of the rays to load within the
+        sweep. Set to None to load all rays.
+    gates : slice or None, optional
+        The range gates to load. Set to None to load all gates.
+
+    Returns
+    -------
+    radar : pyart.core.Radar
+        The radar object.
+    """
+    names = _sweep_names(dtree)
+    if sweeps is not None:
+        names = [names[i] for i in sweeps]
+    if gates is None:
+        gates = slice(None)
+
+    sweep_ds = []
+    for i, name in enumerate(names):
+        ds = dtree[name].to_dataset()
+        if rays is not None:
+            ds = ds.isel(time=rays[i])
+        sweep_ds.append(ds.isel(range=gates))
+
+    field_names = _field_names(sweep_ds[0], include_fields, exclude_fields)
+    ray_count = np.array([ds.sizes["time"] for ds in sweep_ds])
+
+    times = np.concatenate([ds["time"].values for ds in sweep_ds])
+    start = pd.Timestamp(times.min()).floor("s").to_pydatetime()
+    _time = get_metadata("time")
+    _time["units"] = make_time_unit_str(start)
+    _time["data"] = (times - np.datetime64(start)) / np.timedelta64(1, "s")
+
+    _range = get_metadata("range")
+    _range.update(sweep_ds[0]["range"].attrs)
+    # Py-ART keeps the coordinates as masked arrays, which changes the precision
+    # of the gate locations computed from float32 coordinates.
+    _range["data"] = np.ma.asarray(sweep_ds[0]["range"].values)
+    if "meters_between_gates" not in _range and len(_range["data"]) > 1:
+        _range["meters_between_gates"] = _range["data"][1] - _range["data"][0]
+    if "meters_to_center_of_first_gate" not in _range and len(_range["data"]) > 0:
+        _range["meters_to_center_of_first_gate"] = _range["data"][0]
+
+    fields = {}
+    for field in field_names:
+        attrs = dict(sweep_ds[0][field].attrs)
+        attrs["_FillValue"] = get_fillvalue()
+        data = np.ma.masked_invalid(
+            np.concatenate([ds[field].values for ds in sweep_ds])
+        )
+        # Mask the netCDF default fill value as netCDF4 does for Py-ART
+        default_fill = default_fillvals.get(data.dtype.str[1:])
+        if default_fill is not None:
+            data[data == default_fill] = np.ma.masked
+        attrs["data"] = data
+        fields[field] = attrs
+
+    root = dtree.to_dataset()
+    latitude = get_metadata("latitude")
+    longitude = get_metadata("longitude")
+    altitude = get_metadata("altitude")
+    latitude["data"] = np.atleast_1d(root["latitude"].values).astype("float64")
+    longitude["data"] = np.atleast_1d(root["longitude"].values).astype("float64")
+    altitude["data"] = np.atleast_1d(root["altitude"].values).astype("float64")
+
+    sweep_number = get_metadata("sweep_number")
+    sweep_mode = get_metadata("sweep_mode")
+    fixed_angle = get_metadata("fixed_angle")
+    sweep_start_ray_index = get_metadata("sweep_start_ray_index")
+    sweep_end_ray_index = get_metadata("sweep_end_ray_index")
+    sweep_number["data"] = np.arange(len(sweep_ds), dtype="int32")
+    sweep_mode["data"] = np.array(
+        [str(ds["sweep_mode"].values) for ds in sweep_ds], dtype="U20"
+    )
+    fixed_angle["data"] = np.array(
+        [ds["sweep_fixed_angle"].values for ds in sweep_ds], dtype="float32"
+    )
+    sweep_start_ray_index["data"] = np.cumsum(
+        np.append([0], ray_count[:-1]), dtype="int32"
+    )
+    sweep_end_ray_index["data"] = np.cumsum(ray_count, dtype="int32") - 1
+
+    azimuth = get_metadata("azimuth")
+    elevation = get_metadata("elevation")
+    azimuth["data"] = np.ma.asarray(
+        np.concatenate([ds["azimuth"].values for ds in sweep_ds])
+    )
+    elevation["data"] = np.ma.asarray(
+        np.concatenate([ds["elevation"].values for ds in sweep_ds])
+    )
+
+    scan_type = "rhi" if all("rhi" in m for m in sweep_mode["data"]) else "ppi"
+    metadata = {
+        k: v
+        for k, v in dtree.attrs.items()
+        if not isinstance(v, (datetime.datetime, np.ndarray))
+    }
+
+    return pyart.core.Radar(
+        _time,
+        _range,
+        fields,
+        metadata,
+        scan_type,
+        latitude,
+        longitude,
+        altitude,
+        sweep_number,
+        sweep_mode,
+        fixed_angle,
+        sweep_start_ray_index,
+        sweep_end_ray_index,
+        azimuth,
+        elevation,
+    )
+
+
+def subset_radar(radar, sweeps, rays, gates):
+    """
+    Create a new radar containing only the selected sweeps, rays and gates.
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar to subset.
+    sweeps : array_like
+        Indices of the sweeps to keep.
+    rays : list
+        For each kept sweep, the indices of the rays to keep within the sweep.
+    gates : slice
+        The range gates to keep.
+
+    Returns
+    -------
+    radar : pyart.core.Radar
+        Radar object which contains a copy of the selected data.
+    """
+    sweeps = np.asarray(sweeps, dtype="int32")
+    starts = np.asarray(radar.sweep_start_ray_index["data"])[sweeps]
+    ray_index = np.concatenate(
+        [start + np.asarray(r, dtype="int32") for start, r in zip(starts, rays)]
+    ).astype("int32")
+    ray_count = np.array([len(r) for r in rays], dtype="int32")
+    nrays = radar.nrays
+    nsweeps = len(radar.sweep_number["data"])
+
+    def mkdic(dic, select):
+        if dic is None:
+            return None
+        d = dic.copy()
+        if "data" in d and select is not None:
+            d["data"] = d["data"][select].copy()
+        return d
+
+    def select_dim0(dic):
+        # Select along the leading dimension, which is either rays or sweeps
+        if dic is None:
+            return None
+        if np.ndim(dic["data"]) == 0:
+            return mkdic(dic, None)
+        if dic["data"].shape[0] == nrays:
+            return mkdic(dic, ray_index)
+        if dic["data"].shape[0] == nsweeps:
+            return mkdic(dic, sweeps)
+        return mkdic(dic, None)
+
+    if len(radar.altitude["data"]) == 1:
+        loc_select = None
+    else:
+        loc_select = sweeps
+
+    _range = mkdic(radar.range, gates)
+    fields = {}
+    for field_name, dic in radar.fields.items():
+        fields[field_name] = mkdic(dic, None)
+        fields[field_name]["data"] = dic["data"][ray_index, gates].copy()
+
+    sweep_start_ray_index = mkdic(radar.sweep_start_ray_index, None)
+    sweep_start_ray_index["data"] = np.cumsum(
+        np.append([0], ray_count[:-1]), dtype="int32"
+    )
+    sweep_end_ray_index = mkdic(radar.sweep_end_ray_index, None)
+    sweep_end_ray_index["data"] = np.cumsum(ray_count, dtype="int32") - 1
+
+    if radar.instrument_parameters is None:
+        instrument_parameters = None
+    else:
+        instrument_parameters = {
+            key: select_dim0(dic) for key, dic in radar.instrument_parameters.items()
+        }
+
+    return pyart.core.Radar(
+        mkdic(radar.time, ray_index),
+        _range,
+        fields,
+        mkdic(radar.metadata, None),
+        str(radar.scan_type),
+        mkdic(radar.latitude, loc_select),
+        mkdic(radar.longitude, loc_select),
+        mkdic(radar.altitude, loc_select),
+        mkdic(radar.sweep_number, sweeps),
+        mkdic(radar.sweep_mode, sweeps),
+        mkdic(radar.fixed_angle, sweeps),
+        sweep_start_ray_index,
+        sweep_end_ray_index,
+        mkdic(radar.azimuth, ray_index),
+        mkdic(radar.elevation, ray_index),
+        altitude_agl=mkdic(radar.altitude_agl, loc_select),
+        target_scan_rate=mkdic(radar.target_scan_rate, sweeps),
+        scan_rate=mkdic(radar.scan_rate, ray_index),
+        antenna_transition=mkdic(radar.antenna_transition, ray_index),
+        instrument_parameters=instrument_parameters,
+    )
@@ -1,7 +1,82 @@
 from .column_utils import (
     subset_points,
+    subset_points_batch,
     match_datasets_act,
+    resample_ground_datasets,
+    prepare_ground_datasets,
+    merge_matched_dataset,
+    get_fill_values,
     get_nexrad_column,
+    get_site_gate_selection,
+    get_site_coverage,
 )  # noqa: F401
+from .scheduling import FileCostModel, schedule_files  # noqa: F401
+from .binning import (
+    get_bin_edges,
+    bin_statistics,
+    bin_column,
+    get_time_windows,
+    window_statistics,
+)  # noqa: F401
+from .column_extraction import (
+    get_geometry_key,
+    get_column_footprints,
+    gather_footprint_samples,
+    reduce_footprint_samples,
+    regrid_column_values,
+    get_cached_footprints,
+    footprint_columns,
+    thread_map,
+)  # noqa: F401
+from .kernels import NUMBA_AVAILABLE, group_mean, interp_rows  # noqa: F401
+from .spill import ColumnStore, enforce_memory_budget  # noqa: F401
+from .events import (
+    ProgressEvent,
+    ProgressTracker,
+    ProgressBar,
+    JSONLinesWriter,
+)  # noqa: F401
+from .profiling import RunProfiler, get_profile_paths  # noqa: F401
+from .cache import DiskCache, file_fingerprint, make_cache_key  # noqa: F401
 
-__all__ = ["subset_points", "match_datasets_act", "get_nexrad_column"]
+__all__ = [
+    "subset_points",
+    "subset_points_batch",
+    "match_datasets_act",
+    "resample_ground_datasets",
+    "prepare_ground_datasets",
+    "merge_matched_dataset",
+    "get_fill_values",
+    "get_nexrad_column",
+    "get_site_gate_selection",
+    "get_site_coverage",
+    "FileCostModel",
+    "schedule_files",
+    "get_bin_edges",
+    "bin_statistics",
+    "bin_column",
+    "get_time_windows",
+    "window_statistics",
+    "get_geometry_key",
+    "get_column_footprints",
+    "gather_footprint_samples",
+    "reduce_footprint_samples",
+    "regrid_column_values",
+    "get_cached_footprints",
+    "footprint_columns",
+    "thread_map",
+    "NUMBA_AVAILABLE",
+    "group_mean",
+    "interp_rows",
+    "ColumnStore",
+    "enforce_memory_budget",
+    "ProgressEvent",
+    "ProgressTracker",
+    "ProgressBar",
+    "JSONLinesWriter",
+    "RunProfiler",
+    "get_profile_paths",
+    "DiskCache",
+    "file_fingerprint",
+    "make_cache_key",
+]
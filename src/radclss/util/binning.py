@@ -0,0 +1,289 @@
+import numpy as np
+import pandas as pd
+
+BIN_STATISTICS = ["mean", "max", "count"]
+
+# Statistics computed by window_statistics
+WINDOW_STATISTICS = ["mean", "sum", "min", "max", "std", "count"]
+
+
+def get_bin_edges(bins):
+    """
+    Get the edges of a set of bins from their centers.
+
+    The edges are halfway between consecutive bin centers. The outer edges
+    are half a bin spacing outside of the first and last bin center.
+
+    Parameters
+    ----------
+    bins : numpy array
+        The monotonically increasing bin centers.
+
+    Returns
+    -------
+    edges : numpy array
+        The bin edges, with one more element than bins.
+    """
+    bins = np.asarray(bins, dtype="float64")
+    if bins.size == 1:
+        return np.array([-np.inf, np.inf])
+    mid = 0.5 * (bins[1:] + bins[:-1])
+    return np.concatenate(
+        [[bins[0] - (mid[0] - bins[0])], mid, [bins[-1] + (bins[-1] - mid[-1])]]
+    )
+
+
+def bin_statistics(values, positions, edges, statistic="mean"):
+    """
+    Reduce a set of variables into bins of a coordinate.
+
+    The samples are assigned to the bins once with np.searchsorted, and all
+    variables are reduced together with np.add.reduceat style operations.
+    NaN values are ignored.
+
+    Parameters
+    ----------
+    values : numpy array
+        Array of shape (nvars, nsamples) containing the variables to reduce.
+    positions : numpy array
+        The coordinate of each sample (i.e. its height).
+    edges : numpy array
+        The bin edges, see :func:`get_bin_edges`.
+    statistic : str, optional
+        The statistic to compute in each bin, either 'mean', 'max' or
+        'count'. Default is 'mean'.
+
+    Returns
+    -------
+    result : numpy array
+        Array of shape (nvars, nbins) with the statistic of each bin. Bins
+        without any valid sample are NaN, or 0 for 'count'.
+    """
+    if statistic not in BIN_STATISTICS:
+        raise ValueError(f"statistic must be one of {BIN_STATISTICS}, got {statistic}.")
+    values = np.atleast_2d(np.asarray(values, dtype="float64"))
+    positions = np.asarray(positions, dtype="float64")
+    nbins = len(edges) - 1
+
+    index = np.searchsorted(edges, positions, side="right") - 1
+    inside = np.isfinite(positions) & (index >= 0) & (index < nbins)
+    index = index[inside]
+    values = values[:, inside]
+    order = np.argsort(index, kind="stable")
+    index = index[order]
+    values = values[:, order]
+
+    fill = 0 if statistic == "count" else np.nan
+    result = np.full((values.shape[0], nbins), fill, dtype="float64")
+    if index.size == 0:
+        return result
+    # Start of each run of samples in the same bin
+    starts = np.flatnonzero(np.diff(index, prepend=-1))
+    occupied = index[starts]
+
+    finite = np.isfinite(values)
+    count = np.add.reduceat(finite, starts, axis=1)
+    if statistic == "count":
+        result[:, occupied] = count
+    elif statistic == "mean":
+        total = np.add.reduceat(np.where(finite, values, 0.0), starts, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[:, occupied] = np.where(count > 0, total / count, np.nan)
+    else:
+        maximum = np.maximum.reduceat(np.where(finite, values, -np.inf), starts, axis=1)
+        result[:, occupied] = np.where(count > 0, maximum, np.nan)
+    return result
+
+
+def get_time_windows(times, window=None):
+    """
+    Get the sample windows of a set of times, such as the radar times.
+
+    Parameters
+    ----------
+    times : numpy array
+        The increasing times (datetime64 or numbers) of the windows.
+    window : str, numpy timedelta64 or None, optional
+        Width of the windows, closed on the right (samples later than
+        times - window and no later than times). Set to None to split the
+        time between consecutive times in half, so every sample between the
+        outer edges belongs to exactly one window. Default is None.
+
+    Returns
+    -------
+    starts, stops : numpy array
+        The (exclusive) start and (inclusive) stop of each window, in the
+        units of times.
+    """
+    times = np.asarray(times)
+    if window is not None:
+        window = pd.to_timedelta(window).to_timedelta64()
+        return times - window, times
+    if np.issubdtype(times.dtype, np.datetime64):
+        numeric = times.astype("datetime64[ns]").astype("int64").astype("float64")
+        edges = get_bin_edges(numeric)
+        # The edges of a single time are infinite
+        edges = np.clip(edges, -(2.0**62), 2.0**62).astype("int64")
+        edges = edges.astype("datetime64[ns]")
+    else:
+        edges = get_bin_edges(times)
+    return edges[:-1], edges[1:]
+
+
+def window_statistics(values, positions, starts, stops, statistic="mean"):
+    """
+    Reduce a set of variables over windows of a coordinate in one pass.
+
+    The windows of the sorted samples are found with np.searchsorted, the
+    count, sum, mean and standard deviation are differences of cumulative
+    sums, and the minimum and maximum use np.minimum.reduceat and
+    np.maximum.reduceat, so each statistic is a single scan of the samples.
+    The windows may overlap or leave gaps. NaN values are ignored.
+
+    Parameters
+    ----------
+    values : numpy array
+        Array of shape (nvars, nsamples) containing the variables to reduce.
+    positions : numpy array
+        The coordinate of each sample (i.e. its time).
+    starts, stops : numpy array
+        The exclusive start and inclusive stop of each window, see
+        :func:`get_time_windows`.
+    statistic : str or list, optional
+        The statistic to compute in each window, one of 'mean', 'sum', 'min',
+        'max', 'std' (with zero degrees of freedom) or 'count', or a list of
+        them to compute several statistics from the same scan.
+        Default is 'mean'.
+
+    Returns
+    -------
+    result : numpy array or dict
+        Array of shape (nvars, nwindows) with the statistic of each window,
+        or a dictionary of such arrays for each statistic of a list. Windows
+        without any valid sample are NaN, or 0 for 'count'.
+    """
+    statistics = [statistic] if isinstance(statistic, str) else list(statistic)
+    for name in statistics:
+        if name not in WINDOW_STATISTICS:
+            raise ValueError(
+                f"statistic must be one of {WINDOW_STATISTICS}, got {name}."
+            )
+    values = np.atleast_2d(np.asarray(values, dtype="float64"))
+    positions = np.asarray(positions)
+    if positions.size > 1 and np.any(positions[1:] < positions[:-1]):
+        order = np.argsort(positions, kind="stable")
+        positions = positions[order]
+        values = values[:, order]
+    lo = np.searchsorted(positions, starts, side="right")
+    hi = np.searchsorted(positions, stops, side="right")
+    hi = np.maximum(hi, lo)
+
+    finite = np.isfinite(values)
+    zero = np.zeros((values.shape[0], 1))
+    cumulative = np.concatenate([zero, np.cumsum(finite, axis=1)], axis=1)
+    count = cumulative[:, hi] - cumulative[:, lo]
+    empty = count == 0
+
+    result = {}
+    if any(name in ["mean", "sum", "std"] for name in statistics):
+        # Offsetting by the mean of each variable limits the cancellation in
+        # the differences of cumulative sums
+        with np.errstate(invalid="ignore"):
+            offset = np.nanmean(np.where(finite, values, np.nan), axis=1)
+        offset = np.where(np.isfinite(offset), offset, 0.0)[:, np.newaxis]
+        shifted = np.where(finite, values - offset, 0.0)
+        cumulative = np.concatenate([zero, np.cumsum(shifted, axis=1)], axis=1)
+        shifted_sum = cumulative[:, hi] - cumulative[:, lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shifted_mean = shifted_sum / count
+        if "sum" in statistics:
+            result["sum"] = np.where(empty, np.nan, shifted_sum + offset * count)
+        if "mean" in statistics:
+            result["mean"] = np.where(empty, np.nan, shifted_mean + offset)
+        if "std" in statistics:
+            cumulative = np.concatenate([zero, np.cumsum(shifted**2, axis=1)], axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                variance = (cumulative[:, hi] - cumulative[:, lo]) / count
+                variance = variance - shifted_mean**2
+            # The rounding of the differences is not zero for single samples
+            variance = np.where(count == 1, 0.0, variance)
+            result["std"] = np.where(empty, np.nan, np.sqrt(np.maximum(variance, 0)))
+    for name, ufunc, fill in [
+        ("min", np.minimum, np.inf),
+        ("max", np.maximum, -np.inf),
+    ]:
+        if name not in statistics:
+            continue
+        # reduceat over interleaved (start, stop) indices reduces each window,
+        # with a sentinel so that the indices can point past the last sample
+        padded = np.concatenate(
+            [np.where(finite, values, fill), np.full_like(zero, fill)], axis=1
+        )
+        indices = np.stack([lo, hi], axis=1).ravel()
+        reduced = ufunc.reduceat(padded, indices, axis=1)[:, ::2]
+        result[name] = np.where(empty, np.nan, reduced)
+    if "count" in statistics:
+        result["count"] = count
+
+    if isinstance(statistic, str):
+        return result[statistic]
+    return {name: result[name] for name in statistics}
+
+
+def bin_column(column, height_bins, method="mean", count_name="height_bin_count"):
+    """
+    Regrid a radar column to height bins by reducing the samples that fall in
+    each bin, instead of interpolating between them.
+
+    Parameters
+    ----------
+    column : xarray Dataset
+        Column with a 'height' dimension, as returned by Py-ART's
+        column_vertical_profile. The heights do not need to be sorted and
+        may contain NaNs.
+    height_bins : numpy array
+        The height bin centers in meters.
+    method : str, optional
+        The statistic of the radar fields in each bin, either 'mean' or 'max'.
+        The time offset is always averaged. Default is 'mean'.
+    count_name : str or None, optional
+        Name of the variable holding the number of column samples in each
+        height bin. Set to None to not add the count. Default is
+        'height_bin_count'.
+
+    Returns
+    -------
+    column : xarray Dataset
+        The column on the height bins.
+    """
+    if method not in ["mean", "max"]:
+        raise ValueError(f"method must be 'mean' or 'max', got {method}.")
+    edges = get_bin_edges(height_bins)
+    heights = column["height"].values
+    names = [var for var in column.data_vars if column[var].dims == ("height",)]
+    fields = [var for var in names if var != "time_offset"]
+    values = np.stack([column[var].values.astype("float64") for var in fields])
+    binned = bin_statistics(values, heights, edges, statistic=method)
+
+    out = column.drop_dims("height")
+    out = out.assign_coords(height=("height", height_bins, column["height"].attrs))
+    for var, data in zip(fields, binned):
+        out[var] = ("height", data, column[var].attrs)
+    if "time_offset" in names:
+        time_offset = bin_statistics(
+            column["time_offset"].values, heights, edges, statistic="mean"
+        )
+        out["time_offset"] = ("height", time_offset[0], column["time_offset"].attrs)
+    if count_name is not None:
+        count = bin_statistics(
+            np.ones((1, len(heights))), heights, edges, statistic="count"
+        )
+        out[count_name] = (
+            "height",
+            count[0].astype("int32"),
+            {
+                "long_name": "Number of radar column samples in height bin",
+                "units": "1",
+            },
+        )
+    return out
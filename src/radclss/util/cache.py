@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import xarray as xr
+
+from dask.utils import parse_bytes
+
+# Version of the cached data, part of every key so that entries written by
+# an incompatible version of RadCLss are never read
+CACHE_VERSION = 2
+
+# Global attribute holding the attributes of the cached dataset
+_ATTRS_KEY = "radclss_cache_attrs"
+
+
+def file_fingerprint(filename, checksum=False):
+    """
+    Get the fingerprint of a file, which changes when the file changes.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the file.
+    checksum : bool, optional
+        Set to True to use the SHA-256 checksum of the contents of the file,
+        or False to use its size and modification time. Default is False.
+
+    Returns
+    -------
+    fingerprint : list
+        The absolute path of the file and its checksum, or its size and
+        modification time in nanoseconds.
+    """
+    filename = os.path.abspath(filename)
+    if checksum:
+        digest = hashlib.sha256()
+        with open(filename, "rb") as fi:
+            for block in iter(lambda: fi.read(1 << 20), b""):
+                digest.update(block)
+        return [filename, digest.hexdigest()]
+    stat = os.stat(filename)
+    return [filename, stat.st_size, stat.st_mtime_ns]
+
+
+def make_cache_key(*parts):
+    """
+    Make a cache key from JSON serializable parts, such as file fingerprints
+    and processing parameters.
+
+    Returns
+    -------
+    key : str
+        The hexadecimal SHA-256 digest of the parts.
+    """
+    text = json.dumps([CACHE_VERSION, *parts], default=_to_json, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent cache of xarray datasets in a directory, with least recently
+    used eviction above a size limit.
+
+    Each entry is a netCDF file named after its key (see
+    :func:`make_cache_key`). Entries are written atomically, so a cache
+    directory can be shared by the workers of a Dask cluster on a shared
+    file system.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the cache. It is created if needed.
+    max_bytes : int, str or None, optional
+        Maximum size of the cache in bytes, or a string such as '20GB'. The
+        least recently used entries are removed when it is exceeded. Set to
+        None for no limit. Default is None.
+    checksum : bool, optional
+        Set to True to fingerprint the input files by their checksum instead
+        of their size and modification time (see :func:`file_fingerprint`).
+        Default is False.
+    """
+
+    def __init__(self, directory, max_bytes=None, checksum=False):
+        if isinstance(max_bytes, str):
+            max_bytes = parse_bytes(max_bytes)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.checksum = checksum
+        os.makedirs(directory, exist_ok=True)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    @property
+    def nbytes(self):
+        """Size of the cache in bytes."""
+        return sum(os.path.getsize(path) for path in self._entries())
+
+    def fingerprint(self, filename):
+        """Fingerprint of an input file, see :func:`file_fingerprint`."""
+        return file_fingerprint(filename, checksum=self.checksum)
+
+    def get(self, key):
+        """
+        Get a dataset from the cache.
+
+        Returns
+        -------
+        ds : xarray.Dataset or None
+            The cached dataset, loaded in memory, or None if the key is not
+            in the cache.
+        """
+        path = self._path(key)
+        try:
+            with xr.open_dataset(path, decode_timedelta=True) as ds:
+                ds = ds.load()
+        except (OSError, ValueError):
+            # Missing, or unreadable entries are discarded
+            self.invalidate(key)
+            return None
+        attrs = json.loads(ds.attrs.pop(_ATTRS_KEY, "{}"))
+        ds.attrs = attrs.get("", {})
+        for var in ds.variables:
+            ds[var].attrs = attrs.get(f"/{var}", {})
+        # Mark the entry as recently used
+        os.utime(path)
+        return ds
+
+    def put(self, key, ds):
+        """Add a dataset to the cache and evict entries above max_bytes."""
+        attrs = {"": dict(ds.attrs)}
+        out = ds.copy()
+        out.attrs = {}
+        encoding = {}
+        for var in out.variables:
+            attrs[f"/{var}"] = dict(out[var].attrs)
+            out[var].attrs = {}
+            out[var].encoding = {}
+            if out[var].dtype.kind in "fiu":
+                encoding[var] = {"_FillValue": None}
+        out.attrs[_ATTRS_KEY] = json.dumps(attrs, default=_to_json)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            out.to_netcdf(tmp, encoding=encoding)
+            os.replace(tmp, self._path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def invalidate(self, key=None):
+        """Remove an entry from the cache, or every entry if key is None."""
+        paths = self._entries() if key is None else [self._path(key)]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        self.invalidate()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in
+        max_bytes.
+
+        Returns
+        -------
+        nbytes : int
+            Number of bytes removed.
+        """
+        if self.max_bytes is None:
+            return 0
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(x[1] for x in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.invalidate(os.path.basename(path)[: -len(".nc")])
+            total -= size
+            removed += size
+        return removed
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.nc")
+
+    def _entries(self):
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".nc")
+        ]
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
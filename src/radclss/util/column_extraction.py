@@ -0,0 +1,423 @@
+import hashlib
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pyart.core.transforms import antenna_vectors_to_cartesian
+from pyart.util import datetime_from_radar
+from pyart.util.columnsect import (
+    assemble_column,
+    sphere_distance,
+    for_azimuth,
+    get_sweep_rays,
+)
+
+from .binning import bin_statistics, get_bin_edges
+from .kernels import group_mean, interp_rows
+
+
+def get_geometry_key(radar):
+    """
+    Get a key identifying the scan geometry of a radar volume.
+
+    Volumes with the same key have identical range gates, ray angles, sweep
+    indices, location and fields, so their site columns can be extracted
+    together with the same footprints.
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar volume.
+
+    Returns
+    -------
+    key : str
+        Hex digest of the scan geometry.
+    """
+    digest = hashlib.sha1()
+    for dic in [
+        radar.range,
+        radar.azimuth,
+        radar.elevation,
+        radar.sweep_start_ray_index,
+        radar.sweep_end_ray_index,
+        radar.latitude,
+        radar.longitude,
+        radar.altitude,
+    ]:
+        digest.update(np.ma.getdata(dic["data"]).astype("float64").tobytes())
+    digest.update(str(radar.range.get("meters_between_gates")).encode())
+    digest.update(",".join(radar.fields.keys()).encode())
+    return digest.hexdigest()
+
+
+def thread_map(func, items, n_threads=1):
+    """
+    Map a function over items with a pool of threads, keeping their order.
+
+    NumPy releases the GIL in most array operations, so the threads can use
+    several cores.
+
+    Parameters
+    ----------
+    func : callable
+        Function applied to each item.
+    items : iterable
+        Items to map func over.
+    n_threads : int, optional
+        Number of threads. With 1 or None, func is applied serially.
+        Default is 1.
+
+    Returns
+    -------
+    results : list
+        Result of func for each item, in the order of items.
+    """
+    items = list(items)
+    if n_threads is None or n_threads <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(n_threads, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+# Footprints of the most recently seen scan geometries
+_FOOTPRINT_CACHE = OrderedDict()
+FOOTPRINT_CACHE_SIZE = 16
+
+
+def get_column_footprints(radar, input_site_dict, azimuth_spread=3, spatial_spread=3):
+    """
+    Find the rays and gates that make up the column above each site in
+    every sweep of a radar volume.
+
+    The footprints follow the ray and gate matching of Py-ART's
+    column_vertical_profile and only depend on the scan geometry, so they
+    can be reused for every volume with the same geometry
+    (see :func:`get_geometry_key`).
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar volume. Only the coordinates are used.
+    input_site_dict : dict
+        Dictionary containing the site names as keys and their
+        lat/lon coordinates as values in a list format:
+        {'site1': [lat1, lon1, alt1],
+        'site2': [lat2, lon2, alt2],
+        ...}
+    azimuth_spread : int, optional
+        Number of azimuth angles included in the column extraction.
+        Default is 3.
+    spatial_spread : int, optional
+        Number of range gates included in the column extraction. Default is 3.
+
+    Returns
+    -------
+    footprint : dict
+        Dictionary with the ray and gate index of each sample ('rays',
+        'gates'), the ray group of each sample ('sample_ray'), the column
+        (site and sweep) of each ray group ('ray_column'), the rays timing
+        each column ('time_rays', 'time_column'), the column heights
+        ('height', shape (nsites, nsweeps)) and the number of sites and
+        sweeps ('nsites', 'nsweeps').
+    """
+    spatial_range = radar.range["meters_between_gates"] * spatial_spread
+    radar_lat = radar.latitude["data"][0]
+    radar_lon = radar.longitude["data"][0]
+    radar_alt = radar.altitude["data"][0]
+    slices = list(radar.iter_slice())
+    nsweeps = len(slices)
+
+    rays = []
+    gates = []
+    sample_ray = []
+    ray_column = []
+    time_rays = []
+    time_column = []
+    height = np.full((len(input_site_dict), nsweeps), np.nan)
+    for i, site in enumerate(input_site_dict.values()):
+        dis = sphere_distance(radar_lat, site[0], radar_lon, site[1])
+        forazi = for_azimuth(radar_lat, site[0], radar_lon, site[1])
+        for j, sweep in enumerate(slices):
+            column = i * nsweeps + j
+            center, spread = get_sweep_rays(
+                radar.azimuth["data"][sweep], forazi, azimuth_spread=azimuth_spread
+            )
+            zgates = []
+            for ray in center + [x for x in spread if x not in center]:
+                ray = ray + sweep.start
+                time_rays.append(ray)
+                time_column.append(column)
+                rhi_x, rhi_y, rhi_z = antenna_vectors_to_cartesian(
+                    radar.range["data"],
+                    radar.azimuth["data"][ray],
+                    radar.elevation["data"][ray],
+                    edges=False,
+                )
+                rhidis = np.sqrt((rhi_x**2) + (rhi_y**2)) * np.sign(rhi_z)
+                tar_gate = np.nonzero(np.abs(rhidis[0, :] - dis) < spatial_range)[0]
+                zgates.append(np.ma.mean(rhi_z[0, tar_gate] + radar_alt))
+                if tar_gate.size == 0:
+                    continue
+                rays.append(np.full(tar_gate.size, ray))
+                gates.append(tar_gate)
+                sample_ray.append(np.full(tar_gate.size, len(ray_column)))
+                ray_column.append(column)
+            if len(zgates) > 0:
+                height[i, j] = np.ma.filled(
+                    np.ma.mean(np.ma.masked_invalid(zgates)), np.nan
+                )
+
+    def _concat(arrays):
+        if len(arrays) == 0:
+            return np.zeros(0, dtype="int64")
+        return np.concatenate(arrays).astype("int64")
+
+    return {
+        "rays": _concat(rays),
+        "gates": _concat(gates),
+        "sample_ray": _concat(sample_ray),
+        "ray_column": np.array(ray_column, dtype="int64"),
+        "time_rays": np.array(time_rays, dtype="int64"),
+        "time_column": np.array(time_column, dtype="int64"),
+        "height": height,
+        "nsites": len(input_site_dict),
+        "nsweeps": nsweeps,
+    }
+
+
+def gather_footprint_samples(radar, footprint, fields, n_threads=1):
+    """
+    Gather the gate values of the column footprints from a radar volume.
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar volume.
+    footprint : dict
+        Footprints returned by :func:`get_column_footprints`.
+    fields : list
+        Names of the fields to gather.
+    n_threads : int, optional
+        Number of threads gathering the fields in parallel. Default is 1.
+
+    Returns
+    -------
+    samples : numpy array
+        Array of shape (nfields, nsamples), with masked gates set to NaN.
+    times : numpy array
+        Time of the rays timing each column, in seconds since the start of
+        the volume.
+    """
+    samples = np.full((len(fields), footprint["rays"].size), np.nan)
+
+    def _gather(i):
+        data = radar.fields[fields[i]]["data"][footprint["rays"], footprint["gates"]]
+        samples[i] = np.ma.filled(np.ma.masked_invalid(data).astype("float64"), np.nan)
+
+    thread_map(_gather, range(len(fields)), n_threads)
+    times = np.asarray(radar.time["data"], dtype="float64")[footprint["time_rays"]]
+    return samples, times
+
+
+def reduce_footprint_samples(samples, times, footprint, use_numba=None):
+    """
+    Average gathered footprint samples into the values of each column.
+
+    Gates are first averaged over each ray, and the rays are then averaged
+    over each sweep, as done by Py-ART's column_vertical_profile.
+
+    Parameters
+    ----------
+    samples : numpy array
+        Array of shape (..., nsamples) returned by
+        :func:`gather_footprint_samples`, optionally stacked over volumes.
+    times : numpy array
+        Array of shape (..., ntimes) of the ray times.
+    footprint : dict
+        Footprints returned by :func:`get_column_footprints`.
+    use_numba : bool or None, optional
+        Set to True to use the Numba kernels, False to use NumPy, or None to
+        use Numba if it is installed. Default is None.
+
+    Returns
+    -------
+    values : numpy array
+        Array of shape (..., nsites, nsweeps) of the column values.
+    time_offset : numpy array
+        Array of shape (..., nsites, nsweeps) of the column time offsets.
+    """
+    ncolumns = footprint["nsites"] * footprint["nsweeps"]
+    ray_values = group_mean(
+        samples, footprint["sample_ray"], len(footprint["ray_column"]), use_numba
+    )
+    values = np.round(
+        group_mean(ray_values, footprint["ray_column"], ncolumns, use_numba), 4
+    )
+    time_offset = np.round(
+        group_mean(times, footprint["time_column"], ncolumns, use_numba), 4
+    )
+    shape = (footprint["nsites"], footprint["nsweeps"])
+    return (
+        values.reshape(values.shape[:-1] + shape),
+        time_offset.reshape(time_offset.shape[:-1] + shape),
+    )
+
+
+def regrid_column_values(
+    values, height, height_bins, vertical_method="interp", use_numba=None
+):
+    """
+    Regrid column values from the sweep heights to the height bins.
+
+    Parameters
+    ----------
+    values : numpy array
+        Array of shape (..., nsweeps) of column values.
+    height : numpy array
+        Height of each sweep above the site, which may contain NaNs.
+    height_bins : numpy array
+        The height bins in meters.
+    vertical_method : str, optional
+        'interp' to linearly interpolate between the sweeps, or 'mean' and
+        'max' to reduce the sweeps falling in each height bin.
+        Default is 'interp'.
+    use_numba : bool or None, optional
+        Set to True to use the Numba kernels, False to use NumPy, or None to
+        use Numba if it is installed. Default is None.
+
+    Returns
+    -------
+    values : numpy array
+        Array of shape (..., nbins) of the values on the height bins.
+    """
+    # Keep the last sweep at duplicated heights, like Py-ART
+    keep = ~pd.Index(height).duplicated(keep="last")
+    keep &= np.isfinite(height)
+    height = height[keep]
+    values = values[..., keep]
+    shape = values.shape[:-1]
+    values = values.reshape(int(np.prod(shape)), height.size)
+    if vertical_method in ["mean", "max"]:
+        result = bin_statistics(
+            values, height, get_bin_edges(height_bins), statistic=vertical_method
+        )
+    elif vertical_method == "interp":
+        order = np.argsort(height, kind="stable")
+        result = interp_rows(
+            height_bins, height[order], values[:, order], use_numba=use_numba
+        )
+    else:
+        raise ValueError(
+            f"vertical_method must be 'interp', 'mean' or 'max', got {vertical_method}."
+        )
+    return result.reshape(shape + (len(height_bins),))
+
+
+def get_cached_footprints(radar, input_site_dict, azimuth_spread=3, spatial_spread=3):
+    """
+    Get the column footprints of a radar volume, reusing the footprints of
+    a previous volume with the same scan geometry and sites.
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar volume.
+    input_site_dict : dict
+        Dictionary containing the site names as keys and their
+        lat/lon coordinates as values in a list format.
+    azimuth_spread : int, optional
+        Number of azimuth angles included in the column extraction.
+        Default is 3.
+    spatial_spread : int, optional
+        Number of range gates included in the column extraction. Default is 3.
+
+    Returns
+    -------
+    footprint : dict
+        Footprints returned by :func:`get_column_footprints`.
+    """
+    key = (
+        get_geometry_key(radar),
+        tuple((k, tuple(v)) for k, v in input_site_dict.items()),
+        azimuth_spread,
+        spatial_spread,
+    )
+    if key in _FOOTPRINT_CACHE:
+        _FOOTPRINT_CACHE.move_to_end(key)
+        return _FOOTPRINT_CACHE[key]
+    footprint = get_column_footprints(
+        radar,
+        input_site_dict,
+        azimuth_spread=azimuth_spread,
+        spatial_spread=spatial_spread,
+    )
+    _FOOTPRINT_CACHE[key] = footprint
+    while len(_FOOTPRINT_CACHE) > FOOTPRINT_CACHE_SIZE:
+        _FOOTPRINT_CACHE.popitem(last=False)
+    return footprint
+
+
+def footprint_columns(
+    radar, input_site_dict, footprint=None, use_numba=None, n_threads=1
+):
+    """
+    Extract the radar column above each site from the column footprints,
+    returning the same columns as Py-ART's column_vertical_profile.
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar volume.
+    input_site_dict : dict
+        Dictionary containing the site names as keys and their
+        lat/lon coordinates as values in a list format.
+    footprint : dict or None, optional
+        Footprints returned by :func:`get_column_footprints`. Set to None to
+        use :func:`get_cached_footprints`. Default is None.
+    use_numba : bool or None, optional
+        Set to True to use the Numba kernels, False to use NumPy, or None to
+        use Numba if it is installed. Default is None.
+    n_threads : int, optional
+        Number of threads gathering the fields and assembling the columns
+        in parallel. Default is 1.
+
+    Returns
+    -------
+    columns : list
+        List of xarray Datasets with the column above each site.
+    """
+    if footprint is None:
+        footprint = get_cached_footprints(radar, input_site_dict)
+    fields = list(radar.fields.keys())
+    samples, times = gather_footprint_samples(
+        radar, footprint, fields, n_threads=n_threads
+    )
+    values, time_offset = reduce_footprint_samples(
+        samples, times, footprint, use_numba=use_numba
+    )
+    base_time = np.datetime64(datetime_from_radar(radar).isoformat(), "ns")
+    radar_lat = radar.latitude["data"][0]
+    radar_lon = radar.longitude["data"][0]
+
+    sites = list(input_site_dict.values())
+
+    def _assemble(i):
+        site = sites[i]
+        total_moment = {field: list(values[j, i]) for j, field in enumerate(fields)}
+        total_moment["height"] = list(footprint["height"][i])
+        total_moment["time_offset"] = list(time_offset[i])
+        total_moment["base_time"] = base_time
+        return assemble_column(
+            radar,
+            total_moment,
+            for_azimuth(radar_lat, site[0], radar_lon, site[1]),
+            sphere_distance(radar_lat, site[0], radar_lon, site[1]),
+            site[0],
+            site[1],
+        )
+
+    return thread_map(_assemble, range(len(sites)), n_threads)
@@ -2,16 +2,60 @@ import boto3
 import pyart
 import act
 import numpy as np
+import pandas as pd
 import xarray as xr
 import datetime
 import logging
 
 from datetime import timedelta
+from functools import partial
+from importlib.metadata import PackageNotFoundError, version
 from botocore.config import Config
 from botocore import UNSIGNED
+from pyart.core.transforms import antenna_vectors_to_cartesian
+from pyart.util.columnsect import sphere_distance, for_azimuth, get_sweep_rays
 
 from ..config import DEFAULT_DISCARD_VAR, DEFAULT_NEXRAD_RADARS
 from ..config import get_output_config
+from ..io.read import read_radar
+from .binning import (
+    WINDOW_STATISTICS,
+    bin_column,
+    bin_statistics,
+    get_bin_edges,
+    get_time_windows,
+    window_statistics,
+)
+from .dod_utils import pack_variables
+from .cache import make_cache_key
+from .column_extraction import (
+    thread_map,
+    get_geometry_key,
+    get_cached_footprints,
+    footprint_columns,
+    gather_footprint_samples,
+    reduce_footprint_samples,
+    regrid_column_values,
+)
+
+
+def _package_version(name):
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+# Variables of the in-situ datastreams that the matching needs, read
+# whatever the read allowlist
+_GROUND_MATCH_VARIABLES = ["time", "height", "range"]
+
+# Versions of the libraries extracting the columns, part of the keys of the
+# cached columns so that an upgrade never reuses columns of an older release
+_COLUMN_CACHE_VERSIONS = {
+    "radclss": _package_version("radclss"),
+    "pyart": pyart.__version__,
+}
 
 
 def get_nexrad_column(
@@ -20,6 +64,12 @@ def get_nexrad_column(
     input_site_dict,
     height_bins=np.arange(500, 8500, 250),
     nexrad_radar=None,
+    include_fields=None,
+    check_coverage=True,
+    vertical_method="interp",
+    extraction="pyart",
+    dod_encoding=None,
+    cache=None,
 ):
     """
     This file will add data from the specified NEXRAD column to RadCLss if it is
@@ -42,6 +92,30 @@ def get_nexrad_column(
     nexrad_radar: str or None
         The NEXRAD radar to obtain the column from. Setting to None will use
         the default setting for the ARM site.
+    include_fields: list or None
+        List of NEXRAD fields to read. Set to None to read all fields.
+    check_coverage: bool
+        Set to True to skip the column extraction for sites the radar does
+        not cover. The columns of these sites are filled with NaNs.
+    vertical_method: str
+        How the columns are regridded to the height bins. 'interp' linearly
+        interpolates between the sweeps. 'mean' and 'max' reduce the sweeps
+        falling in each height bin and add the number of sweeps in each bin
+        as 'height_bin_count'.
+    extraction: str
+        How the columns are extracted. 'pyart' uses Py-ART's
+        column_vertical_profile for each site, 'footprint' gathers the
+        column gates of all sites at once (see
+        :func:`radclss.util.column_extraction.footprint_columns`). NEXRAD
+        columns are fetched once per time step and default to 'pyart'.
+    dod_encoding: dict or None
+        Storage dtypes of the NEXRAD fields in the output DOD (see
+        :func:`radclss.util.dod_utils.get_dod_encoding`). The columns are
+        packed to these dtypes. Set to None to keep float64 columns.
+    cache: radclss.util.DiskCache or None
+        Cache of the extracted columns, keyed by the NEXRAD file, the sites,
+        the height bins, the extraction parameters and the library versions.
+        Set to None to not cache.
 
     Returns
     -------
@@ -58,8 +132,6 @@ def get_nexrad_column(
             )
             return None
 
-    lats = list([x[0] for x in input_site_dict.values()])
-    lons = list([x[1] for x in input_site_dict.values()])
     site_alt = list([x[2] for x in input_site_dict.values()])
     sites = list(input_site_dict.keys())
     right_now = datetime.datetime.strptime(rad_time, "%Y-%m-%dT%H:%M:%S")
@@ -94,36 +166,40 @@ def get_nexrad_column(
 
     time_list = np.array(time_list)
     path = f"s3://{bucket_name}/" + file_list[np.argmin(np.abs(time_list - right_now))]
-    radar_obj = pyart.io.read_nexrad_archive(path)
-    column_list = []
-    for lat, lon in zip(lats, lons):
-        # Make sure we are interpolating from the radar's location above sea level
-        # NOTE: interpolating throughout Troposphere to match sonde to in the future
-
-        da = pyart.util.columnsect.column_vertical_profile(radar_obj, lat, lon)
-        # check for valid heights
-        valid = np.isfinite(da["height"])
-        n_valid = int(valid.sum())
-        if n_valid > 0:
-            da = da.sel(height=valid).sortby("height").interp(height=height_bins)
-        else:
-            target_height = xr.DataArray(height_bins, dims="height", name="height")
-            da = da.reindex(height=target_height)
-
-        # Add the latitude and longitude of the extracted column
-        da["lat"], da["lon"] = lat, lon
-        # Convert timeoffsets to timedelta object and precision on datetime64
-        da.time_offset.data = da.time_offset.values.astype("timedelta64[s]")
-        da.base_time.data = da.base_time.values.astype("datetime64[s]")
-        # Time is based off the start of the radar volume
-        da["gate_time"] = da.base_time.values + da.isel(height=0).time_offset.values
-        column_list.append(da)
-
+    if cache is not None:
+        # The archived NEXRAD files never change, so they are keyed by path
+        key = make_cache_key(
+            "get_nexrad_column",
+            path,
+            input_site_dict,
+            np.asarray(height_bins, dtype="float64"),
+            include_fields,
+            check_coverage,
+            vertical_method,
+            extraction,
+            dod_encoding,
+            _COLUMN_CACHE_VERSIONS,
+        )
+        ds = cache.get(key)
+        if ds is not None:
+            return ds
+    radar_obj = pyart.io.read_nexrad_archive(path, include_fields=include_fields)
+    column_list = _extract_site_columns(
+        radar_obj,
+        input_site_dict,
+        height_bins,
+        check_coverage=check_coverage,
+        vertical_method=vertical_method,
+        extraction=extraction,
+    )
     # Concatenate the extracted radar columns for this scan across all sites
     ds = xr.concat([data for data in column_list if data], dim="station")
     ds = _add_station_vars(ds, sites, site_alt)
+    ds = pack_variables(ds, dod_encoding)
+    if cache is not None:
+        cache.put(key, ds)
 
-    del column_list, da
+    del column_list
     return ds
 
 
@@ -133,6 +209,17 @@ def subset_points(
     sonde=None,
     height_bins=np.arange(500, 8500, 250),
     rad_key="radar_csapr2",
+    include_fields=None,
+    sonde_fields=None,
+    backend="pyart",
+    file_format=None,
+    prune_gates=True,
+    check_coverage=True,
+    vertical_method="interp",
+    extraction="pyart",
+    n_threads=1,
+    dod_encoding=None,
+    cache=None,
     **kwargs,
 ):
     """
@@ -159,6 +246,57 @@ def subset_points(
     rad_key: str
         The radar key to use for dropping select variables from the column
         statistics.
+    include_fields : list or None, optional
+        List of radar fields to read. Fields not in this list are never
+        decoded. Set to None to read all fields not discarded. Default is None.
+    sonde_fields : list or None, optional
+        List of radiosonde variables to read and map to the radar gates.
+        Set to None to read all variables not discarded. Default is None.
+    backend : str, optional
+        The reader backend for the radar file. 'pyart' reads the whole volume
+        with Py-ART, 'xradar' opens the file lazily with xradar and only loads
+        the selected fields. Default is 'pyart'.
+    file_format : str or None, optional
+        The format of the radar file (i.e. 'cfradial1'). Giving the format
+        skips format auto-detection. Default is None.
+    prune_gates : bool, optional
+        Set to True to prune the radar volume right after reading to the
+        sweeps, rays and gates that contribute to the site columns
+        (see :func:`get_site_gate_selection`). The extracted columns are
+        unchanged. Default is True.
+    check_coverage : bool, optional
+        Set to True to skip the column extraction for sites the radar does
+        not cover (see :func:`get_site_coverage`). The columns of these sites
+        are filled with NaNs. Default is True.
+    vertical_method : str, optional
+        How the columns are regridded to the height bins. 'interp' linearly
+        interpolates between the sweeps. 'mean' and 'max' reduce the sweeps
+        falling in each height bin, which is faster, and add the number of
+        sweeps in each bin as 'height_bin_count'. Default is 'interp'.
+    extraction : str, optional
+        How the columns are extracted. 'footprint' gathers the column gates
+        of all sites at once and averages them with compiled kernels when
+        Numba is installed (see
+        :func:`radclss.util.column_extraction.footprint_columns`). 'pyart'
+        runs Py-ART's column_vertical_profile for each site.
+        Default is 'pyart'.
+    n_threads : int, optional
+        Number of threads splitting the extraction of the fields and sites
+        of the volume, which lowers the latency of a single large volume.
+        The columns do not depend on the number of threads. Default is 1.
+    dod_encoding : dict or None, optional
+        Storage dtypes of the radar fields in the output DOD (see
+        :func:`radclss.util.dod_utils.get_dod_encoding`). The columns are
+        packed to these dtypes right after extraction, so that they stay
+        compact until the output is written. Set to None to keep float64
+        columns. Default is None.
+    cache : radclss.util.DiskCache or None, optional
+        Cache of the extracted columns, keyed by the fingerprints of the
+        radar file and of the nearest radiosonde file, the sites, the height
+        bins, the read and extraction parameters, the discarded variables and
+        the versions of RadCLss and Py-ART. A rerun that only changes the
+        in-situ or output side of RadCLss reads the columns from the cache.
+        Set to None to not cache. Default is None.
     **kwargs : dict
         Additional keyword arguments.
 
@@ -168,125 +306,751 @@ def subset_points(
         Xarray Dataset containing the radar column above a give set of locations
 
     """
+    if cache is not None:
+        key = _column_cache_key(
+            cache,
+            nfile,
+            sonde,
+            input_site_dict,
+            height_bins,
+            rad_key=rad_key,
+            include_fields=include_fields,
+            sonde_fields=sonde_fields,
+            backend=backend,
+            file_format=file_format,
+            check_coverage=check_coverage,
+            vertical_method=vertical_method,
+            extraction=extraction,
+            dod_encoding=dod_encoding,
+        )
+        ds = cache.get(key)
+        if ds is not None:
+            return ds
     ds = None
+    radar = _read_column_radar(
+        nfile,
+        input_site_dict,
+        sonde=sonde,
+        height_bins=height_bins,
+        rad_key=rad_key,
+        include_fields=include_fields,
+        sonde_fields=sonde_fields,
+        backend=backend,
+        file_format=file_format,
+        prune_gates=prune_gates,
+    )
+    if radar is not None:
+        ds = _radar_to_columns(
+            radar,
+            input_site_dict,
+            height_bins,
+            check_coverage=check_coverage,
+            vertical_method=vertical_method,
+            extraction=extraction,
+            n_threads=n_threads,
+        )
+        ds = pack_variables(ds, dod_encoding)
+        if cache is not None:
+            cache.put(key, ds)
+        # delete the radar to free up memory
+        del radar
+    return ds
 
-    # Define the splash locations [lon,lat]
 
-    lats = list([x[0] for x in input_site_dict.values()])
-    lons = list([x[1] for x in input_site_dict.values()])
-    site_alt = list([x[2] for x in input_site_dict.values()])
+def subset_points_batch(
+    files,
+    input_site_dict,
+    sonde=None,
+    height_bins=np.arange(500, 8500, 250),
+    rad_key="radar_csapr2",
+    include_fields=None,
+    sonde_fields=None,
+    backend="pyart",
+    file_format=None,
+    prune_gates=True,
+    check_coverage=True,
+    vertical_method="interp",
+    extraction="pyart",
+    n_threads=1,
+    dod_encoding=None,
+    cache=None,
+    **kwargs,
+):
+    """
+    Subset a batch of radar files for a set of latitudes and longitudes,
+    extracting the columns of all volumes that share a scan geometry at once.
 
-    sites = list(input_site_dict.keys())
+    The column footprints are computed once per scan geometry
+    (see :func:`radclss.util.column_extraction.get_column_footprints`), the
+    footprint gates of each volume are gathered right after reading, and the
+    columns of all volumes are averaged and regridded together. The result
+    matches running :func:`subset_points` on each file and concatenating
+    the columns along time, up to the floating point precision of the
+    averages.
+
+    Parameters
+    ----------
+    files : list
+        Paths to the radar files to extract columns from.
+    input_site_dict : dict
+        Dictionary containing the site names as keys and their
+        lat/lon coordinates as values in a list format:
+        {'site1': [lat1, lon1, alt1],
+        'site2': [lat2, lon2, alt2],
+        ...}
+    sonde : list, optional
+        List of radiosonde file paths to be merged into the radar
+        prior to column extraction. Default is None.
+    height_bins : numpy array, optional
+        Numpy array containing the desired height bins to regrid
+        the extracted radar columns to. Default is np.arange(500, 8500, 250).
+    rad_key: str
+        The radar key to use for dropping select variables from the column
+        statistics.
+    include_fields : list or None, optional
+        List of radar fields to read. Default is None.
+    sonde_fields : list or None, optional
+        List of radiosonde variables to read. Default is None.
+    backend : str, optional
+        The reader backend for the radar files. Default is 'pyart'.
+    file_format : str or None, optional
+        The format of the radar files. Default is None.
+    prune_gates : bool, optional
+        Set to True to prune the radar volumes to the site neighbourhoods.
+        Default is True.
+    check_coverage : bool, optional
+        Set to True to skip sites the radar does not cover. Default is True.
+    vertical_method : str, optional
+        How the columns are regridded to the height bins, either 'interp',
+        'mean' or 'max'. Default is 'interp'.
+    extraction : str, optional
+        How the columns of the first volume of each scan geometry are
+        extracted, either 'footprint' or 'pyart'. Default is 'pyart'.
+    n_threads : int, optional
+        Number of threads splitting the extraction of the fields and sites
+        of each volume. Default is 1.
+    dod_encoding : dict or None, optional
+        Storage dtypes of the radar fields in the output DOD, see
+        :func:`subset_points`. Default is None.
+    cache : radclss.util.DiskCache or None, optional
+        Cache of the extracted columns of each file, shared with
+        :func:`subset_points`. Only the files missing from the cache are
+        read. Default is None.
+    **kwargs : dict
+        Additional keyword arguments.
+
+    Returns
+    -------
+    ds : xarray DataSet or None
+        Xarray Dataset containing the radar columns of all volumes stacked
+        along time. None is returned if no file could be read.
+    """
+    hits = []
+    keys = {}
+    if cache is not None:
+        for nfile in files:
+            keys[nfile] = _column_cache_key(
+                cache,
+                nfile,
+                sonde,
+                input_site_dict,
+                height_bins,
+                rad_key=rad_key,
+                include_fields=include_fields,
+                sonde_fields=sonde_fields,
+                backend=backend,
+                file_format=file_format,
+                check_coverage=check_coverage,
+                vertical_method=vertical_method,
+                extraction=extraction,
+                dod_encoding=dod_encoding,
+            )
+            ds = cache.get(keys[nfile])
+            if ds is not None:
+                hits.append(ds)
+                del keys[nfile]
+        files = list(keys)
+    selections = {}
+
+    def _cached_selection(radar):
+        # Volumes sharing a scan geometry share the pruning selection
+        key = get_geometry_key(radar)
+        if key not in selections:
+            selections[key] = get_site_gate_selection(
+                radar, input_site_dict, height_bins=height_bins
+            )
+        return selections[key]
+
+    groups = {}
+    for nfile in files:
+        radar = _read_column_radar(
+            nfile,
+            input_site_dict,
+            sonde=sonde,
+            height_bins=height_bins,
+            rad_key=rad_key,
+            include_fields=include_fields,
+            sonde_fields=sonde_fields,
+            backend=backend,
+            file_format=file_format,
+            prune_gates=prune_gates,
+            selector=_cached_selection,
+        )
+        if radar is None:
+            continue
+        key = get_geometry_key(radar)
+        if key not in groups:
+            # The first volume of each geometry is the template of the output
+            groups[key] = {
+                "template": _radar_to_columns(
+                    radar,
+                    input_site_dict,
+                    height_bins,
+                    check_coverage=check_coverage,
+                    vertical_method=vertical_method,
+                    extraction=extraction,
+                    n_threads=n_threads,
+                ),
+                "footprint": get_cached_footprints(radar, input_site_dict),
+                "fields": list(radar.fields.keys()),
+                "samples": [],
+                "times": [],
+                "base_time": [],
+                "files": [],
+            }
+        group = groups[key]
+        group["files"].append(nfile)
+        samples, times = gather_footprint_samples(
+            radar, group["footprint"], group["fields"], n_threads=n_threads
+        )
+        group["samples"].append(samples)
+        group["times"].append(times)
+        group["base_time"].append(
+            np.datetime64(pyart.util.datetime_from_radar(radar).isoformat(), "s")
+        )
+        del radar
+
+    if len(groups) == 0 and len(hits) == 0:
+        return None
+    ds = None
+    if len(groups) > 0:
+        ds = xr.concat(
+            [
+                _stack_group_columns(group, height_bins, vertical_method)
+                for group in groups.values()
+            ],
+            dim="time",
+        )
+        ds = pack_variables(ds, dod_encoding)
+    if cache is not None:
+        # The columns are stacked in the order of the files of each group
+        # and cached without the time dimension, like in subset_points
+        batch_files = [x for group in groups.values() for x in group["files"]]
+        for i, nfile in enumerate(batch_files):
+            cache.put(keys[nfile], ds.isel(time=i))
+        hits = [x.expand_dims("time") for x in hits]
+        if ds is not None:
+            hits.append(ds)
+        ds = xr.concat(hits, dim="time") if len(hits) > 1 else hits[0]
+    return ds
+
+
+def _nearest_sonde(nfile, sonde):
+    """Get the radiosonde file nearest to the start time of a radar file."""
+    radar_start = datetime.datetime.strptime(
+        nfile.split("/")[-1].split(".")[-3] + "." + nfile.split("/")[-1].split(".")[-2],
+        "%Y%m%d.%H%M%S",
+    )
+    sonde_start = [
+        datetime.datetime.strptime(
+            xfile.split("/")[-1].split(".")[2]
+            + "-"
+            + xfile.split("/")[-1].split(".")[3],
+            "%Y%m%d-%H%M%S",
+        )
+        for xfile in sonde
+    ]
+    # difference in time between radar file and each sonde file
+    start_diff = [radar_start - x for x in sonde_start]
+    return sonde[start_diff.index(min(start_diff))]
+
+
+def _column_cache_key(cache, nfile, sonde, input_site_dict, height_bins, **params):
+    # The columns of a radar file depend on the file, the nearest sonde, the
+    # sites, the height bins, the read and extraction parameters, the
+    # discarded variables and the library versions
+    sonde_file = None
+    if sonde is not None:
+        sonde_file = cache.fingerprint(_nearest_sonde(nfile, sonde))
+    discard = {
+        "radar": DEFAULT_DISCARD_VAR[params["rad_key"]],
+        "sonde": DEFAULT_DISCARD_VAR["sonde"],
+    }
+    return make_cache_key(
+        "subset_points",
+        cache.fingerprint(nfile),
+        sonde_file,
+        input_site_dict,
+        np.asarray(height_bins, dtype="float64"),
+        params,
+        discard,
+        _COLUMN_CACHE_VERSIONS,
+    )
+
+
+def _stack_group_columns(group, height_bins, vertical_method="interp"):
+    """
+    Compute the columns of all volumes of a scan geometry group and stack
+    them along time, using the columns of the first volume as the template.
+    """
+    footprint = group["footprint"]
+    values, time_offset = reduce_footprint_samples(
+        np.stack(group["samples"]), np.stack(group["times"]), footprint
+    )
+    time_method = "interp" if vertical_method == "interp" else "mean"
+    template = group["template"]
+    ds = xr.concat([template] * len(group["base_time"]), dim="time")
+    for i in range(footprint["nsites"]):
+        height = footprint["height"][i]
+        regridded = regrid_column_values(
+            values[:, :, i], height, height_bins, vertical_method=vertical_method
+        )
+        for j, field in enumerate(group["fields"]):
+            if field in ds.data_vars:
+                ds[field].values[:, i] = regridded[:, j]
+        offset = regrid_column_values(
+            time_offset[:, i], height, height_bins, vertical_method=time_method
+        )
+        ds["time_offset"].values[:, i] = offset.astype("timedelta64[s]")
+
+    base_time = np.array(group["base_time"], dtype="datetime64[s]")
+    ds["base_time"].values[:] = base_time[:, np.newaxis]
+    ds["gate_time"].values[:] = base_time[:, np.newaxis] + ds["time_offset"].values[
+        :, :, 0
+    ].astype("timedelta64[s]")
+    return ds
+
+
+def _read_column_radar(
+    nfile,
+    input_site_dict,
+    sonde=None,
+    height_bins=np.arange(500, 8500, 250),
+    rad_key="radar_csapr2",
+    include_fields=None,
+    sonde_fields=None,
+    backend="pyart",
+    file_format=None,
+    prune_gates=True,
+    selector=None,
+):
+    """
+    Read a radar file for column extraction and map the nearest radiosonde
+    onto its gates. Returns None if the file can not be read or is empty.
+    """
+    if prune_gates and selector is None:
+        selector = partial(
+            get_site_gate_selection,
+            input_site_dict=input_site_dict,
+            height_bins=height_bins,
+        )
+    elif not prune_gates:
+        selector = None
     try:
-        radar = pyart.io.read(nfile, exclude_fields=DEFAULT_DISCARD_VAR[rad_key])
+        radar = read_radar(
+            nfile,
+            backend=backend,
+            file_format=file_format,
+            exclude_fields=DEFAULT_DISCARD_VAR[rad_key],
+            include_fields=include_fields,
+            selector=selector,
+        )
     except OSError:
         logging.warning(
             f"{nfile} failed to open and is possibly corrupt."
             + "RadCLss will not generate a column for this file."
         )
-    # Check for single sweep scans
-    if np.ma.is_masked(radar.sweep_start_ray_index["data"][1:]):
-        radar.sweep_start_ray_index["data"] = np.ma.array([0])
-        radar.sweep_end_ray_index["data"] = np.ma.array([radar.nrays])
-
-    if radar:
-        if radar.time["data"].size > 0:
-            # Easier to map the nearest sonde file to radar gates before extraction
-            if sonde is not None:
-                # variables to discard when reading in the sonde file
-                exclude_sonde = DEFAULT_DISCARD_VAR["sonde"]
-
-                # find the nearest sonde file to the radar start time
-                radar_start = datetime.datetime.strptime(
-                    nfile.split("/")[-1].split(".")[-3]
-                    + "."
-                    + nfile.split("/")[-1].split(".")[-2],
-                    "%Y%m%d.%H%M%S",
-                )
-                sonde_start = [
-                    datetime.datetime.strptime(
-                        xfile.split("/")[-1].split(".")[2]
-                        + "-"
-                        + xfile.split("/")[-1].split(".")[3],
-                        "%Y%m%d-%H%M%S",
-                    )
-                    for xfile in sonde
-                ]
-                # difference in time between radar file and each sonde file
-                start_diff = [radar_start - sonde for sonde in sonde_start]
-
-                # merge the sonde file into the radar object
-                ds_sonde = act.io.read_arm_netcdf(
-                    sonde[start_diff.index(min(start_diff))],
-                    cleanup_qc=True,
-                    drop_variables=exclude_sonde,
-                )
+        return None
+
+    if radar.time["data"].size == 0:
+        # delete the rhi file
+        del radar
+        return None
+
+    # Easier to map the nearest sonde file to radar gates before extraction
+    if sonde is not None:
+        # variables to discard when reading in the sonde file
+        exclude_sonde = DEFAULT_DISCARD_VAR["sonde"]
+
+        # merge the nearest sonde file to the radar start time into the
+        # radar object
+        ds_sonde = act.io.read_arm_netcdf(
+            _nearest_sonde(nfile, sonde),
+            cleanup_qc=True,
+            drop_variables=exclude_sonde,
+            keep_variables=sonde_fields,
+        )
 
-                # create list of variables within sonde dataset to add to the radar file
-                for var in list(ds_sonde.keys()):
-                    if var != "alt":
-                        z_dict, sonde_dict = pyart.retrieve.map_profile_to_gates(
-                            ds_sonde.variables[var], ds_sonde.variables["alt"], radar
-                        )
-                    field_name = list(radar.fields.keys())[0]
-                    # add the field to the radar file
-                    radar.add_field_like(
-                        field_name,
-                        "sonde_" + var,
-                        sonde_dict["data"],
-                        replace_existing=True,
-                    )
-                    radar.fields["sonde_" + var]["units"] = sonde_dict["units"]
-                    radar.fields["sonde_" + var]["long_name"] = sonde_dict["long_name"]
-                    radar.fields["sonde_" + var]["standard_name"] = sonde_dict[
-                        "standard_name"
-                    ]
-                    radar.fields["sonde_" + var]["datastream"] = ds_sonde.datastream
-
-                del radar_start, sonde_start, ds_sonde
-                del z_dict, sonde_dict
-
-            column_list = []
-            for lat, lon in zip(lats, lons):
-                # Make sure we are interpolating from the radar's location above sea level
-                # NOTE: interpolating throughout Troposphere to match sonde to in the future
-
-                da = pyart.util.columnsect.column_vertical_profile(radar, lat, lon)
-                # check for valid heights
-                valid = np.isfinite(da["height"])
-                n_valid = int(valid.sum())
-                if n_valid > 0:
-                    da = (
-                        da.sel(height=valid).sortby("height").interp(height=height_bins)
-                    )
-                else:
-                    target_height = xr.DataArray(
-                        height_bins, dims="height", name="height"
-                    )
-                    da = da.reindex(height=target_height)
-
-                # Add the latitude and longitude of the extracted column
-                da["lat"], da["lon"] = lat, lon
-                # Convert timeoffsets to timedelta object and precision on datetime64
-                da.time_offset.data = da.time_offset.values.astype("timedelta64[s]")
-                da.base_time.data = da.base_time.values.astype("datetime64[s]")
-                # Time is based off the start of the radar volume
-                da["gate_time"] = (
-                    da.base_time.values + da.isel(height=0).time_offset.values
+        # create list of variables within sonde dataset to add to the radar file
+        for var in list(ds_sonde.keys()):
+            if var != "alt":
+                z_dict, sonde_dict = pyart.retrieve.map_profile_to_gates(
+                    ds_sonde.variables[var], ds_sonde.variables["alt"], radar
                 )
-                column_list.append(da)
+            field_name = list(radar.fields.keys())[0]
+            # add the field to the radar file
+            radar.add_field_like(
+                field_name,
+                "sonde_" + var,
+                sonde_dict["data"],
+                replace_existing=True,
+            )
+            radar.fields["sonde_" + var]["units"] = sonde_dict["units"]
+            radar.fields["sonde_" + var]["long_name"] = sonde_dict["long_name"]
+            radar.fields["sonde_" + var]["standard_name"] = sonde_dict["standard_name"]
+            radar.fields["sonde_" + var]["datastream"] = ds_sonde.datastream
 
-            # Concatenate the extracted radar columns for this scan across all sites
-            ds = xr.concat([data for data in column_list if data], dim="station")
-            ds = _add_station_vars(ds, sites, site_alt)
-            # delete the radar to free up memory
-            del radar, column_list, da
-        else:
-            # delete the rhi file
-            del radar
+        del ds_sonde
+        del z_dict, sonde_dict
+    return radar
+
+
+def _radar_to_columns(
+    radar,
+    input_site_dict,
+    height_bins,
+    check_coverage=True,
+    vertical_method="interp",
+    extraction="pyart",
+    n_threads=1,
+):
+    """Extract the site columns of a radar volume into a single dataset."""
+    site_alt = list([x[2] for x in input_site_dict.values()])
+    sites = list(input_site_dict.keys())
+    column_list = _extract_site_columns(
+        radar,
+        input_site_dict,
+        height_bins,
+        check_coverage=check_coverage,
+        vertical_method=vertical_method,
+        extraction=extraction,
+        n_threads=n_threads,
+    )
+
+    # Concatenate the extracted radar columns for this scan across all sites
+    ds = xr.concat([data for data in column_list if data], dim="station")
+    ds = _add_station_vars(ds, sites, site_alt)
+    del column_list
     return ds
 
 
+def get_site_gate_selection(
+    radar, input_site_dict, height_bins=None, azimuth_spread=3, spatial_spread=3
+):
+    """
+    Find the sweeps, rays and gates of a radar volume that contribute to the
+    columns extracted above a set of sites by Py-ART's
+    column-vertical-profile functionality.
+
+    The selection mirrors the ray and gate matching of
+    :func:`pyart.util.columnsect.column_vertical_profile`, so columns extracted
+    from the pruned volume are identical to the ones from the full volume.
+    The first two rays of each sweep are always kept, as they define the
+    azimuthal resolution of the sweep, and so is the first sweep, as it
+    defines the start time of the volume.
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar volume. Only the coordinates are used.
+    input_site_dict : dict
+        Dictionary containing the site names as keys and their
+        lat/lon coordinates as values in a list format:
+        {'site1': [lat1, lon1, alt1],
+        'site2': [lat2, lon2, alt2],
+        ...}
+    height_bins : numpy array or None, optional
+        The height bins the columns are interpolated to. Sweeps that are not
+        needed to interpolate any column to these bins are dropped. Set to
+        None to keep all sweeps. Default is None.
+    azimuth_spread : int, optional
+        Number of azimuth angles included in the column extraction.
+        Default is 3.
+    spatial_spread : int, optional
+        Number of range gates included in the column extraction. Default is 3.
+
+    Returns
+    -------
+    sweeps : list
+        Indices of the sweeps to keep.
+    rays : list
+        For each kept sweep, the indices of the rays to keep within the sweep.
+    gates : slice
+        The range gates to keep.
+    """
+    spatial_range = radar.range["meters_between_gates"] * spatial_spread
+    radar_lat = radar.latitude["data"][0]
+    radar_lon = radar.longitude["data"][0]
+    radar_alt = radar.altitude["data"][0]
+    starts = np.asarray(radar.sweep_start_ray_index["data"])
+    ends = np.asarray(radar.sweep_end_ray_index["data"])
+
+    sweep_rays = [{0, 1} for _ in starts]
+    # Column height of each sweep above each site
+    heights = np.full((len(input_site_dict), len(starts)), np.nan)
+    gate_min = radar.ngates
+    gate_max = -1
+    covered = get_site_coverage(
+        radar, input_site_dict, height_bins=height_bins, spatial_spread=spatial_spread
+    )
+    for i, site in enumerate(input_site_dict.values()):
+        if not covered[i]:
+            continue
+        dis = sphere_distance(radar_lat, site[0], radar_lon, site[1])
+        forazi = for_azimuth(radar_lat, site[0], radar_lon, site[1])
+        for j, (start, end) in enumerate(zip(starts, ends)):
+            center, spread = get_sweep_rays(
+                radar.azimuth["data"][start : end + 1],
+                forazi,
+                azimuth_spread=azimuth_spread,
+            )
+            site_rays = center + [x for x in spread if x not in center]
+            if len(site_rays) == 0:
+                continue
+            sweep_rays[j].update(site_rays)
+            ray_index = np.array(site_rays) + start
+            rhi_x, rhi_y, rhi_z = antenna_vectors_to_cartesian(
+                radar.range["data"],
+                radar.azimuth["data"][ray_index],
+                radar.elevation["data"][ray_index],
+                edges=False,
+            )
+            rhidis = np.sqrt((rhi_x**2) + (rhi_y**2)) * np.sign(rhi_z)
+            tar_gate = np.abs(rhidis - dis) < spatial_range
+            gate_index = np.nonzero(tar_gate.any(axis=0))[0]
+            if gate_index.size > 0:
+                gate_min = min(gate_min, gate_index[0])
+                gate_max = max(gate_max, gate_index[-1])
+                # Mean gate height of each ray, then of the sweep
+                zgates = np.ma.masked_array(rhi_z, mask=~tar_gate).mean(axis=1)
+                heights[i, j] = np.ma.mean(zgates) + radar_alt
+
+    keep = np.ones(len(starts), dtype=bool)
+    if height_bins is not None and covered.any():
+        edges = get_bin_edges(height_bins)
+        keep[:] = False
+        keep[0] = True
+        for site_heights in heights:
+            finite = np.isfinite(site_heights)
+            inside = finite & (site_heights >= edges[0]) & (site_heights <= edges[-1])
+            keep |= inside
+            # Keep the nearest sweeps outside of the bins for interpolation
+            below = site_heights[finite & (site_heights < edges[0])]
+            if below.size > 0:
+                keep |= site_heights == below.max()
+            above = site_heights[finite & (site_heights > edges[-1])]
+            if above.size > 0:
+                keep |= site_heights == above.min()
+
+    sweeps = [j for j in range(len(starts)) if keep[j]]
+    rays = [
+        [ray for ray in sorted(sweep_rays[j]) if ray <= ends[j] - starts[j]]
+        for j in sweeps
+    ]
+    if gate_max < 0:
+        gates = slice(0, 1)
+    else:
+        # Pad by a gate to not depend on rounding of the gate positions
+        gates = slice(max(int(gate_min) - 1, 0), int(gate_max) + 2)
+    return sweeps, rays, gates
+
+
+def get_site_coverage(radar, input_site_dict, height_bins=None, spatial_spread=3):
+    """
+    Check which sites are covered by a radar volume, from the distance of the
+    sites to the radar and the height of the radar beams above them.
+
+    A site is not covered if it is beyond the maximum range of the radar, or
+    if no sweep passes above it within the range of heights spanned by
+    height_bins (i.e. the site is in the blind zone of the radar). The
+    check is conservative: a covered site may still get an all-NaN column,
+    but columns of sites that are not covered are always all-NaN.
+
+    Parameters
+    ----------
+    radar : pyart.core.Radar
+        The radar volume. Only the coordinates are used.
+    input_site_dict : dict
+        Dictionary containing the site names as keys and their
+        lat/lon coordinates as values in a list format:
+        {'site1': [lat1, lon1, alt1],
+        'site2': [lat2, lon2, alt2],
+        ...}
+    height_bins : numpy array or None, optional
+        The height bins the columns are interpolated to. Set to None to only
+        check that beams pass above the sites. Default is None.
+    spatial_spread : int, optional
+        Number of range gates included in the column extraction. Default is 3.
+
+    Returns
+    -------
+    covered : numpy array
+        Boolean array that is True for the sites covered by the radar.
+    """
+    spatial_range = radar.range["meters_between_gates"] * spatial_spread
+    radar_lat = radar.latitude["data"][0]
+    radar_lon = radar.longitude["data"][0]
+    radar_alt = radar.altitude["data"][0]
+    starts = np.asarray(radar.sweep_start_ray_index["data"])
+    ends = np.asarray(radar.sweep_end_ray_index["data"])
+
+    # Horizontal distance and height of the gates at the lowest and highest
+    # elevation of each sweep. Column heights are averages over gates in
+    # between these.
+    elevation = np.asarray(radar.elevation["data"])
+    sweep_elevation = np.array(
+        [
+            [elevation[start : end + 1].min(), elevation[start : end + 1].max()]
+            for start, end in zip(starts, ends)
+        ]
+    ).ravel()
+    _, gate_y, gate_z = antenna_vectors_to_cartesian(
+        radar.range["data"],
+        np.zeros_like(sweep_elevation),
+        sweep_elevation,
+        edges=False,
+    )
+    gate_dis = np.abs(gate_y) * np.sign(gate_z)
+    gate_z = gate_z + radar_alt
+
+    if height_bins is not None:
+        edges = get_bin_edges(height_bins)
+    covered = np.zeros(len(input_site_dict), dtype=bool)
+    for i, site in enumerate(input_site_dict.values()):
+        dis = sphere_distance(radar_lat, site[0], radar_lon, site[1])
+        tar_gate = np.abs(gate_dis - dis) < spatial_range
+        if not tar_gate.any():
+            continue
+        if height_bins is None:
+            covered[i] = True
+            continue
+        z = gate_z[tar_gate]
+        covered[i] = (np.nanmax(z) >= edges[0]) & (np.nanmin(z) <= edges[-1])
+    return covered
+
+
+def _empty_column(column, radar, lat, lon):
+    """Make an empty column at a site from the column of another site."""
+    da = column.isel(height=slice(0, 0))
+    da["latitude"] = da["latitude"].copy(data=lat)
+    da["longitude"] = da["longitude"].copy(data=lon)
+    radar_lat = radar.latitude["data"][0]
+    radar_lon = radar.longitude["data"][0]
+    distance = sphere_distance(radar_lat, lat, radar_lon, lon)
+    azimuth = for_azimuth(radar_lat, lat, radar_lon, lon)
+    da.attrs["distance_from_radar"] = str(np.around(distance / 1000.0, 3)) + " km"
+    da.attrs["azimuth"] = str(np.around(azimuth, 3)) + " degrees"
+    da.attrs["latitude_of_location"] = str(lat) + " degrees"
+    da.attrs["longitude_of_location"] = str(lon) + " degrees"
+    return da
+
+
+def _regrid_column(da, height_bins, vertical_method="interp"):
+    """
+    Regrid a column from the heights of the radar sweeps to the height bins,
+    either by linear interpolation or by binning the sweeps.
+    """
+    if vertical_method in ["mean", "max"]:
+        return bin_column(da, height_bins, method=vertical_method)
+    if vertical_method != "interp":
+        raise ValueError(
+            f"vertical_method must be 'interp', 'mean' or 'max', got {vertical_method}."
+        )
+    # check for valid heights
+    valid = np.isfinite(da["height"])
+    n_valid = int(valid.sum())
+    if n_valid > 0:
+        return da.sel(height=valid).sortby("height").interp(height=height_bins)
+    target_height = xr.DataArray(height_bins, dims="height", name="height")
+    return da.reindex(height=target_height)
+
+
+def _extract_site_columns(
+    radar,
+    input_site_dict,
+    height_bins,
+    check_coverage=True,
+    vertical_method="interp",
+    extraction="pyart",
+    n_threads=1,
+):
+    """
+    Extract the radar columns above each site and regrid them to the
+    height bins. Sites not covered by the radar are filled with NaNs.
+    The sites are split over n_threads threads.
+    """
+    lats = list([x[0] for x in input_site_dict.values()])
+    lons = list([x[1] for x in input_site_dict.values()])
+    if check_coverage:
+        covered = get_site_coverage(radar, input_site_dict, height_bins=height_bins)
+        if not covered.any():
+            # A column is still needed as a template for the other sites
+            covered[0] = True
+    else:
+        covered = np.ones(len(lats), dtype=bool)
+
+    columns = {}
+    if extraction == "footprint":
+        covered_sites = {
+            site: coords
+            for i, (site, coords) in enumerate(input_site_dict.items())
+            if covered[i]
+        }
+        index = np.flatnonzero(covered)
+        columns = dict(
+            zip(
+                index,
+                footprint_columns(radar, covered_sites, n_threads=n_threads),
+            )
+        )
+    elif extraction == "pyart":
+        index = np.flatnonzero(covered)
+        # Make sure we are interpolating from the radar's location above sea level
+        # NOTE: interpolating throughout Troposphere to match sonde to in the future
+        profiles = thread_map(
+            lambda i: pyart.util.columnsect.column_vertical_profile(
+                radar, lats[i], lons[i]
+            ),
+            index,
+            n_threads,
+        )
+        columns = dict(zip(index, profiles))
+    else:
+        raise ValueError(
+            f"extraction must be 'footprint' or 'pyart', got {extraction}."
+        )
+    template = columns[int(np.argmax(covered))]
+
+    def _finish_column(i):
+        lat, lon = lats[i], lons[i]
+        if covered[i]:
+            da = columns[i]
+        else:
+            da = _empty_column(template, radar, lat, lon)
+        da = _regrid_column(da, height_bins, vertical_method=vertical_method)
+
+        # Add the latitude and longitude of the extracted column
+        da["lat"], da["lon"] = lat, lon
+        # Convert timeoffsets to timedelta object and precision on datetime64
+        da.time_offset.data = da.time_offset.values.astype("timedelta64[s]")
+        da.base_time.data = da.base_time.values.astype("datetime64[s]")
+        # Time is based off the start of the radar volume
+        da["gate_time"] = da.base_time.values + da.isel(height=0).time_offset.values
+        return da
+
+    return thread_map(_finish_column, range(len(lats)), n_threads)
+
+
 def match_datasets_act(
     column,
     ground,
@@ -297,6 +1061,8 @@ def match_datasets_act(
     DataSet=False,
     prefix=None,
     verbose=False,
+    keep_variables=None,
+    binned=False,
 ):
     """
     Time synchronization of a Ground Instrumentation Dataset to
@@ -343,20 +1109,512 @@ def match_datasets_act(
     verbose : boolean
         Boolean flag to set verbose output during processing. Default is False.
 
+    keep_variables : list or None
+        List of the input ground instrumentation variables to read (before the
+        prefix is applied). Set to None to read all variables not discarded.
+        Default is None.
+
+    binned : boolean
+        Set to True to reduce the samples in a window before each radar time
+        in one pass with :func:`radclss.util.window_statistics`, instead of
+        resampling to resample_time and interpolating. resample is then the
+        statistic of each window ('mean', 'sum', 'min', 'max', 'std' or
+        'count', or a list of them which names the variables
+        '<variable>_<statistic>'), and resample_time is the width of the
+        windows, or None to split the time between radar times in half.
+        Default is False.
+
     Returns
     -------
     ds : Xarray DataSet
         Xarray Dataset containing the time-synced in-situ ground observations with
         the inputed radar column
     """
+    matched = resample_ground_dataset(
+        ground,
+        column["time"],
+        column["height"],
+        site,
+        discard,
+        resample=resample,
+        resample_time=resample_time,
+        DataSet=DataSet,
+        prefix=prefix,
+        keep_variables=keep_variables,
+        binned=binned,
+    )
+    return merge_matched_dataset(column, matched, site)
+
+
+def resample_ground_dataset(
+    ground,
+    time,
+    height,
+    site,
+    discard,
+    resample="sum",
+    resample_time="5Min",
+    DataSet=False,
+    prefix=None,
+    keep_variables=None,
+    binned=False,
+):
+    """
+    Read a Ground Instrumentation Dataset and resample and interpolate it to
+    the time and height of a Radar Column. This is the part of
+    :func:`match_datasets_act` that does not depend on the column data, so
+    it can run on a Dask worker with only the column coordinates.
+
+    Parameters
+    ----------
+    ground : str; Xarray DataSet
+        String containing the path of the ground instrumentation file.
+        If DataSet is set to True, ground is Xarray Dataset and will skip I/O.
+
+    time : Xarray DataArray
+        The time coordinate of the radar column.
+
+    height : Xarray DataArray
+        The height coordinate of the radar column.
+
+    site : str
+        Location of the ground instrument.
+
+    discard : list
+        List containing the desired input ground instrumentation variables to be
+        removed from the xarray DataSet.
+
+    resample : str
+        'sum', 'mean' or 'skip', see :func:`match_datasets_act`. Default is 'sum'.
+
+    resample_time : str
+        Time resolution for resampling ground instrumentation data before mapping to radar time.
+        Default is "5Min".
+
+    DataSet : boolean
+        Set to True if ground input is Xarray DataSet.
+
+    prefix : str
+        prefix for the desired spelling of variable names for the input
+        datastream (to fix duplicate variable names between instruments)
+
+    keep_variables : list or None
+        List of the input ground instrumentation variables to read (before the
+        prefix is applied). Set to None to read all variables not discarded.
+        Default is None.
+
+    binned : boolean
+        Set to True to reduce the samples in a window before each radar time
+        in one pass with :func:`radclss.util.window_statistics`, instead of
+        resampling to resample_time and interpolating. resample is then the
+        statistic of each window ('mean', 'sum', 'min', 'max', 'std' or
+        'count', or a list of them which names the variables
+        '<variable>_<statistic>'), and resample_time is the width of the
+        windows, or None to split the time between radar times in half.
+        Default is False.
+
+    Returns
+    -------
+    matched : Xarray DataSet
+        Xarray Dataset of the ground observations at the radar times, with a
+        station dimension of length one.
+    """
+
+    return resample_ground_datasets(
+        {site: ground},
+        time,
+        height,
+        discard,
+        resample=resample,
+        resample_time=resample_time,
+        DataSet=DataSet,
+        prefix=prefix,
+        keep_variables=keep_variables,
+        binned=binned,
+    )
+
+
+def resample_ground_datasets(
+    grounds,
+    time,
+    height,
+    discard,
+    resample="sum",
+    resample_time="5Min",
+    DataSet=False,
+    prefix=None,
+    keep_variables=None,
+    binned=False,
+    chunk_size=4096,
+    cache=None,
+):
+    """
+    Read the Ground Instrumentation Datasets of one instrument at several
+    sites, stack them along the station dimension and resample and
+    interpolate them to the time and height of a Radar Column at once.
+
+    The files of each site are opened lazily and only the allowlisted
+    variables and the samples around the radar times (with the margin of
+    the resampling bins) are loaded.
+
+    Parameters
+    ----------
+    grounds : dict
+        Dictionary of the path or list of paths of the ground instrumentation
+        files (or Xarray DataSets if DataSet is True) of each site.
+
+    time : Xarray DataArray
+        The time coordinate of the radar column.
+
+    height : Xarray DataArray
+        The height coordinate of the radar column.
+
+    discard : list
+        List containing the desired input ground instrumentation variables to be
+        removed from the xarray DataSet.
+
+    resample : str
+        'sum', 'mean' or 'skip', see :func:`match_datasets_act`. Default is 'sum'.
+
+    resample_time : str
+        Time resolution for resampling ground instrumentation data before mapping to radar time.
+        Default is "5Min".
+
+    DataSet : boolean
+        Set to True if the ground inputs are Xarray DataSets.
+
+    prefix : str
+        prefix for the desired spelling of variable names for the input
+        datastream (to fix duplicate variable names between instruments)
+
+    keep_variables : list, dict or None
+        List of the input ground instrumentation variables to read (before the
+        prefix is applied), or a dictionary of such lists for each site.
+        Set to None to read all variables not discarded. Default is None.
+
+    binned : boolean
+        Set to True to reduce the samples in a window before each radar time
+        in one pass with :func:`radclss.util.window_statistics`, instead of
+        resampling to resample_time and interpolating. resample is then the
+        statistic of each window ('mean', 'sum', 'min', 'max', 'std' or
+        'count', or a list of them which names the variables
+        '<variable>_<statistic>'), and resample_time is the width of the
+        windows, or None to split the time between radar times in half.
+        Default is False.
+
+    chunk_size : int
+        When binned, the maximum number of samples of a site loaded at once.
+        The radar windows are reduced in chunks of consecutive windows, and
+        the range gates or heights of profiling instruments (i.e. the KAZR)
+        are averaged into the column height bins after the time reduction,
+        instead of being interpolated. Default is 4096.
+
+    cache : radclss.util.DiskCache or None
+        Cache of the matched datasets before the final interpolation to the
+        radar times (the resampled 5 minute grid of the whole files), keyed
+        by the fingerprints of the input files and the matching parameters.
+        A rerun with other radar times or height bins only redoes the
+        interpolation, unless the instrument has a height dimension (then
+        the height bins are part of the key) or it is binned or not
+        resampled (then the radar times are part of the key).
+        Set to None to not cache. Default is None.
+
+    Returns
+    -------
+    matched : Xarray DataSet
+        Xarray Dataset of the ground observations at the radar times, with a
+        station dimension holding the sites in the order of grounds.
+    """
+    if binned:
+        statistics = [resample] if isinstance(resample, str) else resample
+        if any(x not in WINDOW_STATISTICS for x in statistics):
+            raise ValueError(
+                f"Invalid resample statistic. Please choose from {WINDOW_STATISTICS}."
+            )
+    elif resample not in ["mean", "sum", "skip"]:
+        raise ValueError(
+            "Invalid resample method. Please choose 'mean', 'sum', or 'skip'."
+        )
+
+    radar_times = time.values
+    if not binned and resample != "skip":
+        # Only the bins around the radar times are needed
+        margin = 2 * pd.to_timedelta(resample_time).to_timedelta64()
+        grid = prepare_ground_datasets(
+            grounds,
+            height,
+            discard,
+            resample=resample,
+            resample_time=resample_time,
+            DataSet=DataSet,
+            prefix=prefix,
+            keep_variables=keep_variables,
+            cache=cache,
+            time_range=(radar_times.min() - margin, radar_times.max() + margin),
+        )
+        return grid.interp(time=time, method="linear")
+
+    # Time range of the samples needed to match the radar times
+    if binned:
+        starts, stops = get_time_windows(radar_times, resample_time)
+        time_range = (starts.min(), stops.max())
+    else:
+        time_range = (radar_times.min(), radar_times.max())
+
+    def match(time_range):
+        return _match_ground_datasets(
+            grounds,
+            time,
+            height,
+            discard,
+            resample,
+            resample_time,
+            DataSet,
+            prefix,
+            keep_variables,
+            binned,
+            chunk_size,
+            time_range,
+        )
+
+    # Binned and interpolated datasets depend on the radar times
+    parts = [discard, resample, resample_time, prefix, keep_variables, binned]
+    parts.append(radar_times.astype("int64"))
+    return _cached_match(cache, DataSet, grounds, parts, height, match, time_range)
+
+
+def prepare_ground_datasets(
+    grounds,
+    height,
+    discard,
+    resample="sum",
+    resample_time="5Min",
+    DataSet=False,
+    prefix=None,
+    keep_variables=None,
+    cache=None,
+    time_range=None,
+):
+    """
+    Read the Ground Instrumentation Datasets of one instrument at several
+    sites and resample them to a regular grid of resample_time, stacked
+    along the station dimension. This does not depend on the radar times, so
+    it can run before they are known; :func:`resample_ground_datasets`
+    then only interpolates the grid to the radar times.
+
+    Parameters
+    ----------
+    grounds : dict
+        Dictionary of the path or list of paths of the ground instrumentation
+        files (or Xarray DataSets if DataSet is True) of each site.
+
+    height : Xarray DataArray
+        The height coordinate of the radar column.
+
+    discard : list
+        List containing the desired input ground instrumentation variables to be
+        removed from the xarray DataSet.
+
+    resample : str
+        'sum' or 'mean'. Default is 'sum'.
+
+    resample_time : str
+        Time resolution for resampling ground instrumentation data. Default is "5Min".
+
+    DataSet : boolean
+        Set to True if the ground inputs are Xarray DataSets.
+
+    prefix : str
+        prefix for the desired spelling of variable names for the input
+        datastream (to fix duplicate variable names between instruments)
+
+    keep_variables : list, dict or None
+        List of the input ground instrumentation variables to read, or a
+        dictionary of such lists for each site. Default is None.
+
+    cache : radclss.util.DiskCache or None
+        Cache of the resampled grids, see :func:`resample_ground_datasets`.
+        Default is None.
+
+    time_range : tuple or None
+        The start and stop of the samples to read. Set to None to read the
+        whole files. Ignored when caching, as cached grids cover the whole
+        files. Default is None.
+
+    Returns
+    -------
+    grid : Xarray DataSet
+        Xarray Dataset of the resampled ground observations, with a station
+        dimension holding the sites in the order of grounds.
+    """
+    if resample not in ["mean", "sum"]:
+        raise ValueError("Invalid resample method. Please choose 'mean' or 'sum'.")
+
+    def match(time_range):
+        return _match_ground_datasets(
+            grounds,
+            None,
+            height,
+            discard,
+            resample,
+            resample_time,
+            DataSet,
+            prefix,
+            keep_variables,
+            False,
+            None,
+            time_range,
+        )
+
+    parts = [discard, resample, resample_time, prefix, keep_variables, False, None]
+    return _cached_match(cache, DataSet, grounds, parts, height, match, time_range)
+
+
+def _cached_match(cache, DataSet, grounds, parts, height, match, time_range):
+    # The matched datasets are cached keyed by the fingerprints of the input
+    # files and the matching parameters, and by the heights for datasets with
+    # a height dimension
+    keys = []
+    if cache is not None and not DataSet:
+        fingerprints = {}
+        for site, ground in grounds.items():
+            files = [ground] if isinstance(ground, str) else sorted(ground)
+            fingerprints[site] = [cache.fingerprint(x) for x in files]
+        parts = ["resample_ground_datasets", fingerprints] + list(parts)
+        keys = [
+            make_cache_key(*parts),
+            make_cache_key(*parts, np.asarray(height, dtype="float64")),
+        ]
+        for key in keys:
+            matched = cache.get(key)
+            if matched is not None:
+                return matched
+    # The cached datasets cover the whole files
+    matched = match(None if keys else time_range)
+    if keys:
+        cache.put(keys[1 if "height" in matched.dims else 0], matched)
+    return matched
+
+
+def _match_ground_datasets(
+    grounds,
+    time,
+    height,
+    discard,
+    resample,
+    resample_time,
+    DataSet,
+    prefix,
+    keep_variables,
+    binned,
+    chunk_size,
+    time_range,
+):
+    # Read, stack and reduce the datasets of the sites, up to the final
+    # interpolation to the radar times when resampling
+    if binned:
+        radar_times = time.values
+        starts, stops = get_time_windows(radar_times, resample_time)
+    datasets = []
+    for site, ground in grounds.items():
+        site_keep = keep_variables
+        if isinstance(keep_variables, dict):
+            site_keep = keep_variables.get(site)
+        grd_ds = _read_ground_dataset(
+            ground,
+            height,
+            discard,
+            DataSet,
+            prefix,
+            site_keep,
+            time_range,
+            binned=binned,
+        )
+        if binned:
+            lazy = grd_ds
+            grd_ds = _window_profile_dataset(
+                grd_ds,
+                radar_times,
+                starts,
+                stops,
+                resample,
+                height.values,
+                chunk_size,
+            )
+            # Closes the files of the lazy dataset once it is reduced
+            lazy.close()
+        # Interpolating to the radar time is done per site so that the times
+        # of the other sites do not cut the interpolation
+        if resample == "skip" and not binned:
+            grd_ds = grd_ds.interp(time=time, method="linear")
+        elif not binned:
+            # Marks the times with data, which are NaN once the times of
+            # the sites are joined
+            grd_ds["_present"] = ("time", np.ones(grd_ds.sizes["time"]))
+        datasets.append(grd_ds)
+    stacked, missing = _stack_stations(datasets, list(grounds))
+
+    # Resample the ground data to 5 min and interpolate to the radar time.
+    # Keep data variable attributes to help distingish between instruments/locations
+    if binned:
+        matched = stacked
+    elif resample == "skip":
+        matched = stacked
+    else:
+        resampled = stacked.resample(time=resample_time, closed="right")
+        if resample == "mean":
+            matched = resampled.mean(keep_attrs=True)
+        else:
+            matched = resampled.sum(keep_attrs=True)
+        # Only keep the bins between the first and last data of each site,
+        # like when resampling each site on its own
+        present = stacked["_present"].resample(time=resample_time, closed="right")
+        present = present.max().fillna(0)
+        valid = (present.cumsum("time") > 0) & (
+            present[:, ::-1].cumsum("time")[:, ::-1] > 0
+        )
+        matched = matched.drop_vars("_present").where(valid)
+        # Variables missing at a site would otherwise sum to zero
+        for var, sites in missing.items():
+            matched[var].loc[{"station": sites}] = np.nan
+
+    for ds in datasets:
+        ds.close()
+    return matched
+
+
+def _read_ground_dataset(
+    ground,
+    height,
+    discard,
+    DataSet,
+    prefix,
+    keep_variables,
+    time_range=None,
+    binned=False,
+):
+    # When binned, the dataset is left lazy and on its own heights, as it is
+    # reduced one chunk at a time by _window_profile_dataset
     # Check to see if input is xarray DataSet or a file path
     if DataSet:
-        grd_ds = ground
+        grd_ds = _slice_time(ground, time_range)
     else:
-        # Read in the file using ACT
-        grd_ds = act.io.read_arm_netcdf(ground, cleanup_qc=True, drop_variables=discard)
+        if not isinstance(ground, str):
+            ground = sorted(ground)
+        # Read in the file(s) lazily using ACT
+        grd_ds = act.io.read_arm_netcdf(
+            ground,
+            cleanup_qc=True,
+            drop_variables=discard,
+            keep_variables=_ground_keep_variables(keep_variables),
+        )
+        source = grd_ds
+        # Only load the samples around the radar times
+        grd_ds = _slice_time(grd_ds, time_range)
         # Default are Lazy Arrays; convert for matching with column
-        grd_ds = grd_ds.compute()
+        if not binned:
+            grd_ds = grd_ds.compute()
+            source.close()
         # check if a list containing new variable names exists.
         if prefix:
             grd_ds = grd_ds.rename_vars({v: f"{prefix}{v}" for v in grd_ds.data_vars})
@@ -367,82 +1625,260 @@ def match_datasets_act(
 
     # Check to see if height is a dimension within the ground instrumentation.
     # If so, first interpolate heights to match radar, before interpolating time.
-    if "height" in grd_ds.dims:
-        grd_ds = grd_ds.interp(height=column["height"], method="linear")
+    if "height" in grd_ds.dims and not binned:
+        grd_ds = grd_ds.interp(height=height, method="linear")
 
-    if "range" in grd_ds.dims:
-        grd_ds = grd_ds.interp(range=column["height"], method="linear")
-        grd_ds = grd_ds.drop_vars("height")
+    if "range" in grd_ds.dims and not binned:
+        grd_ds = grd_ds.interp(range=height, method="linear")
+        grd_ds = grd_ds.drop_vars("height", errors="ignore")
         grd_ds = grd_ds.rename({"range": "height"})
 
-    # Resample the ground data to 5 min and interpolate to the radar time.
-    # Keep data variable attributes to help distingish between instruments/locations
     # Keep only numeric data variables to avoid issues with resampling non-numeric variables (e.g. lat/lon)
     non_numeric_vars = [
         var
         for var in grd_ds.data_vars
         if not np.issubdtype(grd_ds[var].dtype, np.number)
     ]
-
     grd_ds = grd_ds.drop_vars(non_numeric_vars)
-    if resample == "mean":
-        matched = (
-            grd_ds.resample(time=resample_time, closed="right")
-            .mean(keep_attrs=True)
-            .interp(time=column.time, method="linear")
-        )
-    elif resample == "skip":
-        matched = grd_ds.interp(time=column.time, method="linear")
-    elif resample == "sum":
-        matched = (
-            grd_ds.resample(time=resample_time, closed="right")
-            .sum(keep_attrs=True)
-            .interp(time=column.time, method="linear")
-        )
-    else:
-        raise ValueError(
-            "Invalid resample method. Please choose 'mean', 'sum', or 'skip'."
-        )
-
-    # Add site location as a dimension for the Pluvio data
-    matched = matched.assign_coords(coords=dict(station=site))
-    matched = matched.expand_dims("station")
 
     # Remove Lat/Lon Data variables as it is included within the Matched Dataset with Site Identfiers
-    if "lat" in matched.data_vars:
-        del matched["lat"]
-    if "lon" in matched.data_vars:
-        del matched["lon"]
-    if "alt" in matched.data_vars:
-        del matched["alt"]
+    grd_ds = grd_ds.drop_vars(
+        [var for var in ["lat", "lon", "alt"] if var in grd_ds.data_vars]
+    )
 
     # Update the individual Variables to Hold Global Attributes
     # global attributes will be lost on merging into the matched dataset.
     # Need to keep as many references and descriptors as possible
-    for var in matched.data_vars:
-        matched[var].attrs.update(source=matched.datastream)
+    for var in grd_ds.data_vars:
+        grd_ds[var].attrs.update(source=grd_ds.datastream)
+    return grd_ds
+
+
+def _ground_keep_variables(keep_variables):
+    # Besides the allowlisted variables, read their quality control, which
+    # is cleaned up on read, and the coordinates used by the matching. The
+    # dimensions of the allowlisted variables are always kept by ACT
+    if keep_variables is None:
+        return None
+    keep = list(keep_variables)
+    keep += [f"qc_{var}" for var in keep_variables if not var.startswith("qc_")]
+    return keep + [var for var in _GROUND_MATCH_VARIABLES if var not in keep]
+
+
+def _slice_time(ds, time_range):
+    # Select the samples between the start and stop of time_range, plus one
+    # sample on each side for the interpolation
+    if time_range is None or "time" not in ds.dims:
+        return ds
+    times = ds["time"].values
+    start, stop = time_range
+    if times.size > 1 and np.any(times[1:] < times[:-1]):
+        return ds.sortby("time").pipe(_slice_time, time_range)
+    lo = max(0, np.searchsorted(times, start, side="left") - 1)
+    hi = np.searchsorted(times, stop, side="right") + 1
+    return ds.isel(time=slice(lo, hi))
+
+
+def _window_profile_dataset(ds, times, starts, stops, statistic, height, chunk_size):
+    # Reduce the variables of a (lazy) dataset over the time windows of the
+    # radar, then average the range gates or heights of profiling instruments
+    # into the height bins of the column. The windows are processed in chunks
+    # holding up to chunk_size samples, and only the samples of a chunk are
+    # loaded at a time.
+    statistics = [statistic] if isinstance(statistic, str) else list(statistic)
+    vertical = None
+    for dim in ["range", "height"]:
+        if dim in ds.dims:
+            vertical = dim
+            break
+    if vertical == "range" and "height" in ds.variables:
+        ds = ds.drop_vars("height")
+    if vertical is not None:
+        gates = ds[vertical].values.astype("float64")
+        edges = get_bin_edges(np.asarray(height, dtype="float64"))
+        ds = ds.drop_vars(vertical)
+
+    def _bin_vertical(data, dims):
+        # Average the vertical axis of data into the height bins
+        if vertical not in dims:
+            return data, dims
+        axis = dims.index(vertical)
+        data = np.moveaxis(data, axis, -1)
+        shape = data.shape[:-1]
+        binned = bin_statistics(
+            data.reshape(-1, gates.size), gates, edges, statistic="mean"
+        )
+        binned = np.moveaxis(binned.reshape(shape + (edges.size - 1,)), -1, axis)
+        dims = tuple("height" if dim == vertical else dim for dim in dims)
+        return binned, dims
+
+    timed = [var for var in ds.data_vars if "time" in ds[var].dims]
+    out = ds.drop_vars(timed).drop_dims("time", errors="ignore")
+    for var in list(out.data_vars):
+        data, dims = _bin_vertical(out[var].values, out[var].dims)
+        out[var] = (dims, data, out[var].attrs)
+    out = out.assign_coords(time=times)
+    if vertical is not None:
+        out = out.assign_coords(height=np.asarray(height))
+
+    positions = ds["time"].values
+    lo = np.searchsorted(positions, starts, side="right")
+    hi = np.maximum(np.searchsorted(positions, stops, side="right"), lo)
+    results = {}
+    result_dims = {}
+    first = 0
+    while first < times.size:
+        # Grow the chunk of windows while its samples fit in chunk_size
+        last = first + 1
+        chunk_lo, chunk_hi = lo[first], hi[first]
+        while last < times.size:
+            next_lo = min(chunk_lo, lo[last])
+            next_hi = max(chunk_hi, hi[last])
+            if next_hi - next_lo > chunk_size:
+                break
+            chunk_lo, chunk_hi = next_lo, next_hi
+            last += 1
+        chunk = ds[timed].isel(time=slice(chunk_lo, chunk_hi)).compute()
+        for var in timed:
+            da = chunk[var].transpose(..., "time")
+            values = da.values.reshape(-1, da.sizes["time"])
+            reduced = window_statistics(
+                values,
+                chunk["time"].values,
+                starts[first:last],
+                stops[first:last],
+                statistics,
+            )
+            for name in statistics:
+                data = reduced[name].reshape(da.shape[:-1] + (last - first,))
+                data, dims = _bin_vertical(data, da.dims)
+                results.setdefault((var, name), []).append(data)
+                result_dims[var] = dims
+        chunk.close()
+        first = last
+
+    for var in timed:
+        for name in statistics:
+            out_name = var if isinstance(statistic, str) else f"{var}_{name}"
+            data = np.concatenate(results[(var, name)], axis=-1)
+            out[out_name] = (result_dims[var], data, ds[var].attrs)
+    return out
+
+
+def _stack_stations(datasets, sites):
+    # Variables missing at a site are filled with NaN so that every site has
+    # the same variables, and the times of the sites are joined. Also returns
+    # the sites each variable is missing at.
+    variables = {}
+    missing_sites = {}
+    for ds in datasets:
+        for var in ds.data_vars:
+            variables.setdefault(var, ds[var])
+    stacked = []
+    for ds, site in zip(datasets, sites):
+        missing = {}
+        for var, da in variables.items():
+            if var in ds.data_vars:
+                continue
+            missing_sites.setdefault(var, []).append(site)
+            missing[var] = xr.full_like(da, np.nan, dtype=float)
+            if "time" in da.dims:
+                missing[var] = missing[var].reindex(time=ds["time"])
+        ds = ds.assign(missing)
+        stacked.append(ds.assign_coords(station=site).expand_dims("station"))
+    if len(stacked) == 1:
+        return stacked[0], missing_sites
+    stacked = xr.concat(stacked, dim="station", join="outer", combine_attrs="override")
+    return stacked, missing_sites
+
+
+def get_fill_values(column):
+    """
+    Get the table of the fill values of the variables of a Radar Column.
+
+    The '_FillValue' of a variable is used when it is set, otherwise its
+    'missing_value'. Fill values stored as strings in the attributes are
+    converted to floats in place, once.
+
+    Parameters
+    ----------
+    column : Xarray DataSet
+        Xarray DataSet containing the extracted radar column above multiple locations.
 
+    Returns
+    -------
+    fill_values : dict
+        Dictionary of the float fill value of each variable, or None for
+        variables without a fill value.
+    """
+    fill_values = {}
+    for var in column.data_vars:
+        fill = None
+        for name in ["missing_value", "_FillValue"]:
+            if name in column[var].attrs:
+                if isinstance(column[var].attrs[name], str):
+                    column[var].attrs[name] = float(column[var].attrs[name])
+                fill = float(column[var].attrs[name])
+        fill_values[var] = fill
+    return fill_values
+
+
+def merge_matched_dataset(column, matched, site=None, fill_values=None):
+    """
+    Write the ground observations matched with :func:`resample_ground_datasets`
+    into the variables of a Radar Column, for all of the matched sites at once.
+
+    The station index is resolved once and the values are written in place
+    into the arrays of the column, and the NaNs of each written variable,
+    including those of the stations not written, are replaced by its fill
+    value in place. Variables with a fill value are converted to float64 the
+    first time they are written.
+
+    Parameters
+    ----------
+    column : Xarray DataSet
+        Xarray DataSet containing the extracted radar column above multiple locations.
+
+    matched : Xarray DataSet
+        The matched ground observations, with a station dimension.
+
+    site : str or None
+        Location of the ground instrument. Set to None to write all of the
+        stations of matched. Default is None.
+
+    fill_values : dict or None
+        Table of the fill values of the column variables, see
+        :func:`get_fill_values`. Set to None to build it from the column.
+        Default is None.
+
+    Returns
+    -------
+    ds : Xarray DataSet
+        Xarray Dataset containing the time-synced in-situ ground observations with
+        the inputed radar column
+    """
+    if fill_values is None:
+        fill_values = get_fill_values(column)
+    if site is None:
+        sites = list(matched["station"].values)
+    else:
+        sites = [site]
+    station_index = column.indexes["station"].get_indexer(sites)
     # Merge the two DataSets
     for k in matched.data_vars:
-        if k in column.data_vars:
-            column[k].sel(station=site)[:] = matched.sel(station=site)[k][:].astype(
-                column[k].dtype
-            )
-            if "_FillValue" in column[k].attrs:
-                if isinstance(column[k].attrs["_FillValue"], str):
-                    column[k].attrs["_FillValue"] = float(column[k].attrs["_FillValue"])
-                column[k] = (
-                    column[k].fillna(column[k].attrs["_FillValue"]).astype(float)
-                )
-            if "missing_value" in column[k].attrs:
-                if isinstance(column[k].attrs["missing_value"], str):
-                    column[k].attrs["missing_value"] = float(
-                        column[k].attrs["missing_value"]
-                    )
-                column[k] = (
-                    column[k].fillna(column[k].attrs["missing_value"]).astype(float)
-                )
-    grd_ds.close()
+        if k not in column.data_vars:
+            continue
+        values = matched[k].sel(station=sites).transpose(*column[k].dims).values
+        fill = fill_values.get(k)
+        if fill is not None and column[k].dtype != np.float64:
+            column[k] = column[k].astype(float)
+        # Write into the array of the column at the matched stations
+        data = column[k].values
+        index = [slice(None)] * data.ndim
+        index[column[k].dims.index("station")] = station_index
+        data[tuple(index)] = values.astype(data.dtype)
+        if fill is not None:
+            np.copyto(data, fill, where=np.isnan(data))
     return column
 
 
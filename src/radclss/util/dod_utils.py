@@ -0,0 +1,297 @@
+import json
+import logging
+import urllib.request
+import warnings
+
+import numpy as np
+
+from functools import lru_cache
+
+from ..config import DEFAULT_DATASTREAM_PREFIX, DEFAULT_DISCARD_VAR
+
+DOD_API_URL = "https://pcm.arm.gov/pcm/api/dods/"
+
+# Variables of the output DOD that RadCLss adds itself rather than reading
+# them from a datastream
+DOD_OUTPUT_COORDINATES = [
+    "base_time",
+    "time_offset",
+    "time",
+    "station",
+    "height",
+    "lat",
+    "lon",
+    "alt",
+]
+
+# Storage dtype of the numeric DOD variable types
+DOD_DTYPES = {
+    "byte": "int8",
+    "short": "int16",
+    "int": "int32",
+    "int64": "int64",
+    "float": "float32",
+    "double": "float64",
+}
+
+
+@lru_cache(maxsize=16)
+def _load_dod(process, local_file=False):
+    if local_file:
+        with open(process) as fi:
+            return json.loads(fi.read())
+    with urllib.request.urlopen(DOD_API_URL + process) as url:
+        return json.loads(url.read().decode())
+
+
+def get_dod_variables(process, version="", local_file=False):
+    """
+    Get the variable definitions of an ARM Data Object Description (DOD).
+
+    Parameters
+    ----------
+    process : str
+        The DOD process name (i.e. 'csapr2radclss.c2'), or the path to a
+        local DOD JSON file if local_file is True.
+    version : str, optional
+        The DOD version. If this is an empty string or the version is not
+        available, then the latest version will be used.
+    local_file : bool, optional
+        Set to True to read the DOD from a local JSON file. Default is False.
+
+    Returns
+    -------
+    variables : list
+        List of dictionaries describing each DOD variable, including its
+        'name', 'type', 'dims' and 'atts'.
+    """
+    data = _load_dod(process, local_file=local_file)
+    keys = list(data["versions"].keys())
+    if version not in keys:
+        warnings.warn(
+            f"Version: {version} not available or not specified. Using Version: {keys[-1]}",
+            UserWarning,
+        )
+        version = keys[-1]
+    return data["versions"][version]["vars"]
+
+
+def get_datastream_prefix(key):
+    """
+    Get the prefix that RadCLss adds to the variables of a datastream in the
+    output dataset.
+
+    Parameters
+    ----------
+    key : str
+        The key of the datastream in the volumes dictionary
+        (i.e. 'radar_csapr2', 'sonde', 'met_M1', 'ld_S30').
+
+    Returns
+    -------
+    prefix : str or None
+        The variable name prefix, or None if the variables are not prefixed.
+    """
+    if key.startswith("radar_"):
+        return key.split("_")[1] + "_"
+    instrument = key.split("_", 1)[0]
+    return DEFAULT_DATASTREAM_PREFIX.get(instrument, None)
+
+
+def get_read_allowlist(dod_variables, key, required=None):
+    """
+    Derive the list of variables to read from a datastream from the
+    variables of the output DOD, stripping the datastream prefix.
+
+    Variables that are not in the list cannot reach the output dataset,
+    so there is no need to decode them. The variables of the unprefixed
+    surface datastreams (i.e. 'met') are the DOD variables without a height
+    dimension that do not belong to a prefixed datastream, leaving out the
+    coordinates that RadCLss adds to the output.
+
+    Parameters
+    ----------
+    dod_variables : list
+        Variable definitions returned by :func:`get_dod_variables`.
+    key : str
+        The key of the datastream in the volumes dictionary.
+    required : list or None, optional
+        Additional variables that are needed to process the datastream
+        (i.e. 'alt' for radiosondes).
+
+    Returns
+    -------
+    allowlist : list or None
+        List of variable names in the input datastream. None is returned
+        if no variable of the DOD belongs to the datastream, in which case
+        the datastream should be read in full.
+    """
+    prefix = get_datastream_prefix(key)
+    if prefix is not None:
+        names = [
+            v["name"][len(prefix) :]
+            for v in dod_variables
+            if v["name"].startswith(prefix)
+        ]
+    else:
+        prefixes = tuple(_datastream_prefixes())
+        names = [
+            v["name"]
+            for v in dod_variables
+            if not v["name"].startswith(prefixes)
+            and v["name"] not in DOD_OUTPUT_COORDINATES
+            and "height" not in v.get("dims", [])
+        ]
+    if len(names) == 0:
+        logging.warning(
+            f"No variables in the DOD for {key}. All variables will be read."
+        )
+        return None
+    if required is not None:
+        names = names + [name for name in required if name not in names]
+    return names
+
+
+def _datastream_prefixes():
+    # Prefixes of the variables of the radars and the prefixed datastreams
+    prefixes = {
+        get_datastream_prefix(key) for key in DEFAULT_DISCARD_VAR if "radar_" in key
+    }
+    prefixes.update(x for x in DEFAULT_DATASTREAM_PREFIX.values() if x is not None)
+    return sorted(prefixes)
+
+
+def _datastream_names(dod_variables, key):
+    # Map the DOD variable names of a datastream to its input variable names
+    prefix = get_datastream_prefix(key)
+    names = {}
+    for v in dod_variables:
+        name = v["name"]
+        if prefix is None:
+            names[name] = name
+        elif name.startswith(prefix):
+            names[name] = name[len(prefix) :]
+        elif key.startswith("radar_") and name.startswith("sonde_"):
+            # Radiosonde fields are mapped onto the radar gates unprefixed
+            names[name] = name
+    return names
+
+
+def get_dod_encoding(dod_variables, key=None):
+    """
+    Get the storage dtype of the numeric variables of the output DOD, used
+    to keep the data compact from extraction until the output is written.
+
+    Parameters
+    ----------
+    dod_variables : list
+        Variable definitions returned by :func:`get_dod_variables`.
+    key : str or None, optional
+        The key of a datastream in the volumes dictionary. The encoding is
+        then given for the variable names of the input datastream, with the
+        datastream prefix stripped. Set to None to use the output variable
+        names. Default is None.
+
+    Returns
+    -------
+    encoding : dict
+        Dictionary mapping each variable name to a dictionary with its
+        'dtype', and the '_FillValue', 'scale_factor' and 'add_offset' of
+        the DOD for integer variables.
+    """
+    if key is None:
+        names = {v["name"]: v["name"] for v in dod_variables}
+    else:
+        names = _datastream_names(dod_variables, key)
+    encoding = {}
+    for v in dod_variables:
+        if v["name"] not in names or v.get("type") not in DOD_DTYPES:
+            continue
+        dtype = np.dtype(DOD_DTYPES[v["type"]])
+        entry = {"dtype": dtype}
+        if dtype.kind == "i":
+            atts = {att["name"]: att.get("value") for att in v.get("atts", [])}
+            entry["_FillValue"] = dtype.type(
+                atts.get("_FillValue", atts.get("missing_value", np.iinfo(dtype).min))
+            )
+            entry["scale_factor"] = float(atts.get("scale_factor", 1.0))
+            entry["add_offset"] = float(atts.get("add_offset", 0.0))
+        encoding[names[v["name"]]] = entry
+    return encoding
+
+
+def pack_variables(ds, encoding):
+    """
+    Pack the floating point variables of a dataset to their DOD storage
+    dtype. Float variables are narrowed to the DOD float type, and
+    variables stored as integers in the DOD are scaled, rounded and stored
+    as integers with the DOD fill value in place of NaNs.
+
+    Parameters
+    ----------
+    ds : xarray Dataset
+        The dataset to pack.
+    encoding : dict or None
+        Encoding returned by :func:`get_dod_encoding`. Set to None to not
+        pack the dataset.
+
+    Returns
+    -------
+    ds : xarray Dataset
+        The packed dataset. See :func:`unpack_variables` to restore the
+        integer variables.
+    """
+    if not encoding:
+        return ds
+    for var in ds.data_vars:
+        if var not in encoding or ds[var].dtype.kind != "f":
+            continue
+        entry = encoding[var]
+        dtype = entry["dtype"]
+        if dtype.kind == "f":
+            if dtype.itemsize < ds[var].dtype.itemsize:
+                ds[var] = ds[var].astype(dtype)
+            continue
+        info = np.iinfo(dtype)
+        values = ds[var].values
+        with np.errstate(invalid="ignore"):
+            packed = np.round((values - entry["add_offset"]) / entry["scale_factor"])
+            packed = np.clip(packed, info.min, info.max)
+        packed = np.where(np.isfinite(values), packed, entry["_FillValue"])
+        ds[var] = ds[var].copy(data=packed.astype(dtype))
+    return ds
+
+
+def unpack_variables(ds, encoding):
+    """
+    Restore the variables packed to integers by :func:`pack_variables` to
+    floating point values, with NaNs in place of the fill value. Float
+    variables are left unchanged.
+
+    Parameters
+    ----------
+    ds : xarray Dataset
+        The packed dataset.
+    encoding : dict or None
+        Encoding returned by :func:`get_dod_encoding`.
+
+    Returns
+    -------
+    ds : xarray Dataset
+        The dataset with the integer variables unpacked.
+    """
+    if not encoding:
+        return ds
+    for var in ds.data_vars:
+        if var not in encoding or encoding[var]["dtype"].kind != "i":
+            continue
+        if ds[var].dtype.kind not in "fi":
+            continue
+        entry = encoding[var]
+        values = ds[var].values
+        # Reindexing and merging may have widened the packed data to floats
+        unpacked = values.astype("float64")
+        unpacked[values == entry["_FillValue"]] = np.nan
+        unpacked = unpacked * entry["scale_factor"] + entry["add_offset"]
+        ds[var] = ds[var].copy(data=unpacked)
+    return ds
@@ -0,0 +1,284 @@
+import json
+import sys
+import time
+
+from collections import deque
+
+# Kinds of the events emitted by a ProgressTracker
+EVENT_KINDS = [
+    "stage_started",
+    "stage_finished",
+    "task_started",
+    "task_finished",
+    "task_failed",
+    "bytes_read",
+    "throughput",
+]
+
+
+class ProgressEvent:
+    """
+    An event emitted while RadCLss is running.
+
+    Parameters
+    ----------
+    kind : str
+        The kind of event, one of EVENT_KINDS.
+    stage : str
+        The stage of the run (i.e. 'radar_extraction', 'nexrad',
+        'assembly', 'insitu').
+    key : str or None, optional
+        The datastream the event belongs to (i.e. 'radar_csapr2').
+    task : str or None, optional
+        The task of the event, such as the name of a radar file.
+    **kwargs : dict
+        Additional fields of the event, such as 'elapsed', 'nbytes',
+        'done', 'total', 'files_per_second', 'eta' or 'error'.
+    """
+
+    def __init__(self, kind, stage, key=None, task=None, **kwargs):
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"kind must be one of {EVENT_KINDS}, got {kind}.")
+        self.kind = kind
+        self.stage = stage
+        self.key = key
+        self.task = task
+        self.time = time.time()
+        self.fields = kwargs
+
+    def __getattr__(self, name):
+        fields = self.__dict__.get("fields", {})
+        if name in fields:
+            return fields[name]
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return f"ProgressEvent({self.to_dict()})"
+
+    def to_dict(self):
+        """Return the event as a JSON serializable dictionary."""
+        out = {
+            "kind": self.kind,
+            "stage": self.stage,
+            "key": self.key,
+            "task": self.task,
+            "time": self.time,
+        }
+        out.update(self.fields)
+        return out
+
+
+class ProgressTracker:
+    """
+    Track the progress of the stages of a run and emit ProgressEvents to a
+    list of callbacks.
+
+    Finished tasks update a rolling throughput estimate over the last
+    `window` tasks, which is emitted as a 'throughput' event with the files
+    per second and the estimated seconds left in the stage.
+
+    Parameters
+    ----------
+    callbacks : list or callable or None, optional
+        Callables taking a ProgressEvent. Exceptions raised by a callback
+        are not caught.
+    window : int, optional
+        Number of finished tasks the throughput is computed over.
+        Default is 20.
+    """
+
+    def __init__(self, callbacks=None, window=20):
+        if callbacks is None:
+            callbacks = []
+        elif callable(callbacks):
+            callbacks = [callbacks]
+        self.callbacks = list(callbacks)
+        self.window = window
+        self._stages = {}
+
+    def emit(self, event):
+        """Send an event to all callbacks."""
+        for callback in self.callbacks:
+            callback(event)
+
+    def stage_started(self, stage, total=None, key=None):
+        """Start a stage with `total` tasks."""
+        self._stages[(stage, key)] = {
+            "start": time.perf_counter(),
+            "total": total,
+            "done": 0,
+            "failed": 0,
+            "nbytes": 0,
+            "finished": deque(maxlen=self.window),
+        }
+        if self.callbacks:
+            self.emit(ProgressEvent("stage_started", stage, key=key, total=total))
+
+    def stage_finished(self, stage, key=None):
+        """Finish a stage."""
+        state = self._stages.pop((stage, key), None)
+        if state is None or not self.callbacks:
+            return
+        self.emit(
+            ProgressEvent(
+                "stage_finished",
+                stage,
+                key=key,
+                elapsed=time.perf_counter() - state["start"],
+                done=state["done"],
+                failed=state["failed"],
+                total=state["total"],
+                nbytes=state["nbytes"],
+            )
+        )
+
+    def task_started(self, stage, task, key=None):
+        """Report that a task of a stage was started or submitted."""
+        if self.callbacks:
+            self.emit(ProgressEvent("task_started", stage, key=key, task=task))
+
+    def task_finished(self, stage, task, key=None, elapsed=None, nbytes=0, count=1):
+        """
+        Report that a task finished, covering `count` files and `nbytes`
+        bytes read, and emit the updated throughput.
+        """
+        state = self._state(stage, key)
+        state["done"] += count
+        state["nbytes"] += nbytes
+        state["finished"].append((time.perf_counter(), count))
+        if not self.callbacks:
+            return
+        self.emit(
+            ProgressEvent(
+                "task_finished",
+                stage,
+                key=key,
+                task=task,
+                elapsed=elapsed,
+                nbytes=nbytes,
+                done=state["done"],
+                total=state["total"],
+            )
+        )
+        if nbytes > 0:
+            self.emit(
+                ProgressEvent(
+                    "bytes_read",
+                    stage,
+                    key=key,
+                    task=task,
+                    nbytes=nbytes,
+                    total_nbytes=state["nbytes"],
+                )
+            )
+        self.emit(self._throughput(stage, key, state))
+
+    def task_failed(self, stage, task, key=None, error=None, count=1):
+        """Report that a task failed."""
+        state = self._state(stage, key)
+        state["failed"] += count
+        if self.callbacks:
+            self.emit(
+                ProgressEvent(
+                    "task_failed",
+                    stage,
+                    key=key,
+                    task=task,
+                    error=None if error is None else str(error),
+                    failed=state["failed"],
+                )
+            )
+
+    def _state(self, stage, key):
+        if (stage, key) not in self._stages:
+            self.stage_started(stage, key=key)
+        return self._stages[(stage, key)]
+
+    def _throughput(self, stage, key, state):
+        finished = state["finished"]
+        elapsed = finished[-1][0] - state["start"]
+        if len(finished) > 1:
+            # Rolling rate over the tasks in the window
+            count = sum(x[1] for x in list(finished)[1:])
+            elapsed = finished[-1][0] - finished[0][0]
+        else:
+            count = finished[-1][1]
+        rate = count / elapsed if elapsed > 0 else None
+        eta = None
+        if rate and state["total"] is not None:
+            eta = max(0, state["total"] - state["done"] - state["failed"]) / rate
+        return ProgressEvent(
+            "throughput",
+            stage,
+            key=key,
+            files_per_second=rate,
+            eta=eta,
+            done=state["done"],
+            failed=state["failed"],
+            total=state["total"],
+        )
+
+
+class ProgressBar:
+    """
+    Progress event consumer rendering a text progress bar of each stage.
+
+    Parameters
+    ----------
+    stream : file-like or None, optional
+        Stream the progress bar is written to. Set to None to use
+        sys.stderr. Default is None.
+    width : int, optional
+        Width of the bar in characters. Default is 30.
+    """
+
+    def __init__(self, stream=None, width=30):
+        self.stream = stream if stream is not None else sys.stderr
+        self.width = width
+
+    def __call__(self, event):
+        name = event.stage if event.key is None else f"{event.stage} {event.key}"
+        if event.kind == "throughput":
+            total = event.total
+            done = event.done + event.failed
+            if total:
+                filled = int(self.width * min(done, total) / total)
+                bar = "#" * filled + "-" * (self.width - filled)
+                text = f"\r{name} [{bar}] {done}/{total}"
+            else:
+                text = f"\r{name} {done}"
+            if event.files_per_second is not None:
+                text += f" {event.files_per_second:.2f} files/s"
+            if event.eta is not None:
+                text += f" ETA {event.eta:.0f} s"
+            self.stream.write(text)
+            self.stream.flush()
+        elif event.kind == "stage_finished":
+            self.stream.write(
+                f"\r{name} finished: {event.done} done, {event.failed} failed "
+                + f"in {event.elapsed:.1f} s\n"
+            )
+            self.stream.flush()
+
+
+class JSONLinesWriter:
+    """
+    Progress event consumer writing each event as a line of JSON.
+
+    Parameters
+    ----------
+    filename : str or file-like
+        Path of the file the events are appended to, or an open stream.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __call__(self, event):
+        line = json.dumps(event.to_dict(), default=str) + "\n"
+        if hasattr(self.filename, "write"):
+            self.filename.write(line)
+            self.filename.flush()
+        else:
+            with open(self.filename, "a") as fi:
+                fi.write(line)
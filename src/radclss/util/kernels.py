@@ -0,0 +1,158 @@
+"""
+Compiled kernels for the column extraction. The kernels are compiled with
+Numba when it is installed, otherwise the NumPy implementations are used.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _use_numba(use_numba):
+    if use_numba is None:
+        return NUMBA_AVAILABLE
+    if use_numba and not NUMBA_AVAILABLE:
+        raise ImportError("Numba is required for use_numba=True.")
+    return use_numba
+
+
+def _group_mean_numpy(values, groups, ngroups):
+    result = np.full((values.shape[0], ngroups), np.nan)
+    if groups.size == 0:
+        return result
+    starts = np.flatnonzero(np.diff(groups, prepend=-1))
+    finite = np.isfinite(values)
+    count = np.add.reduceat(finite, starts, axis=-1)
+    total = np.add.reduceat(np.where(finite, values, 0.0), starts, axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result[:, groups[starts]] = np.where(count > 0, total / count, np.nan)
+    return result
+
+
+def _interp_rows_numpy(x, xp, fp):
+    result = np.full((fp.shape[0], x.size), np.nan)
+    if xp.size == 0:
+        return result
+    for i in range(fp.shape[0]):
+        result[i] = np.interp(x, xp, fp[i], left=np.nan, right=np.nan)
+    return result
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _group_mean_numba(values, groups, ngroups):
+        nrows, nvalues = values.shape
+        result = np.full((nrows, ngroups), np.nan)
+        for row in range(nrows):
+            i = 0
+            while i < nvalues:
+                group = groups[i]
+                total = 0.0
+                count = 0
+                while i < nvalues and groups[i] == group:
+                    value = values[row, i]
+                    if np.isfinite(value):
+                        total += value
+                        count += 1
+                    i += 1
+                if count > 0:
+                    result[row, group] = total / count
+        return result
+
+    @njit(cache=True)
+    def _interp_rows_numba(x, xp, fp):
+        # Same arithmetic as np.interp, including its handling of NaNs
+        nrows = fp.shape[0]
+        nx = x.size
+        nxp = xp.size
+        result = np.full((nrows, nx), np.nan)
+        if nxp == 0:
+            return result
+        for k in range(nx):
+            x_val = x[k]
+            if np.isnan(x_val) or x_val < xp[0] or x_val > xp[nxp - 1]:
+                continue
+            j = np.searchsorted(xp, x_val, side="right") - 1
+            for row in range(nrows):
+                if j >= nxp - 1:
+                    result[row, k] = fp[row, nxp - 1]
+                elif xp[j] == x_val:
+                    result[row, k] = fp[row, j]
+                else:
+                    slope = (fp[row, j + 1] - fp[row, j]) / (xp[j + 1] - xp[j])
+                    value = slope * (x_val - xp[j]) + fp[row, j]
+                    if np.isnan(value):
+                        value = slope * (x_val - xp[j + 1]) + fp[row, j + 1]
+                        if np.isnan(value) and fp[row, j] == fp[row, j + 1]:
+                            value = fp[row, j]
+                    result[row, k] = value
+        return result
+
+
+def group_mean(values, groups, ngroups, use_numba=None):
+    """
+    NaN ignoring mean of values over sorted groups.
+
+    Parameters
+    ----------
+    values : numpy array
+        Array of shape (..., nvalues) to average over the last axis.
+    groups : numpy array
+        Sorted integer group of each value along the last axis.
+    ngroups : int
+        The number of groups.
+    use_numba : bool or None, optional
+        Set to True to use the Numba kernel, False to use NumPy, or None to
+        use Numba if it is installed. Default is None.
+
+    Returns
+    -------
+    result : numpy array
+        Array of shape (..., ngroups) with the mean of each group. Groups
+        without any finite value are NaN.
+    """
+    values = np.asarray(values, dtype="float64")
+    groups = np.asarray(groups, dtype="int64")
+    shape = values.shape[:-1]
+    values = np.ascontiguousarray(values.reshape(int(np.prod(shape)), values.shape[-1]))
+    if _use_numba(use_numba):
+        result = _group_mean_numba(values, groups, ngroups)
+    else:
+        result = _group_mean_numpy(values, groups, ngroups)
+    return result.reshape(shape + (ngroups,))
+
+
+def interp_rows(x, xp, fp, use_numba=None):
+    """
+    Linearly interpolate each row of fp from xp to x, like np.interp with
+    NaN outside of xp.
+
+    Parameters
+    ----------
+    x : numpy array
+        The coordinates to interpolate to.
+    xp : numpy array
+        The increasing coordinates of the data.
+    fp : numpy array
+        Array of shape (nrows, xp.size) of the data.
+    use_numba : bool or None, optional
+        Set to True to use the Numba kernel, False to use NumPy, or None to
+        use Numba if it is installed. Default is None.
+
+    Returns
+    -------
+    result : numpy array
+        Array of shape (nrows, x.size) of the interpolated data.
+    """
+    x = np.asarray(x, dtype="float64")
+    xp = np.asarray(xp, dtype="float64")
+    fp = np.ascontiguousarray(fp, dtype="float64")
+    if _use_numba(use_numba):
+        return _interp_rows_numba(x, xp, fp)
+    return _interp_rows_numpy(x, xp, fp)
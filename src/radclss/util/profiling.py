@@ -0,0 +1,242 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+
+import dask
+
+from dask.utils import key_split, parse_timedelta
+
+# Functions whose inclusive time is reported as a phase of the radar and
+# NEXRAD column extraction
+PROFILE_PHASES = {
+    "read": ["read_radar", "read_nexrad_archive"],
+    "sonde_mapping": ["map_profile_to_gates"],
+    "extraction": ["_extract_site_columns"],
+    "packing": ["pack_variables"],
+}
+
+# Prefixes of the Dask tasks extracting columns on the workers (as given by
+# dask.utils.key_split, which drops the leading underscores)
+PROFILED_TASKS = ["subset_points_batch", "get_nexrad_wrapper"]
+
+
+def get_profile_paths(filename):
+    """
+    Get the paths of the profile artifacts of a run.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the output file of the run (i.e. the RadCLss netCDF file).
+
+    Returns
+    -------
+    html : str
+        Path to the Dask performance report, next to the output file.
+    json : str
+        Path to the JSON profile summary, next to the output file.
+    """
+    stem = os.path.splitext(filename)[0]
+    return stem + ".profile.html", stem + ".profile.json"
+
+
+class RunProfiler:
+    """
+    Context manager capturing a profile of a RadCLss run.
+
+    With a Dask client, the run is wrapped in a Dask performance report,
+    the task stream is recorded to get the duration and result size of
+    each task, the memory of the workers is sampled, and the statistical
+    profiles the workers collect of the column extraction tasks are
+    aggregated into time per phase and per function. Without a client, the
+    run is profiled with cProfile.
+
+    The summary is written as JSON, and the performance report as HTML
+    when Bokeh is installed (see :func:`get_profile_paths`).
+
+    Parameters
+    ----------
+    filename : str
+        Path to the output file of the run, next to which the artifacts
+        are written.
+    client : dask.distributed.Client or None, optional
+        The Dask client of a parallel run. Set to None for a serial run.
+    memory_interval : float, optional
+        Interval in seconds between samples of the worker memory.
+        Default is 1.0.
+    top : int, optional
+        Number of functions listed in the summary. Default is 30.
+    """
+
+    def __init__(self, filename, client=None, memory_interval=1.0, top=30):
+        self.html_path, self.json_path = get_profile_paths(filename)
+        self.client = client
+        self.memory_interval = memory_interval
+        self.top = top
+        self.summary = None
+        self._report = None
+        self._stream = None
+        self._profile = None
+        self._sampler = None
+        self._stop = threading.Event()
+        self._memory = {}
+
+    def __enter__(self):
+        self._start = time.time()
+        if self.client is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            return self
+
+        from distributed import get_task_stream, performance_report
+
+        try:
+            import bokeh  # noqa: F401
+        except ImportError:
+            logging.warning(
+                "Bokeh is not installed, the Dask performance report will not be saved."
+            )
+        else:
+            self._report = performance_report(filename=self.html_path)
+            self._report.__enter__()
+        self._stream = get_task_stream(client=self.client)
+        self._stream.__enter__()
+        self._sampler = threading.Thread(target=self._sample_memory, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.time() - self._start
+        if self.client is None:
+            self._profile.disable()
+            summary = self._cprofile_summary()
+        else:
+            self._stop.set()
+            self._sampler.join()
+            self._stream.__exit__(exc_type, exc_value, traceback)
+            if self._report is not None:
+                self._report.__exit__(exc_type, exc_value, traceback)
+            summary = self._dask_summary()
+        summary["elapsed"] = elapsed
+        summary["failed"] = exc_type is not None
+        self.summary = summary
+        with open(self.json_path, "w") as fi:
+            json.dump(summary, fi, indent=2, default=str)
+        return False
+
+    def _sample_memory(self):
+        while not self._stop.is_set():
+            try:
+                workers = self.client.scheduler_info()["workers"]
+            except Exception:
+                break
+            for address, info in workers.items():
+                memory = info.get("metrics", {}).get("memory", 0)
+                self._memory[address] = max(self._memory.get(address, 0), memory)
+            self._stop.wait(self.memory_interval)
+
+    def _cprofile_summary(self):
+        stats = pstats.Stats(self._profile)
+        functions = {}
+        for (filename, line, name), values in stats.stats.items():
+            functions[(filename, line, name)] = {
+                "name": name,
+                "filename": filename,
+                "line": line,
+                "calls": values[1],
+                "self_seconds": values[2],
+                "seconds": values[3],
+            }
+        phases = {
+            phase: sum(f["seconds"] for f in functions.values() if f["name"] in names)
+            for phase, names in PROFILE_PHASES.items()
+        }
+        top = sorted(functions.values(), key=lambda x: x["seconds"], reverse=True)
+        return {
+            "mode": "serial",
+            "phases": phases,
+            "functions": top[: self.top],
+        }
+
+    def _dask_summary(self):
+        tasks = {}
+        for record in self._stream.data:
+            prefix = key_split(record["key"])
+            entry = tasks.setdefault(
+                prefix,
+                {
+                    "count": 0,
+                    "failed": 0,
+                    "compute_seconds": 0.0,
+                    "max_compute_seconds": 0.0,
+                    "transfer_seconds": 0.0,
+                    "nbytes": 0,
+                },
+            )
+            entry["count"] += 1
+            if record.get("status") != "OK":
+                entry["failed"] += 1
+            compute = 0.0
+            for startstop in record["startstops"]:
+                seconds = startstop["stop"] - startstop["start"]
+                if startstop["action"] == "compute":
+                    compute += seconds
+                elif startstop["action"] == "transfer":
+                    entry["transfer_seconds"] += seconds
+            entry["compute_seconds"] += compute
+            entry["max_compute_seconds"] = max(entry["max_compute_seconds"], compute)
+            entry["nbytes"] += record.get("nbytes", 0) or 0
+        for entry in tasks.values():
+            entry["mean_compute_seconds"] = entry["compute_seconds"] / entry["count"]
+
+        interval = parse_timedelta(
+            dask.config.get("distributed.worker.profile.interval", "10ms")
+        )
+        phases = {phase: 0.0 for phase in PROFILE_PHASES}
+        functions = {}
+        for key in PROFILED_TASKS:
+            profile = self.client.profile(key=key, start=self._start)
+            _accumulate_profile(profile, functions, interval)
+        for phase, names in PROFILE_PHASES.items():
+            phases[phase] = sum(
+                f["seconds"] for f in functions.values() if f["name"] in names
+            )
+        top = sorted(functions.values(), key=lambda x: x["seconds"], reverse=True)
+        return {
+            "mode": "dask",
+            "tasks": tasks,
+            "worker_memory": dict(self._memory),
+            "phases": phases,
+            "functions": top[: self.top],
+        }
+
+
+def _accumulate_profile(node, functions, interval, stack=()):
+    # Inclusive time of each function in a Dask profile tree, counting
+    # recursive calls once. The task profiles of the workers do not count the
+    # samples in leaf frames, so this is the time spent in the callees of each
+    # function, which is what matters for the phases that call into Py-ART.
+    description = node.get("description", {})
+    ident = (
+        description.get("filename"),
+        description.get("line_number"),
+        description.get("name"),
+    )
+    if ident[2] and ident not in stack:
+        entry = functions.setdefault(
+            ident,
+            {
+                "name": ident[2],
+                "filename": ident[0],
+                "line": ident[1],
+                "seconds": 0.0,
+            },
+        )
+        entry["seconds"] += node.get("count", 0) * interval
+        stack = stack + (ident,)
+    for child in node.get("children", {}).values():
+        _accumulate_profile(child, functions, interval, stack)
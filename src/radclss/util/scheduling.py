@@ -0,0 +1,233 @@
+import json
+import os
+
+import numpy as np
+
+from ..io.header import read_radar_header
+
+# Prior coefficients (seconds) for the linear cost model. These are only used
+# to rank files until enough observed costs have been recorded.
+DEFAULT_COST_COEFFICIENTS = {
+    "intercept": 1.0,
+    "size_mb": 0.02,
+    "gate_values_m": 0.5,
+    "nsweeps": 0.2,
+}
+
+
+class FileCostModel:
+    """
+    Linear model of the time it takes to extract columns from a radar file.
+
+    The estimated cost of a file is::
+
+        intercept + size_mb * (file size in MB)
+                  + gate_values_m * (rays * gates * fields / 1e6)
+                  + nsweeps * (number of sweeps)
+
+    Observed costs can be recorded with :meth:`record`. Once there are more
+    observations than coefficients, the coefficients are refit with
+    non-negative least squares so the estimates improve over time.
+
+    Parameters
+    ----------
+    coefficients : dict or None, optional
+        Starting coefficients of the model. Set to None to use
+        DEFAULT_COST_COEFFICIENTS.
+    history : list or None, optional
+        List of previously observed [features, seconds] pairs.
+    max_history : int, optional
+        Maximum number of observations kept for fitting the model.
+    """
+
+    feature_names = ["intercept", "size_mb", "gate_values_m", "nsweeps"]
+
+    def __init__(self, coefficients=None, history=None, max_history=5000):
+        if coefficients is None:
+            coefficients = DEFAULT_COST_COEFFICIENTS
+        self.coefficients = dict(coefficients)
+        self.history = list(history) if history is not None else []
+        self.max_history = max_history
+        self._headers = {}
+
+    def header(self, filename):
+        """Return the (cached) radar header for a file."""
+        if filename not in self._headers:
+            self._headers[filename] = read_radar_header(filename)
+        return self._headers[filename]
+
+    def set_header(self, filename, header):
+        """
+        Set the radar header of a file, i.e. from a
+        :class:`radclss.io.FileCatalog`, so that it is not read again.
+        """
+        self._headers[filename] = header
+
+    def features(self, filename):
+        """
+        Compute the cost model features of a radar file.
+
+        Parameters
+        ----------
+        filename : str or dict
+            Path to the radar file or a header returned by
+            :func:`radclss.io.read_radar_header`.
+
+        Returns
+        -------
+        features : list
+            Feature values in the order of FileCostModel.feature_names.
+        """
+        header = filename if isinstance(filename, dict) else self.header(filename)
+        nrays = header["nrays"] or 0
+        ngates = header["ngates"] or 0
+        nfields = header["nfields"] or 0
+        return [
+            1.0,
+            header["size"] / 1e6,
+            nrays * ngates * nfields / 1e6,
+            float(header["nsweeps"] or 0),
+        ]
+
+    def estimate(self, filename):
+        """
+        Estimate the cost in seconds of extracting columns from a radar file.
+
+        Parameters
+        ----------
+        filename : str or dict
+            Path to the radar file or its header.
+
+        Returns
+        -------
+        cost : float
+            Estimated cost in seconds.
+        """
+        coefs = [self.coefficients[name] for name in self.feature_names]
+        return float(np.dot(coefs, self.features(filename)))
+
+    def record(self, filename, seconds):
+        """
+        Record the observed cost of a radar file and refit the model.
+
+        Parameters
+        ----------
+        filename : str or dict
+            Path to the radar file or its header.
+        seconds : float
+            Observed processing time in seconds.
+        """
+        self.history.append([self.features(filename), float(seconds)])
+        if len(self.history) > self.max_history:
+            self.history = self.history[-self.max_history :]
+        if len(self.history) > len(self.feature_names):
+            self.fit()
+
+    def fit(self):
+        """Refit the coefficients to the recorded history."""
+        x = np.array([h[0] for h in self.history], dtype=float)
+        y = np.array([h[1] for h in self.history], dtype=float)
+        # Non-negative least squares by dropping negative coefficients
+        # until the solution is non-negative.
+        active = np.ones(x.shape[1], dtype=bool)
+        coefs = np.zeros(x.shape[1])
+        while active.any():
+            solution = np.linalg.lstsq(x[:, active], y, rcond=None)[0]
+            if np.all(solution >= 0):
+                coefs[active] = solution
+                break
+            active[np.flatnonzero(active)[np.argmin(solution)]] = False
+        self.coefficients = dict(zip(self.feature_names, coefs.tolist()))
+
+    def save(self, filename):
+        """
+        Save the model coefficients and history to a JSON file.
+
+        Parameters
+        ----------
+        filename : str
+            Path to the JSON file.
+        """
+        with open(filename, "w") as fi:
+            json.dump({"coefficients": self.coefficients, "history": self.history}, fi)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a model saved with :meth:`save`. If the file does not exist,
+        a model with the default coefficients is returned.
+
+        Parameters
+        ----------
+        filename : str
+            Path to the JSON file.
+
+        Returns
+        -------
+        model : FileCostModel
+            The loaded cost model.
+        """
+        if not os.path.exists(filename):
+            return cls()
+        with open(filename) as fi:
+            state = json.load(fi)
+        return cls(coefficients=state["coefficients"], history=state["history"])
+
+
+def schedule_files(files, n_workers, cost_model=None, tasks_per_worker=4):
+    """
+    Order radar files longest-first and batch small files together so the
+    makespan on n_workers is close to the total work divided by n_workers.
+
+    Files that are estimated to cost at least total / (n_workers * tasks_per_worker)
+    are submitted on their own. Smaller files are grouped into batches of about
+    that size.
+
+    Parameters
+    ----------
+    files : list
+        List of radar file paths.
+    n_workers : int
+        Number of workers the batches will be run on.
+    cost_model : FileCostModel or None, optional
+        Model used to estimate the cost of each file. Set to None to use
+        a FileCostModel with the default coefficients.
+    tasks_per_worker : int, optional
+        Target number of batches per worker. Default is 4.
+
+    Returns
+    -------
+    batches : list
+        List of lists of file paths ordered by decreasing estimated cost.
+    """
+    if len(files) == 0:
+        return []
+    if cost_model is None:
+        cost_model = FileCostModel()
+
+    costs = np.array([cost_model.estimate(f) for f in files])
+    order = np.argsort(-costs, kind="stable")
+    target = costs.sum() / max(1, n_workers * tasks_per_worker)
+
+    batches = []
+    batch_costs = []
+    current = []
+    current_cost = 0.0
+    for i in order:
+        if costs[i] >= target:
+            batches.append([files[i]])
+            batch_costs.append(costs[i])
+            continue
+        current.append(files[i])
+        current_cost += costs[i]
+        if current_cost >= target:
+            batches.append(current)
+            batch_costs.append(current_cost)
+            current = []
+            current_cost = 0.0
+    if current:
+        batches.append(current)
+        batch_costs.append(current_cost)
+
+    batch_order = np.argsort(-np.array(batch_costs), kind="stable")
+    return [batches[i] for i in batch_order]
@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+from dask.utils import parse_bytes
+
+
+class ColumnStore:
+    """
+    List-like store of extracted column datasets that can spill to disk.
+
+    Columns are kept in memory until :meth:`spill` writes them to netCDF
+    files in a scratch directory. Spilled columns are opened lazily as dask
+    arrays when iterating over the store, so :meth:`concat` streams them
+    from disk instead of holding every column in memory next to the
+    concatenated copy. Each spilled file is opened once until it is
+    concatenated, and the number of bytes held in memory is counted as
+    columns are added and spilled.
+
+    Parameters
+    ----------
+    scratch_dir : str or None, optional
+        Directory in which the scratch directory of the store is created.
+        Set to None to use the system temporary directory.
+    """
+
+    def __init__(self, scratch_dir=None):
+        self.scratch_dir = scratch_dir
+        self._items = []
+        self._path = None
+        self._opened = {}
+        self._nbytes = 0
+        self._nspilled = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        for i, item in enumerate(self._items):
+            yield self._load(i, item)
+
+    def append(self, ds):
+        """Add a column dataset (or None for a failed extraction)."""
+        self._items.append(ds)
+        if isinstance(ds, xr.Dataset):
+            self._nbytes += ds.nbytes
+
+    @property
+    def nbytes(self):
+        """Number of bytes of the columns held in memory."""
+        return self._nbytes
+
+    @property
+    def nspilled(self):
+        """Number of columns spilled to disk."""
+        return self._nspilled
+
+    def spill(self):
+        """
+        Write the columns held in memory to the scratch directory.
+
+        Returns
+        -------
+        nbytes : int
+            Number of bytes freed from memory.
+        """
+        if self._path is None:
+            self._path = tempfile.mkdtemp(prefix="radclss_", dir=self.scratch_dir)
+        freed = 0
+        for i, item in enumerate(self._items):
+            if not isinstance(item, xr.Dataset):
+                continue
+            filename = os.path.join(self._path, f"column_{i:06d}.nc")
+            self._items[i] = _write_spill(item, filename)
+            self._nspilled += 1
+            freed += item.nbytes
+        self._nbytes -= freed
+        return freed
+
+    def concat(self, dim="time"):
+        """
+        Concatenate the columns of the store, skipping failed extractions.
+
+        Each spilled column is only read while it is copied into the
+        concatenated dataset, so the assembly holds a single copy of the
+        columns. The spilled files are closed afterwards.
+
+        Parameters
+        ----------
+        dim : str, optional
+            Dimension to concatenate the columns along. Default is 'time'.
+
+        Returns
+        -------
+        ds : xarray Dataset
+            The concatenated columns, held in memory.
+        """
+        try:
+            ds = xr.concat([data for data in self if data], dim=dim)
+            # The variables of the spilled columns are dask arrays, stored a
+            # column at a time into arrays allocated for the whole dataset
+            sources = []
+            targets = []
+            for var in ds.variables.values():
+                if isinstance(var.data, da.Array):
+                    sources.append(var.data)
+                    targets.append(np.empty(var.shape, var.dtype))
+                    var.data = targets[-1]
+            da.store(sources, targets, lock=False, scheduler="synchronous")
+            return ds
+        finally:
+            self._close_opened()
+
+    def close(self):
+        """Close the spilled columns and remove the scratch directory."""
+        self._close_opened()
+        if self._path is not None:
+            shutil.rmtree(self._path, ignore_errors=True)
+            self._path = None
+
+    def _close_opened(self):
+        for ds in self._opened.values():
+            ds.close()
+        self._opened = {}
+
+    def _load(self, i, item):
+        if not isinstance(item, tuple):
+            return item
+        if i in self._opened:
+            return self._opened[i]
+        filename, attrs, var_attrs = item
+        ds = xr.open_dataset(
+            filename, mask_and_scale=False, decode_timedelta=True, chunks={}
+        )
+        ds.attrs = dict(attrs)
+        for var in ds.variables:
+            ds[var].attrs = dict(var_attrs.get(var, {}))
+        self._opened[i] = ds
+        return ds
+
+
+def _write_spill(ds, filename):
+    # The attributes are kept in memory so that the file only holds the
+    # data, which avoids clashes between attributes and the CF encoding
+    var_attrs = {var: dict(ds[var].attrs) for var in ds.variables}
+    out = ds.copy()
+    out.attrs = {}
+    encoding = {}
+    for var in out.variables:
+        out[var].attrs = {}
+        out[var].encoding = {}
+        if out[var].dtype.kind in "fiu":
+            encoding[var] = {"_FillValue": None}
+    out.to_netcdf(filename, encoding=encoding)
+    return (filename, dict(ds.attrs), var_attrs)
+
+
+def enforce_memory_budget(stores, memory_budget):
+    """
+    Spill column stores to disk, largest first, until the columns held in
+    memory fit in the memory budget.
+
+    Parameters
+    ----------
+    stores : list
+        List of :class:`ColumnStore`.
+    memory_budget : int, str or None
+        The memory budget in bytes, or a string such as '8GB'. Set to None
+        to never spill.
+
+    Returns
+    -------
+    nbytes : int
+        Number of bytes spilled to disk.
+    """
+    if memory_budget is None:
+        return 0
+    if isinstance(memory_budget, str):
+        memory_budget = parse_bytes(memory_budget)
+    spilled = 0
+    in_memory = sum(store.nbytes for store in stores)
+    for store in sorted(stores, key=lambda x: x.nbytes, reverse=True):
+        if in_memory <= memory_budget:
+            break
+        freed = store.spill()
+        in_memory -= freed
+        spilled += freed
+    return spilled
@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+import pyart
+import pytest
+import xarray as xr
+
+# Sites within range of the synthetic radar at (36.5, -97.5)
+SYNTHETIC_SITE_DICT = {
+    "M1": (36.55, -97.45, 300),
+    "S2": (36.45, -97.60, 250),
+    "S3": (36.60, -97.50, 280),
+}
+
+
+def make_synthetic_volume(ngates=120, rays_per_sweep=360, elevations=None):
+    """Make a PPI volume with smooth, partially masked fields."""
+    if elevations is None:
+        elevations = [0.5, 1.5, 3.0, 5.0, 8.0, 12.0, 18.0, 25.0]
+    radar = pyart.testing.make_empty_ppi_radar(ngates, rays_per_sweep, len(elevations))
+    radar.range["data"] = np.arange(ngates, dtype="float32") * 150.0 + 75.0
+    radar.range["meters_between_gates"] = 150.0
+    radar.range["meters_to_center_of_first_gate"] = 75.0
+    radar.azimuth["data"] = np.tile(
+        np.arange(rays_per_sweep, dtype="float32") * 360.0 / rays_per_sweep,
+        len(elevations),
+    )
+    radar.elevation["data"] = np.repeat(
+        np.array(elevations, dtype="float32"), rays_per_sweep
+    )
+    radar.fixed_angle["data"] = np.array(elevations, dtype="float32")
+    radar.init_gate_x_y_z()
+    radar.init_gate_altitude()
+
+    rng = np.random.default_rng(42)
+    z = radar.gate_z["data"]
+    x = radar.gate_x["data"]
+    reflectivity = 40.0 - z / 200.0 + 5 * np.sin(x / 3000.0)
+    reflectivity += rng.normal(0, 1, reflectivity.shape)
+    reflectivity = np.ma.masked_less(reflectivity.astype("float32"), 5.0)
+    velocity = np.ma.masked_array(
+        (np.cos(x / 5000.0) * 10 + z / 1000.0).astype("float32")
+    )
+    radar.add_field(
+        "reflectivity",
+        {"data": reflectivity, "units": "dBZ", "_FillValue": -9999.0},
+    )
+    radar.add_field(
+        "velocity",
+        {"data": velocity, "units": "m/s", "_FillValue": -9999.0},
+    )
+    return radar
+
+
+@pytest.fixture
+def synthetic_site_dict():
+    """Sites within range of the synthetic radar."""
+    return dict(SYNTHETIC_SITE_DICT)
+
+
+@pytest.fixture
+def synthetic_volume():
+    """Factory of synthetic PPI volumes, see make_synthetic_volume."""
+    return make_synthetic_volume
+
+
+@pytest.fixture
+def synthetic_radar_file(tmp_path):
+    path = str(tmp_path / "testradar.a1.20250619.120000.nc")
+    pyart.io.write_cfradial(path, make_synthetic_volume())
+    return path
+
+
+@pytest.fixture
+def write_synthetic_volumes(tmp_path):
+    """
+    Factory writing synthetic PPI volumes `interval` minutes apart as
+    CF/Radial files with ARM file names, returning their paths. Each entry
+    of `ngates` is a volume with that number of gates.
+    """
+
+    def write(
+        ngates=(120,),
+        rays_per_sweep=360,
+        noise=0.0,
+        datastream="testradar.a1",
+        start="2025-06-19T12:00:00",
+        interval=5,
+        directory=None,
+    ):
+        directory = tmp_path if directory is None else directory
+        rng = np.random.default_rng(0)
+        files = []
+        for i, n in enumerate(ngates):
+            radar = make_synthetic_volume(ngates=n, rays_per_sweep=rays_per_sweep)
+            if noise:
+                radar.fields["reflectivity"]["data"] += rng.normal(
+                    0, noise, (radar.nrays, n)
+                )
+            volume_time = np.datetime64(start, "s") + np.timedelta64(i * interval, "m")
+            radar.time["units"] = f"seconds since {volume_time}Z"
+            stamp = str(volume_time).replace("-", "").replace(":", "")
+            stamp = stamp.replace("T", ".")
+            path = str(directory / f"{datastream}.{stamp}.nc")
+            pyart.io.write_cfradial(path, radar)
+            files.append(path)
+        return files
+
+    return write
+
+
+@pytest.fixture
+def write_synthetic_insitu():
+    """
+    Factory writing a ground instrument file with a temperature sampled
+    every `interval` minutes from start to stop, named after its datastream.
+    """
+
+    def write(path, start, stop, interval=10):
+        times = np.arange(
+            np.datetime64(start), np.datetime64(stop), np.timedelta64(interval, "m")
+        ).astype("datetime64[ns]")
+        datastream = ".".join(os.path.basename(path).split(".")[:2])
+        ds = xr.Dataset(
+            {"temp_mean": ("time", np.linspace(10, 20, times.size))},
+            coords={"time": times},
+            attrs={"datastream": datastream},
+        )
+        ds.to_netcdf(path)
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def write_empty_radar(tmp_path):
+    """
+    Factory writing a PPI (or RHI) scan with a reflectivity field of ones to
+    a CF/Radial file in tmp_path, returning its path.
+    """
+
+    def write(name, ngates, rays_per_sweep, nsweeps, rhi=False):
+        if rhi:
+            radar = pyart.testing.make_empty_rhi_radar(ngates, rays_per_sweep, nsweeps)
+        else:
+            radar = pyart.testing.make_empty_ppi_radar(ngates, rays_per_sweep, nsweeps)
+        radar.add_field(
+            "reflectivity",
+            {"data": np.ma.ones((radar.nrays, radar.ngates), dtype="float32")},
+        )
+        path = str(tmp_path / name)
+        pyart.io.write_cfradial(path, radar)
+        return path
+
+    return write
@@ -0,0 +1,99 @@
+import numpy as np
+import pyart
+import pytest
+import radclss
+
+
+def test_bin_statistics():
+    edges = radclss.util.get_bin_edges(np.array([500.0, 750.0, 1000.0]))
+    np.testing.assert_allclose(edges, [375.0, 625.0, 875.0, 1125.0])
+
+    positions = np.array([900.0, 400.0, np.nan, 950.0, 2000.0, 600.0])
+    values = np.array(
+        [
+            [1.0, 2.0, 3.0, 5.0, 7.0, np.nan],
+            [1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
+        ]
+    )
+    mean = radclss.util.bin_statistics(values, positions, edges, "mean")
+    np.testing.assert_allclose(mean, [[2.0, np.nan, 3.0], [1.0, np.nan, 1.0]])
+    maximum = radclss.util.bin_statistics(values, positions, edges, "max")
+    np.testing.assert_allclose(maximum, [[2.0, np.nan, 5.0], [1.0, np.nan, 1.0]])
+    count = radclss.util.bin_statistics(values, positions, edges, "count")
+    np.testing.assert_array_equal(count, [[1, 0, 2], [2, 0, 2]])
+
+    with pytest.raises(ValueError):
+        radclss.util.bin_statistics(values, positions, edges, "median")
+
+
+def test_bin_column(synthetic_volume):
+    radar = synthetic_volume()
+    column = pyart.util.columnsect.column_vertical_profile(radar, 36.55, -97.45)
+    height_bins = np.arange(250, 4000, 500)
+    binned = radclss.util.bin_column(column, height_bins, method="max")
+
+    np.testing.assert_array_equal(binned["height"], height_bins)
+    assert binned["height_bin_count"].sum() == column.sizes["height"]
+    for i, height in enumerate(height_bins):
+        in_bin = np.abs(column["height"].values - height) < 250
+        if in_bin.any():
+            assert binned["reflectivity"][i] == column["reflectivity"][in_bin].max()
+            np.testing.assert_allclose(
+                binned["time_offset"][i], column["time_offset"][in_bin].mean()
+            )
+        else:
+            assert np.isnan(binned["reflectivity"][i])
+    assert binned["base_time"] == column["base_time"]
+    assert binned["reflectivity"].attrs == column["reflectivity"].attrs
+
+
+def test_window_statistics():
+    rng = np.random.default_rng(0)
+    positions = np.sort(rng.uniform(0, 100, 400))
+    values = rng.normal(1000.0, 0.1, (2, positions.size))
+    values[0, ::5] = np.nan
+    # Windows overlapping, with a gap, empty and past the samples
+    starts = np.array([-5.0, 10.0, 10.0, 40.0, 40.5, 150.0])
+    stops = np.array([3.0, 20.0, 35.0, 40.5, 40.5, 300.0])
+    statistics = radclss.util.binning.WINDOW_STATISTICS
+    result = radclss.util.window_statistics(
+        values, positions, starts, stops, statistics
+    )
+    assert list(result) == statistics
+
+    reducers = {
+        "mean": np.mean,
+        "sum": np.sum,
+        "min": np.min,
+        "max": np.max,
+        "std": np.std,
+    }
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        in_window = (positions > start) & (positions <= stop)
+        for row in range(values.shape[0]):
+            samples = values[row, in_window]
+            samples = samples[np.isfinite(samples)]
+            assert result["count"][row, i] == samples.size
+            for name, reducer in reducers.items():
+                expected = reducer(samples) if samples.size else np.nan
+                np.testing.assert_allclose(result[name][row, i], expected, rtol=1e-9)
+
+    mean = radclss.util.window_statistics(values, positions, starts, stops)
+    np.testing.assert_array_equal(mean, result["mean"])
+    with pytest.raises(ValueError):
+        radclss.util.window_statistics(values, positions, starts, stops, "median")
+
+
+def test_get_time_windows():
+    times = np.array(
+        ["2025-06-19T00:00", "2025-06-19T00:10", "2025-06-19T00:14"],
+        dtype="datetime64[ns]",
+    )
+    starts, stops = radclss.util.get_time_windows(times, "5Min")
+    np.testing.assert_array_equal(stops, times)
+    np.testing.assert_array_equal(starts, times - np.timedelta64(5, "m"))
+
+    starts, stops = radclss.util.get_time_windows(times)
+    np.testing.assert_array_equal(starts[1:], stops[:-1])
+    assert stops[0] == np.datetime64("2025-06-19T00:05", "ns")
+    assert stops[1] == np.datetime64("2025-06-19T00:12", "ns")
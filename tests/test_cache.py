@@ -0,0 +1,127 @@
+import os
+import time
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from radclss.util import DiskCache, file_fingerprint, make_cache_key
+from radclss.util.column_utils import resample_ground_datasets
+
+
+def _make_dataset(n=100):
+    times = np.arange(n).astype("timedelta64[m]") + np.datetime64(
+        "2025-06-19T00:00", "ns"
+    )
+    return xr.Dataset(
+        {
+            "temp_mean": (
+                "time",
+                np.linspace(10, 20, n),
+                {"units": "degC", "missing_value": -9999.0, "valid_range": [-50, 50]},
+            ),
+            "qc_temp_mean": ("time", np.zeros(n, dtype="int32")),
+        },
+        coords={"time": times, "station": "M1"},
+        attrs={"datastream": "bnfmetM1.b1"},
+    )
+
+
+def test_disk_cache(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"))
+    ds = _make_dataset()
+    key = make_cache_key("met", [1, 2], "mean")
+    assert key == make_cache_key("met", [1, 2], "mean")
+    assert key != make_cache_key("met", [1, 2], "sum")
+    assert cache.get(key) is None
+
+    cache.put(key, ds)
+    assert key in cache
+    cached = cache.get(key)
+    xr.testing.assert_identical(cached, ds)
+    assert cached["qc_temp_mean"].dtype == np.int32
+
+    cache.invalidate(key)
+    assert key not in cache
+    cache.put(key, ds)
+    cache.clear()
+    assert cache.nbytes == 0
+
+
+def test_disk_cache_eviction(tmp_path):
+    ds = _make_dataset()
+    cache = DiskCache(str(tmp_path), max_bytes=None)
+    cache.put("a", ds)
+    entry_bytes = cache.nbytes
+    cache.max_bytes = int(2.5 * entry_bytes)
+    cache.put("b", ds)
+    # Using an entry makes it the most recently used
+    past = time.time() - 10
+    os.utime(os.path.join(tmp_path, "a.nc"), (past, past))
+    os.utime(os.path.join(tmp_path, "b.nc"), (past + 1, past + 1))
+    assert cache.get("a") is not None
+    cache.put("c", ds)
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_file_fingerprint(tmp_path):
+    filename = str(tmp_path / "a.nc")
+    with open(filename, "w") as fi:
+        fi.write("a")
+    fingerprint = file_fingerprint(filename)
+    checksum = file_fingerprint(filename, checksum=True)
+    with open(filename, "w") as fi:
+        fi.write("bb")
+    assert file_fingerprint(filename) != fingerprint
+    assert file_fingerprint(filename, checksum=True) != checksum
+
+
+def test_resample_ground_datasets_cache(tmp_path):
+    import radclss.util.column_utils as column_utils
+
+    filename = str(tmp_path / "bnfmetM1.b1.20250619.000000.nc")
+    _make_dataset(240).drop_vars("station").to_netcdf(filename)
+    cache = DiskCache(str(tmp_path / "cache"))
+
+    def match(radar_times, heights):
+        time = xr.DataArray(radar_times, dims="time", coords={"time": radar_times})
+        height = xr.DataArray(heights, dims="height")
+        return resample_ground_datasets(
+            {"M1": [filename]},
+            time,
+            height,
+            discard=[],
+            resample="mean",
+            cache=cache,
+        )
+
+    radar_times = np.datetime64("2025-06-19T00:03", "ns") + np.arange(0, 200, 7).astype(
+        "timedelta64[m]"
+    )
+    first = match(radar_times, np.arange(500.0, 2000.0, 250.0))
+    assert len(os.listdir(cache.directory)) == 1
+
+    # Other radar times and heights only redo the interpolation
+    def fail(*args, **kwargs):
+        raise AssertionError("the cache was not used")
+
+    original = column_utils._match_ground_datasets
+    column_utils._match_ground_datasets = fail
+    try:
+        second = match(radar_times[::2], np.arange(250.0, 1000.0, 250.0))
+    finally:
+        column_utils._match_ground_datasets = original
+    xr.testing.assert_allclose(second, first.isel(time=slice(None, None, 2)))
+
+    # Changing the file invalidates the entry
+    time.sleep(0.01)
+    _make_dataset(240).drop_vars("station").to_netcdf(filename)
+    os.utime(filename)
+    column_utils._match_ground_datasets = fail
+    try:
+        with pytest.raises(AssertionError):
+            match(radar_times, np.arange(500.0, 2000.0, 250.0))
+    finally:
+        column_utils._match_ground_datasets = original
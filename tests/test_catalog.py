@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+
+from radclss.io import FileCatalog, classify_radar_file, parse_arm_filename
+
+
+def _make_archive(tmp_path, write_synthetic_volumes, write_synthetic_insitu):
+    radar_dir = tmp_path / "bnfcsapr2cmacS3.c1"
+    met_dir = tmp_path / "bnfmetM1.b1"
+    sonde_dir = tmp_path / "bnfsondewnpnM1.b1"
+    for directory in [radar_dir, met_dir, sonde_dir]:
+        directory.mkdir()
+    write_synthetic_volumes(
+        ngates=(120, 120),
+        datastream="bnfcsapr2cmacS3.c1",
+        interval=15,
+        directory=radar_dir,
+    )
+    # The file of the day before crosses midnight
+    write_synthetic_insitu(
+        met_dir / "bnfmetM1.b1.20250618.230000.cdf",
+        "2025-06-18T23:00",
+        "2025-06-19T01:00",
+    )
+    write_synthetic_insitu(
+        met_dir / "bnfmetM1.b1.20250619.010000.cdf",
+        "2025-06-19T01:00",
+        "2025-06-20T00:00",
+    )
+    write_synthetic_insitu(
+        met_dir / "bnfmetM1.b1.20250617.000000.cdf",
+        "2025-06-17T00:00",
+        "2025-06-18T00:00",
+    )
+    write_synthetic_insitu(
+        sonde_dir / "bnfsondewnpnM1.b1.20250618.203000.cdf",
+        "2025-06-18T20:30",
+        "2025-06-18T22:00",
+    )
+    return radar_dir, met_dir, sonde_dir
+
+
+def test_parse_arm_filename():
+    info = parse_arm_filename("/data/bnfcsapr2cmacS3.c1.20250520.000003.nc")
+    assert info["datastream"] == "bnfcsapr2cmacS3.c1"
+    assert info["site"] == "bnf"
+    assert info["instrument"] == "csapr2cmac"
+    assert info["facility"] == "S3"
+    assert info["level"] == "c1"
+    assert info["start_time"] == np.datetime64("2025-05-20T00:00:03")
+    assert parse_arm_filename("bnfmetwxtS13.b1.20250520.000000.nc")["facility"] == (
+        "S13"
+    )
+    assert parse_arm_filename("testradar.nc") is None
+
+
+def test_file_catalog(tmp_path, write_synthetic_volumes, write_synthetic_insitu):
+    radar_dir, met_dir, sonde_dir = _make_archive(
+        tmp_path, write_synthetic_volumes, write_synthetic_insitu
+    )
+    path = str(tmp_path / "catalog.sqlite")
+    with FileCatalog(path) as catalog:
+        for directory in [radar_dir, met_dir, sonde_dir]:
+            catalog.scan(str(directory))
+        assert len(catalog) == 6
+        assert catalog.datastreams() == [
+            "bnfcsapr2cmacS3.c1",
+            "bnfmetM1.b1",
+            "bnfsondewnpnM1.b1",
+        ]
+        radar_files = catalog.files_for_date("bnfcsapr2cmacS3.c1", "20250619")
+        assert [os.path.basename(x) for x in radar_files] == [
+            "bnfcsapr2cmacS3.c1.20250619.120000.nc",
+            "bnfcsapr2cmacS3.c1.20250619.121500.nc",
+        ]
+        header = catalog.header(radar_files[0])
+        assert header["scan_type"] == classify_radar_file(radar_files[0]) == "ppi"
+        assert header["size"] == os.path.getsize(radar_files[0])
+
+        # The met file of the day before crosses midnight
+        met_files = catalog.files_for_date("bnfmet*.b1", "2025-06-19")
+        assert [os.path.basename(x)[12:27] for x in met_files] == [
+            "20250618.230000",
+            "20250619.010000",
+        ]
+        assert catalog.entry(met_files[0])["end_time"] == np.datetime64(
+            "2025-06-19T00:50"
+        )
+
+        # The sonde of the evening before is found with the default margin
+        volumes = catalog.get_volumes(
+            "20250619",
+            {
+                "radar_csapr2": "bnfcsapr2cmacS3.c1",
+                "sonde": "bnfsondewnpnM1.b1",
+                "met_M1": "bnfmetM1.b1",
+            },
+        )
+        assert volumes["date"] == "20250619"
+        assert volumes["radar_csapr2"] == radar_files
+        assert len(volumes["sonde"]) == 1
+        assert volumes["met_M1"] == met_files
+        assert catalog.files_for_date("bnfsondewnpnM1.b1", "20250619") == []
+
+    # Rescanning only reads new and modified files
+    os.remove(met_files[1])
+    write_synthetic_insitu(
+        met_dir / "bnfmetM1.b1.20250618.230000.cdf",
+        "2025-06-18T23:00",
+        "2025-06-19T02:00",
+    )
+    with FileCatalog(path) as catalog:
+        counts = catalog.scan(str(met_dir))
+        assert counts == {"added": 0, "updated": 1, "removed": 1, "unchanged": 1}
+        assert catalog.scan(str(met_dir))["unchanged"] == 2
+        assert catalog.entry(met_files[0])["end_time"] == np.datetime64(
+            "2025-06-19T01:50"
+        )
+        assert met_files[1] not in catalog
+        assert len(catalog) == 5
+
+
+def test_catalog_headers(tmp_path, write_synthetic_volumes, write_synthetic_insitu):
+    from unittest.mock import patch
+
+    import radclss.util.scheduling as scheduling
+    from radclss.core.radclss_core import _filter_radar_files, _set_catalog_headers
+    from radclss.util import FileCostModel
+
+    radar_dir, _, _ = _make_archive(
+        tmp_path, write_synthetic_volumes, write_synthetic_insitu
+    )
+    path = str(tmp_path / "catalog.sqlite")
+    with FileCatalog(path) as catalog:
+        catalog.scan(str(radar_dir))
+        files = catalog.query("bnfcsapr2cmacS3.c1")
+    volumes = {"radar_csapr2": files, "sonde": None}
+    cost_model = FileCostModel()
+    _set_catalog_headers(volumes, cost_model, path)
+
+    # The radar files are not opened to plan the run and skip scans
+    metrics = {"skipped_files": {}, "scan_types": {}}
+    with patch.object(scheduling, "read_radar_header", side_effect=AssertionError):
+        usable = _filter_radar_files(files, cost_model, metrics, "radar_csapr2")
+        assert cost_model.estimate(files[0]) > 0
+    assert usable == files
+    assert metrics["scan_types"]["radar_csapr2"] == {"ppi": 2}
+
+
+def test_catalog_unreadable_header(
+    tmp_path, write_synthetic_volumes, write_synthetic_insitu, caplog
+):
+    from unittest.mock import patch
+
+    import radclss.io.catalog as catalog_module
+
+    radar_dir, _, _ = _make_archive(
+        tmp_path, write_synthetic_volumes, write_synthetic_insitu
+    )
+    with FileCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+        with patch.object(
+            catalog_module, "read_radar_header", side_effect=OSError("corrupt")
+        ):
+            catalog.scan(str(radar_dir))
+        files = catalog.query("bnfcsapr2cmacS3.c1")
+        assert len(files) == 2
+        entry = catalog.entry(files[0])
+        assert entry["scan_type"] is None
+        assert entry["end_time"] is not None
+    assert "Unable to read the radar header" in caplog.text
@@ -0,0 +1,152 @@
+import numpy as np
+import pyart
+import xarray as xr
+
+from unittest.mock import patch
+
+from radclss.util import (
+    DiskCache,
+    get_column_footprints,
+    get_geometry_key,
+    subset_points,
+    subset_points_batch,
+)
+
+
+def test_get_column_footprints(synthetic_volume, synthetic_site_dict):
+    radar = synthetic_volume()
+    footprint = get_column_footprints(radar, synthetic_site_dict)
+    assert footprint["height"].shape == (len(synthetic_site_dict), radar.nsweeps)
+    assert footprint["rays"].size == footprint["gates"].size
+    assert np.all(np.diff(footprint["ray_column"]) >= 0)
+
+    column = pyart.util.columnsect.column_vertical_profile(radar, 36.55, -97.45)
+    np.testing.assert_allclose(
+        np.sort(column["height"].values), np.sort(footprint["height"][0])
+    )
+
+    other = synthetic_volume()
+    assert get_geometry_key(other) == get_geometry_key(radar)
+    assert get_geometry_key(synthetic_volume(ngates=100)) != get_geometry_key(radar)
+
+
+def test_subset_points_batch(tmp_path, synthetic_site_dict, write_synthetic_volumes):
+    files = write_synthetic_volumes(ngates=(120, 120, 100), noise=2.0)
+    height_bins = np.arange(300, 4000, 200)
+    for method in ["interp", "mean"]:
+        columns = xr.concat(
+            [
+                subset_points(
+                    f,
+                    synthetic_site_dict,
+                    height_bins=height_bins,
+                    vertical_method=method,
+                )
+                for f in files
+            ],
+            dim="time",
+        )
+        batched = subset_points_batch(
+            files,
+            synthetic_site_dict,
+            height_bins=height_bins,
+            vertical_method=method,
+        )
+        assert batched.sizes["time"] == len(files)
+        xr.testing.assert_allclose(batched, columns, atol=1e-3)
+        np.testing.assert_array_equal(batched["base_time"], columns["base_time"])
+        assert batched["reflectivity"].attrs == columns["reflectivity"].attrs
+
+    assert (
+        subset_points_batch([str(tmp_path / "missing.nc")], synthetic_site_dict) is None
+    )
+
+
+def test_subset_points_cache(tmp_path, synthetic_site_dict, write_synthetic_volumes):
+    import radclss.util.column_utils as column_utils
+
+    files = write_synthetic_volumes(ngates=(120, 120, 100), noise=2.0)
+    cache = DiskCache(str(tmp_path / "cache"))
+    height_bins = np.arange(300, 4000, 200)
+    columns = subset_points(
+        files[0], synthetic_site_dict, height_bins=height_bins, cache=cache
+    )
+    assert len(cache._entries()) == 1
+
+    # Cache hits do not read the radar file
+    with patch.object(column_utils, "_read_column_radar", side_effect=AssertionError):
+        cached = subset_points(
+            files[0], synthetic_site_dict, height_bins=height_bins, cache=cache
+        )
+    xr.testing.assert_identical(cached, columns)
+
+    # Other height bins are another entry
+    subset_points(
+        files[0], synthetic_site_dict, height_bins=height_bins[:-1], cache=cache
+    )
+    assert len(cache._entries()) == 2
+
+    # The batch only reads the files missing from the cache and caches them
+    batched = subset_points_batch(
+        files, synthetic_site_dict, height_bins=height_bins, cache=cache
+    )
+    assert batched.sizes["time"] == len(files)
+    assert len(cache._entries()) == 4
+    with patch.object(column_utils, "_read_column_radar", side_effect=AssertionError):
+        cached = subset_points_batch(
+            files, synthetic_site_dict, height_bins=height_bins, cache=cache
+        )
+    xr.testing.assert_identical(cached.sortby("time"), batched.sortby("time"))
+
+
+def test_subset_points_cache_layout(
+    tmp_path, synthetic_site_dict, write_synthetic_volumes
+):
+    import radclss.util.column_utils as column_utils
+
+    files = write_synthetic_volumes(ngates=(120, 120), noise=2.0)
+    height_bins = np.arange(300, 4000, 200)
+    columns = subset_points(files[0], synthetic_site_dict, height_bins=height_bins)
+
+    # Columns cached by a batch are read back like those of subset_points
+    cache = DiskCache(str(tmp_path / "batch"))
+    subset_points_batch(
+        files, synthetic_site_dict, height_bins=height_bins, cache=cache
+    )
+    with patch.object(column_utils, "_read_column_radar", side_effect=AssertionError):
+        cached = subset_points(
+            files[0], synthetic_site_dict, height_bins=height_bins, cache=cache
+        )
+    assert cached.sizes == columns.sizes
+    xr.testing.assert_allclose(cached, columns, atol=1e-3)
+
+    # Columns cached by subset_points are stacked along time by a batch
+    cache = DiskCache(str(tmp_path / "single"))
+    for f in files:
+        subset_points(f, synthetic_site_dict, height_bins=height_bins, cache=cache)
+    with patch.object(column_utils, "_read_column_radar", side_effect=AssertionError):
+        cached = subset_points_batch(
+            files[:1], synthetic_site_dict, height_bins=height_bins, cache=cache
+        )
+    assert cached.sizes["time"] == 1
+    xr.testing.assert_allclose(cached.isel(time=0), columns, atol=1e-3)
+
+
+def test_footprint_extraction(synthetic_radar_file, synthetic_site_dict):
+    for method in ["interp", "mean", "max"]:
+        expected = subset_points(
+            synthetic_radar_file,
+            synthetic_site_dict,
+            vertical_method=method,
+            extraction="pyart",
+        )
+        result = subset_points(
+            synthetic_radar_file,
+            synthetic_site_dict,
+            vertical_method=method,
+            extraction="footprint",
+        )
+        for var in ["reflectivity", "velocity"]:
+            np.testing.assert_allclose(
+                result[var].values, expected[var].values, equal_nan=True
+            )
@@ -1,7 +1,19 @@
 import numpy as np
+import pytest
 import xarray as xr
 from unittest.mock import patch, MagicMock
-from radclss.util.column_utils import get_nexrad_column
+from radclss.util.column_utils import (
+    get_fill_values,
+    get_nexrad_column,
+    get_site_coverage,
+    get_site_gate_selection,
+    match_datasets_act,
+    merge_matched_dataset,
+    prepare_ground_datasets,
+    resample_ground_dataset,
+    resample_ground_datasets,
+    subset_points,
+)
 
 
 def test_get_nexrad_column():
@@ -73,13 +85,15 @@ def test_get_nexrad_column():
             ) as mock_cvp:
                 mock_cvp.return_value = mock_column
 
-                # Call the function
+                # Call the function. The mock radar has no geometry to
+                # check the site coverage with.
                 result = get_nexrad_column(
                     rad_time=rad_time,
                     site=site,
                     input_site_dict=input_site_dict,
                     height_bins=height_bins,
                     nexrad_radar=nexrad_radar,
+                    check_coverage=False,
                 )
 
     # Assertions
@@ -155,3 +169,578 @@ def test_get_nexrad_column_integration():
     assert "height" in result.dims
     assert result.dims["station"] == len(input_site_dict)
     assert "reflectivity" in result.data_vars
+
+
+def test_subset_points_xradar_backend(synthetic_radar_file, synthetic_site_dict):
+    height_bins = np.arange(500, 3000, 250)
+    columns = subset_points(
+        synthetic_radar_file, synthetic_site_dict, height_bins=height_bins
+    )
+    lazy_columns = subset_points(
+        synthetic_radar_file,
+        synthetic_site_dict,
+        height_bins=height_bins,
+        backend="xradar",
+        file_format="cfradial1",
+    )
+    assert list(lazy_columns["station"].values) == list(synthetic_site_dict)
+    for field in ["reflectivity", "velocity"]:
+        assert np.isfinite(columns[field]).any()
+        xr.testing.assert_allclose(lazy_columns[field], columns[field])
+
+
+def test_subset_points_prune_gates(
+    synthetic_radar_file, synthetic_volume, synthetic_site_dict
+):
+    height_bins = np.arange(500, 1500, 250)
+    radar = synthetic_volume()
+    sweeps, rays, gates = get_site_gate_selection(
+        radar, synthetic_site_dict, height_bins=height_bins
+    )
+    assert 0 < len(sweeps) < radar.nsweeps
+    assert gates.stop - gates.start < radar.ngates
+    assert all(len(r) < radar.rays_per_sweep["data"][0] for r in rays)
+
+    for backend in ["pyart", "xradar"]:
+        columns = subset_points(
+            synthetic_radar_file,
+            synthetic_site_dict,
+            height_bins=height_bins,
+            backend=backend,
+            prune_gates=False,
+        )
+        pruned = subset_points(
+            synthetic_radar_file,
+            synthetic_site_dict,
+            height_bins=height_bins,
+            backend=backend,
+        )
+        xr.testing.assert_identical(pruned, columns)
+
+
+def test_get_site_coverage(synthetic_radar_file, synthetic_volume, synthetic_site_dict):
+    # Add a site beyond the maximum range and one in the blind zone
+    input_site_dict = {
+        "far": (37.5, -97.5, 300),
+        **synthetic_site_dict,
+        "near": (36.5002, -97.5, 300),
+    }
+    height_bins = np.arange(500, 3000, 250)
+    radar = synthetic_volume()
+    covered = get_site_coverage(radar, input_site_dict, height_bins=height_bins)
+    assert list(covered) == [False, True, True, True, False]
+    assert not get_site_coverage(
+        radar, input_site_dict, height_bins=np.arange(6000, 8000, 250)
+    ).any()
+
+    columns = subset_points(
+        synthetic_radar_file,
+        input_site_dict,
+        height_bins=height_bins,
+        prune_gates=False,
+        check_coverage=False,
+    )
+    checked = subset_points(
+        synthetic_radar_file, input_site_dict, height_bins=height_bins
+    )
+    assert list(checked["station"].values) == list(input_site_dict)
+    assert checked["reflectivity"].isel(station=0).isnull().all()
+    xr.testing.assert_identical(checked, columns)
+
+
+def test_subset_points_vertical_method(synthetic_radar_file, synthetic_site_dict):
+    height_bins = np.arange(250, 4000, 500)
+    columns = {
+        method: subset_points(
+            synthetic_radar_file,
+            synthetic_site_dict,
+            height_bins=height_bins,
+            vertical_method=method,
+        )
+        for method in ["interp", "mean", "max"]
+    }
+    assert "height_bin_count" not in columns["interp"]
+    assert columns["mean"]["height_bin_count"].sum() > 0
+    both = np.isfinite(columns["max"]["reflectivity"]) & np.isfinite(
+        columns["mean"]["reflectivity"]
+    )
+    assert both.any()
+    assert (
+        columns["max"]["reflectivity"].where(both)
+        >= columns["mean"]["reflectivity"].where(both) - 1e-9
+    ).sum() == both.sum()
+    valid = columns["mean"]["height_bin_count"] > 0
+    assert np.isfinite(columns["mean"]["velocity"].where(valid)).sum() == valid.sum()
+    assert columns["mean"]["gate_time"].dtype == columns["interp"]["gate_time"].dtype
+
+
+def test_subset_points_n_threads(synthetic_radar_file, synthetic_site_dict):
+    for extraction in ["footprint", "pyart"]:
+        serial = subset_points(
+            synthetic_radar_file, synthetic_site_dict, extraction=extraction
+        )
+        threaded = subset_points(
+            synthetic_radar_file,
+            synthetic_site_dict,
+            extraction=extraction,
+            n_threads=3,
+        )
+        xr.testing.assert_identical(serial, threaded)
+
+
+def test_resample_ground_dataset():
+    """
+    The split read/resample and merge steps give the same columns as
+    match_datasets_act.
+    """
+    times = np.arange(
+        np.datetime64("2025-06-19T00:00"),
+        np.datetime64("2025-06-19T02:00"),
+        np.timedelta64(1, "m"),
+    ).astype("datetime64[ns]")
+    radar_times = times[::7][1:-1]
+    height = np.arange(500, 2000, 250)
+
+    def make_column():
+        column = xr.Dataset(
+            {
+                "rh_mean": (
+                    ("time", "station"),
+                    np.full((radar_times.size, 2), -9999.0),
+                    {"missing_value": -9999.0},
+                ),
+            },
+            coords={
+                "time": radar_times,
+                "height": height,
+                "station": ["M1", "S4"],
+            },
+        )
+        return column
+
+    def make_ground():
+        ground = xr.Dataset(
+            {
+                "rh_mean": ("time", np.linspace(50, 90, times.size)),
+                "base_time": ((), 0),
+                "lat": ((), 34.3),
+            },
+            coords={"time": times},
+            attrs={"datastream": "bnfmetM1.b1"},
+        )
+        return ground
+
+    expected = match_datasets_act(
+        make_column(),
+        make_ground(),
+        "M1",
+        discard=[],
+        resample="mean",
+        DataSet=True,
+    )
+    column = make_column()
+    matched = resample_ground_dataset(
+        make_ground(),
+        column["time"],
+        column["height"],
+        "M1",
+        discard=[],
+        resample="mean",
+        DataSet=True,
+    )
+    assert matched.sizes["station"] == 1
+    assert "lat" not in matched.data_vars
+    assert matched["rh_mean"].attrs["source"] == "bnfmetM1.b1"
+    result = merge_matched_dataset(column, matched, "M1")
+    xr.testing.assert_identical(result, expected)
+    assert (result["rh_mean"].sel(station="S4") == -9999.0).all()
+    assert (result["rh_mean"].sel(station="M1") != -9999.0).all()
+
+
+def test_resample_ground_datasets():
+    """
+    Matching the sites of an instrument at once gives the same columns as
+    matching each site on its own, including sites with other times and
+    missing variables.
+    """
+    times = np.arange(
+        np.datetime64("2025-06-19T00:00"),
+        np.datetime64("2025-06-19T03:00"),
+        np.timedelta64(1, "m"),
+    ).astype("datetime64[ns]")
+    radar_times = times[3::7]
+    sites = ["M1", "S20", "S30"]
+
+    def make_column():
+        return xr.Dataset(
+            {
+                var: (
+                    ("time", "station"),
+                    np.full((radar_times.size, len(sites)), -9999.0),
+                    {"missing_value": -9999.0},
+                )
+                for var in ["rh_mean", "rain"]
+            },
+            coords={
+                "time": radar_times,
+                "height": np.arange(500, 2000, 250),
+                "station": sites,
+            },
+        )
+
+    rng = np.random.default_rng(0)
+    grounds = {}
+    for site, start, stop in [("M1", 0, 180), ("S20", 31, 130), ("S30", 0, 179)]:
+        ground = xr.Dataset(
+            {"rh_mean": ("time", rng.uniform(40, 90, stop - start))},
+            coords={"time": times[start:stop]},
+            attrs={"datastream": f"bnfmet{site}.b1"},
+        )
+        if site != "S20":
+            ground["rain"] = ("time", rng.exponential(size=stop - start))
+        grounds[site] = ground
+
+    for resample in ["mean", "sum", "skip"]:
+        expected = make_column()
+        for site, ground in grounds.items():
+            matched = resample_ground_dataset(
+                ground.copy(),
+                expected["time"],
+                expected["height"],
+                site,
+                discard=[],
+                resample=resample,
+                DataSet=True,
+            )
+            expected = merge_matched_dataset(expected, matched, site)
+
+        column = make_column()
+        matched = resample_ground_datasets(
+            {site: ground.copy() for site, ground in grounds.items()},
+            column["time"],
+            column["height"],
+            discard=[],
+            resample=resample,
+            DataSet=True,
+        )
+        assert list(matched["station"].values) == sites
+        result = merge_matched_dataset(column, matched)
+        xr.testing.assert_allclose(result, expected)
+        # S20 has no rain
+        assert (result["rain"].sel(station="S20") == -9999.0).all()
+
+
+def test_resample_ground_datasets_binned():
+    """
+    Binned matching reduces the samples in the window before each radar time.
+    """
+    times = np.arange(
+        np.datetime64("2025-06-19T00:00"),
+        np.datetime64("2025-06-19T01:00"),
+        np.timedelta64(1, "m"),
+    ).astype("datetime64[ns]")
+    radar_times = times[10::12]
+    column = xr.Dataset(
+        coords={"time": radar_times, "height": np.arange(500, 2000, 250)}
+    )
+    rain = np.arange(times.size, dtype="float64")
+    ground = xr.Dataset(
+        {"rain": ("time", rain, {"units": "mm"})},
+        coords={"time": times},
+        attrs={"datastream": "bnfpluvioM1.b1"},
+    )
+
+    matched = resample_ground_datasets(
+        {"M1": ground},
+        column["time"],
+        column["height"],
+        discard=[],
+        resample="sum",
+        DataSet=True,
+        binned=True,
+    )
+    # The 5 minute window before each radar time holds 5 samples
+    expected = [rain[i - 4 : i + 1].sum() for i in range(10, times.size, 12)]
+    np.testing.assert_allclose(matched["rain"].sel(station="M1"), expected)
+    assert matched["rain"].attrs["units"] == "mm"
+
+    matched = resample_ground_datasets(
+        {"M1": ground.copy()},
+        column["time"],
+        column["height"],
+        discard=[],
+        resample=["mean", "count"],
+        resample_time=None,
+        DataSet=True,
+        binned=True,
+    )
+    # Windows halfway between the radar times cover every sample after the
+    # start of the first window once
+    np.testing.assert_array_equal(
+        matched["rain_count"].sel(station="M1"), [12] * 4 + [7]
+    )
+    np.testing.assert_allclose(matched["rain_mean"].sel(station="M1")[0], 10.5)
+
+
+def test_resample_ground_datasets_time_slice():
+    """
+    Only loading the samples around the radar times does not change the
+    matched data.
+    """
+    import radclss.util.column_utils as column_utils
+
+    times = np.arange(
+        np.datetime64("2025-06-19T00:00"),
+        np.datetime64("2025-06-20T00:00"),
+        np.timedelta64(20, "s"),
+    ).astype("datetime64[ns]")
+    radar_times = np.arange(
+        np.datetime64("2025-06-19T10:02"),
+        np.datetime64("2025-06-19T12:00"),
+        np.timedelta64(6, "m"),
+    ).astype("datetime64[ns]")
+    rng = np.random.default_rng(0)
+    ground = xr.Dataset(
+        {"rh_mean": ("time", rng.uniform(40, 90, times.size))},
+        coords={"time": times},
+        attrs={"datastream": "bnfwxtM1.b1"},
+    )
+    time = xr.DataArray(radar_times, dims="time", coords={"time": radar_times})
+    height = xr.DataArray(np.arange(500.0, 2000.0, 250.0), dims="height")
+
+    def match(resample, binned):
+        return resample_ground_datasets(
+            {"M1": ground.copy()},
+            time,
+            height,
+            discard=[],
+            resample=resample,
+            DataSet=True,
+            binned=binned,
+        )
+
+    cases = [("mean", False), ("sum", False), ("skip", False), ("sum", True)]
+    sliced = [match(*case) for case in cases]
+    with patch.object(column_utils, "_slice_time", lambda ds, time_range: ds):
+        full = [match(*case) for case in cases]
+    for a, b in zip(sliced, full):
+        xr.testing.assert_allclose(a, b)
+    sliced_ds = column_utils._slice_time(ground, (radar_times[0], radar_times[-1]))
+    assert sliced_ds.sizes["time"] < 400
+
+
+def test_prepare_ground_datasets():
+    """
+    The resampled grid prepared before the radar times are known gives the
+    matched data once interpolated to the radar times.
+    """
+    times = np.arange(
+        np.datetime64("2025-06-19T00:00"),
+        np.datetime64("2025-06-19T06:00"),
+        np.timedelta64(30, "s"),
+    ).astype("datetime64[ns]")
+    radar_times = times[200:600:13]
+    rng = np.random.default_rng(1)
+    grounds = {
+        site: xr.Dataset(
+            {"rh_mean": ("time", rng.uniform(40, 90, times.size))},
+            coords={"time": times},
+            attrs={"datastream": f"bnfmet{site}.b1"},
+        )
+        for site in ["M1", "S20"]
+    }
+    time = xr.DataArray(radar_times, dims="time", coords={"time": radar_times})
+    height = xr.DataArray(np.arange(500.0, 2000.0, 250.0), dims="height")
+
+    for resample in ["mean", "sum"]:
+        grid = prepare_ground_datasets(
+            {site: ground.copy() for site, ground in grounds.items()},
+            height,
+            discard=[],
+            resample=resample,
+            DataSet=True,
+        )
+        # The grid covers the whole day, not only the radar times
+        assert grid.sizes["time"] == 73
+        matched = resample_ground_datasets(
+            {site: ground.copy() for site, ground in grounds.items()},
+            time,
+            height,
+            discard=[],
+            resample=resample,
+            DataSet=True,
+        )
+        xr.testing.assert_allclose(grid.interp(time=time, method="linear"), matched)
+
+    with pytest.raises(ValueError):
+        prepare_ground_datasets(grounds, height, [], resample="skip", DataSet=True)
+
+
+def test_merge_matched_dataset_in_place():
+    """
+    The matched values are written into the arrays of the column, with the
+    fill value of each written variable replacing its NaNs, including those
+    of the stations that are not written.
+    """
+    times = np.array(["2025-06-19T00:00", "2025-06-19T00:10"], dtype="datetime64[ns]")
+    column = xr.Dataset(
+        {
+            "rh_mean": (
+                ("time", "station"),
+                np.full((2, 3), -9999.0),
+                {"_FillValue": "-9999", "missing_value": -9998.0},
+            ),
+            "count": (("time", "station"), np.zeros((2, 3), dtype="int32")),
+        },
+        coords={"time": times, "station": ["M1", "S20", "S30"]},
+    )
+    fill_values = get_fill_values(column)
+    assert fill_values == {"rh_mean": -9999.0, "count": None}
+    assert column["rh_mean"].attrs["_FillValue"] == -9999.0
+
+    matched = xr.Dataset(
+        {
+            "rh_mean": (("station", "time"), [[50.0, np.nan], [60.0, 61.0]]),
+            "count": (("station", "time"), [[1, 2], [3, 4]]),
+            "other": (("station", "time"), np.ones((2, 2))),
+        },
+        coords={"station": ["S30", "M1"], "time": times},
+    )
+    column["rh_mean"][:, 1] = np.nan
+    buffer = column["rh_mean"].values
+    result = merge_matched_dataset(column, matched, fill_values=fill_values)
+    assert result["rh_mean"].values is buffer
+    np.testing.assert_array_equal(
+        result["rh_mean"], [[60.0, -9999.0, 50.0], [61.0, -9999.0, -9999.0]]
+    )
+    np.testing.assert_array_equal(result["count"], [[3, 0, 1], [4, 0, 2]])
+    assert result["count"].dtype == np.int32
+    assert "other" not in result
+
+
+def test_resample_ground_datasets_binned_profiler(tmp_path):
+    """
+    Profiling instruments are reduced over the radar windows and then
+    averaged into the height bins, one chunk of samples at a time.
+    """
+    times = np.arange(
+        np.datetime64("2025-06-19T00:00"),
+        np.datetime64("2025-06-19T02:00"),
+        np.timedelta64(4, "s"),
+    ).astype("datetime64[ns]")
+    gates = np.arange(100.0, 3000.0, 30.0)
+    rng = np.random.default_rng(0)
+    reflectivity = rng.normal(size=(times.size, gates.size))
+    reflectivity[::3, 5] = np.nan
+    ground = xr.Dataset(
+        {
+            "reflectivity": (("time", "range"), reflectivity, {"units": "dBZ"}),
+            "height": ("range", gates + 10.0),
+            "base_time": ((), 0),
+        },
+        coords={"time": times, "range": gates},
+        attrs={"datastream": "bnfkazr2M1.a1"},
+    )
+    filename = str(tmp_path / "bnfkazr2M1.a1.20250619.000000.nc")
+    ground.to_netcdf(filename)
+
+    radar_times = times[300::150]
+    column = xr.Dataset(
+        coords={"time": radar_times, "height": np.arange(500.0, 2000.0, 250.0)}
+    )
+
+    def match(chunk_size):
+        return resample_ground_datasets(
+            {"M1": filename},
+            column["time"],
+            column["height"],
+            discard=[],
+            resample="mean",
+            prefix="kazr2_",
+            binned=True,
+            chunk_size=chunk_size,
+        )
+
+    matched = match(4096)
+    assert matched["kazr2_reflectivity"].sizes == {
+        "station": 1,
+        "time": radar_times.size,
+        "height": column.sizes["height"],
+    }
+    xr.testing.assert_allclose(match(200), matched)
+
+    # Mean over the 5 minutes before the radar time, then over the gates in
+    # the 250 m around the height bin
+    in_window = (times > radar_times[2] - np.timedelta64(5, "m")) & (
+        times <= radar_times[2]
+    )
+    in_bin = np.abs(gates - 1000.0) < 125.0
+    expected = np.nanmean(reflectivity[in_window], axis=0)[in_bin].mean()
+    np.testing.assert_allclose(
+        matched["kazr2_reflectivity"].sel(station="M1", height=1000.0)[2], expected
+    )
+
+
+def test_resample_ground_datasets_keep_variables(tmp_path):
+    """
+    The read allowlist of a profiling instrument keeps its coordinates and
+    the quality control of the kept variables.
+    """
+    times = np.arange(
+        np.datetime64("2025-06-19T00:00"),
+        np.datetime64("2025-06-19T01:00"),
+        np.timedelta64(60, "s"),
+    ).astype("datetime64[ns]")
+    gates = np.arange(100.0, 3000.0, 30.0)
+    shape = (times.size, gates.size)
+    ground = xr.Dataset(
+        {
+            "reflectivity": (
+                ("time", "range"),
+                np.full(shape, 10.0),
+                {"units": "dBZ", "ancillary_variables": "qc_reflectivity"},
+            ),
+            "qc_reflectivity": (
+                ("time", "range"),
+                np.zeros(shape, "int32"),
+                {
+                    "long_name": "Quality check results on variable: reflectivity",
+                    "units": "1",
+                    "flag_masks": [1],
+                    "flag_meanings": ["Value is missing"],
+                    "flag_assessments": ["Bad"],
+                },
+            ),
+            "snr": (("time", "range"), np.ones(shape)),
+            "height": ("range", gates + 10.0),
+            "base_time": ((), 0),
+        },
+        coords={"time": times, "range": gates},
+        attrs={"datastream": "bnfkazr2M1.a1"},
+    )
+    filename = str(tmp_path / "bnfkazr2M1.a1.20250619.000000.nc")
+    ground.to_netcdf(filename)
+    column = xr.Dataset(
+        coords={
+            "time": times[10::10],
+            "height": np.arange(500.0, 2000.0, 250.0),
+        }
+    )
+
+    matched = resample_ground_datasets(
+        {"M1": filename},
+        column["time"],
+        column["height"],
+        discard=[],
+        resample="mean",
+        prefix="kazr2_",
+        keep_variables=["reflectivity"],
+    )
+    assert matched["kazr2_reflectivity"].sizes == {
+        "station": 1,
+        "time": column.sizes["time"],
+        "height": column.sizes["height"],
+    }
+    np.testing.assert_allclose(matched["kazr2_reflectivity"], 10.0)
+    assert "kazr2_qc_reflectivity" in matched
+    assert "kazr2_snr" not in matched
@@ -0,0 +1,100 @@
+import json
+
+import numpy as np
+import xarray as xr
+
+from radclss.util.dod_utils import (
+    get_dod_variables,
+    get_datastream_prefix,
+    get_read_allowlist,
+    get_dod_encoding,
+    pack_variables,
+    unpack_variables,
+)
+
+
+def _write_dod(path):
+    variables = [
+        {"name": name, "type": "float", "dims": ["time"], "atts": []}
+        for name in [
+            "time",
+            "lat",
+            "csapr2_reflectivity",
+            "csapr2_corrected_reflectivity",
+            "sonde_tdry",
+            "ldquants_rain_rate",
+            "temp_mean",
+        ]
+    ]
+    with open(path, "w") as fi:
+        json.dump({"versions": {"1.0": {"vars": variables}}}, fi)
+    return path
+
+
+def test_get_datastream_prefix():
+    assert get_datastream_prefix("radar_csapr2") == "csapr2_"
+    assert get_datastream_prefix("sonde") == "sonde_"
+    assert get_datastream_prefix("ld_S30") == "ldquants_"
+    assert get_datastream_prefix("met_M1") is None
+
+
+def test_get_read_allowlist(tmp_path):
+    dod_file = _write_dod(str(tmp_path / "dod.json"))
+    dod_variables = get_dod_variables(dod_file, "1.0", local_file=True)
+
+    assert get_read_allowlist(dod_variables, "radar_csapr2") == [
+        "reflectivity",
+        "corrected_reflectivity",
+    ]
+    assert get_read_allowlist(dod_variables, "sonde", required=["alt"]) == [
+        "tdry",
+        "alt",
+    ]
+    assert get_read_allowlist(dod_variables, "ld_M1") == ["rain_rate"]
+    # The unprefixed datastreams leave out the variables of the prefixed
+    # datastreams and the output coordinates
+    assert get_read_allowlist(dod_variables, "met_S20") == ["temp_mean"]
+    # No DOD variables for this radar, so it should be read in full
+    assert get_read_allowlist(dod_variables, "radar_kasacr") is None
+
+
+def test_pack_variables():
+    dod_variables = [
+        {"name": "csapr2_reflectivity", "type": "float", "dims": [], "atts": []},
+        {
+            "name": "csapr2_velocity",
+            "type": "short",
+            "dims": [],
+            "atts": [
+                {"name": "scale_factor", "type": "float", "value": 0.01},
+                {"name": "_FillValue", "type": "short", "value": -9999},
+            ],
+        },
+        {"name": "sonde_tdry", "type": "double", "dims": [], "atts": []},
+        {"name": "station", "type": "char", "dims": [], "atts": []},
+    ]
+    encoding = get_dod_encoding(dod_variables, "radar_csapr2")
+    assert set(encoding) == {"reflectivity", "velocity", "sonde_tdry"}
+    assert encoding["velocity"]["_FillValue"] == -9999
+    assert "csapr2_velocity" in get_dod_encoding(dod_variables)
+
+    ds = xr.Dataset(
+        {
+            "reflectivity": ("height", np.array([10.123456789, np.nan])),
+            "velocity": ("height", np.array([-3.14159, np.nan])),
+            "sonde_tdry": ("height", np.array([20.5, 21.5])),
+            "time_offset": ("height", np.array([1.0, 2.0])),
+        }
+    )
+    packed = pack_variables(ds.copy(), encoding)
+    assert packed["reflectivity"].dtype == "float32"
+    assert packed["velocity"].dtype == "int16"
+    assert packed["velocity"].values.tolist() == [-314, -9999]
+    assert packed["sonde_tdry"].dtype == "float64"
+    assert packed["time_offset"].dtype == "float64"
+
+    unpacked = unpack_variables(packed, encoding)
+    np.testing.assert_allclose(unpacked["velocity"].values, [-3.14, np.nan])
+    np.testing.assert_allclose(
+        unpacked["reflectivity"].values, ds["reflectivity"].values, rtol=1e-7
+    )
@@ -0,0 +1,66 @@
+import io
+import json
+
+import pytest
+
+from radclss.util import JSONLinesWriter, ProgressBar, ProgressEvent, ProgressTracker
+
+
+def test_progress_tracker():
+    events = []
+    tracker = ProgressTracker(events.append)
+    tracker.stage_started("radar_extraction", total=3, key="radar_csapr2")
+    tracker.task_started("radar_extraction", "a.nc", key="radar_csapr2")
+    tracker.task_finished(
+        "radar_extraction", "a.nc", key="radar_csapr2", elapsed=1.0, nbytes=100
+    )
+    tracker.task_finished(
+        "radar_extraction", "b.nc", key="radar_csapr2", nbytes=50, count=1
+    )
+    tracker.task_failed("radar_extraction", "c.nc", key="radar_csapr2", error="bad")
+    tracker.stage_finished("radar_extraction", key="radar_csapr2")
+
+    kinds = [event.kind for event in events]
+    assert kinds == [
+        "stage_started",
+        "task_started",
+        "task_finished",
+        "bytes_read",
+        "throughput",
+        "task_finished",
+        "bytes_read",
+        "throughput",
+        "task_failed",
+        "stage_finished",
+    ]
+    assert events[3].total_nbytes == 100
+    assert events[7].done == 2
+    assert events[7].eta is not None
+    assert events[8].error == "bad"
+    assert events[-1].done == 2
+    assert events[-1].failed == 1
+    assert events[-1].nbytes == 150
+
+    with pytest.raises(ValueError):
+        ProgressEvent("unknown", "nexrad")
+
+
+def test_progress_consumers(tmp_path):
+    stream = io.StringIO()
+    filename = str(tmp_path / "events.jsonl")
+    tracker = ProgressTracker([ProgressBar(stream=stream), JSONLinesWriter(filename)])
+    tracker.stage_started("nexrad", total=2)
+    tracker.task_finished("nexrad", "2025-06-19T12:00:00")
+    tracker.stage_finished("nexrad")
+
+    assert "nexrad [" in stream.getvalue()
+    assert "nexrad finished: 1 done, 0 failed" in stream.getvalue()
+    with open(filename) as fi:
+        lines = [json.loads(line) for line in fi]
+    assert [line["kind"] for line in lines] == [
+        "stage_started",
+        "task_finished",
+        "throughput",
+        "stage_finished",
+    ]
+    assert lines[1]["task"] == "2025-06-19T12:00:00"
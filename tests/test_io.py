@@ -1,4 +1,6 @@
+import os
 import radclss
+import numpy as np
 import xarray as xr
 import arm_test_data
 
@@ -15,3 +17,58 @@ def test_write():
     for var in ds.data_vars:
         assert ds_out[var].dtype == ds[var].dtype
     ds_out.close()
+
+
+def test_read_radar_header(tmp_path, write_empty_radar):
+    path = write_empty_radar("ppi.nc", 50, 36, 3)
+    header = radclss.io.read_radar_header(path)
+    assert header["nrays"] == 108
+    assert header["ngates"] == 50
+    assert header["nsweeps"] == 3
+    assert header["nfields"] == 1
+    assert header["size"] == os.path.getsize(path)
+    assert len(header["sweep_mode"]) == 3
+    np.testing.assert_array_equal(header["sweep_start_ray_index"], [0, 36, 72])
+
+
+def test_classify_radar_file(tmp_path, write_empty_radar):
+    ppi = write_empty_radar("ppi.nc", 50, 36, 3)
+    single = write_empty_radar("single.nc", 50, 36, 1)
+    rhi = write_empty_radar("rhi.nc", 50, 20, 2, rhi=True)
+    empty = write_empty_radar("empty.nc", 0, 36, 1)
+    assert radclss.io.classify_radar_file(ppi) == "ppi"
+    assert radclss.io.classify_radar_file(single) == "single_sweep"
+    assert radclss.io.classify_radar_file(rhi) == "rhi"
+    assert radclss.io.classify_radar_file(empty) == "empty"
+
+
+def test_read_radar_xradar(synthetic_radar_file):
+    radar = radclss.io.read_radar(synthetic_radar_file)
+    lazy = radclss.io.read_radar(
+        synthetic_radar_file, backend="xradar", file_format="cfradial1"
+    )
+    assert lazy.nrays == radar.nrays
+    assert lazy.nsweeps == radar.nsweeps
+    np.testing.assert_allclose(lazy.time["data"], radar.time["data"])
+    np.testing.assert_allclose(lazy.azimuth["data"], radar.azimuth["data"])
+    np.testing.assert_allclose(lazy.elevation["data"], radar.elevation["data"])
+    for field in radar.fields:
+        assert np.ma.allequal(lazy.fields[field]["data"], radar.fields[field]["data"])
+        np.testing.assert_array_equal(
+            np.ma.getmaskarray(lazy.fields[field]["data"]),
+            np.ma.getmaskarray(radar.fields[field]["data"]),
+        )
+
+    # Only the requested sweeps and fields are loaded
+    subset = radclss.io.read_radar(
+        synthetic_radar_file,
+        backend="xradar",
+        include_fields=["velocity"],
+        sweeps=[1, 2],
+    )
+    assert list(subset.fields.keys()) == ["velocity"]
+    assert subset.nsweeps == 2
+    np.testing.assert_allclose(
+        subset.fields["velocity"]["data"],
+        radar.fields["velocity"]["data"][radar.get_start(1) : radar.get_end(2) + 1],
+    )
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from radclss.util import group_mean, interp_rows
+
+
+def test_group_mean():
+    values = np.array([[1.0, 3.0, np.nan, 4.0, np.nan], [2.0, 2.0, 5.0, 7.0, 1.0]])
+    groups = np.array([0, 0, 1, 1, 3])
+    result = group_mean(values, groups, 4, use_numba=False)
+    np.testing.assert_allclose(
+        result, [[2.0, 4.0, np.nan, np.nan], [2.0, 6.0, np.nan, 1.0]]
+    )
+    assert group_mean(np.zeros((0, 5)), groups, 4).shape == (0, 4)
+
+
+def test_interp_rows():
+    x = np.array([-1.0, 0.0, 0.5, 2.0, 3.0])
+    xp = np.array([0.0, 1.0, 2.0])
+    fp = np.array([[0.0, 1.0, 4.0], [1.0, np.nan, 3.0]])
+    result = interp_rows(x, xp, fp, use_numba=False)
+    for i in range(fp.shape[0]):
+        expected = np.interp(x, xp, fp[i], left=np.nan, right=np.nan)
+        np.testing.assert_array_equal(result[i], expected)
+
+
+def test_numba_kernels():
+    pytest.importorskip("numba")
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(4, 200))
+    values[values > 1.5] = np.nan
+    groups = np.sort(rng.integers(0, 30, 200))
+    np.testing.assert_allclose(
+        group_mean(values, groups, 30, use_numba=True),
+        group_mean(values, groups, 30, use_numba=False),
+        equal_nan=True,
+    )
+
+    xp = np.sort(rng.uniform(0, 10000, 50))
+    fp = rng.normal(size=(4, 50))
+    fp[fp > 1.5] = np.nan
+    x = np.linspace(-500, 10500, 300)
+    np.testing.assert_array_equal(
+        interp_rows(x, xp, fp, use_numba=True),
+        interp_rows(x, xp, fp, use_numba=False),
+    )
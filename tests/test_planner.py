@@ -0,0 +1,91 @@
+from radclss.core import calibrate_plan, compare_plan, plan_radclss
+from radclss.util import FileCostModel
+
+
+def test_plan_radclss(tmp_path, synthetic_site_dict, write_synthetic_volumes):
+    files = write_synthetic_volumes(ngates=(60,) * 4, rays_per_sweep=90)
+    volumes = {"date": "20250619", "radar_csapr2": files, "sonde": None}
+
+    # Cheap files on a single worker are processed serially
+    plan = plan_radclss(volumes, synthetic_site_dict, nexrad=False, max_workers=1)
+    assert plan["radars"]["radar_csapr2"]["nfiles"] == 4
+    assert plan["nexrad_columns"] == 0
+    assert plan["stage_seconds"]["nexrad"] == 0
+    assert plan["recommendation"]["serial"]
+    assert plan["recommendation"]["n_workers"] == 1
+    assert not plan["recommendation"]["batch_volumes"]
+
+    # Expensive files are spread over the workers
+    cost_model = FileCostModel(
+        coefficients={
+            "intercept": 120.0,
+            "size_mb": 0,
+            "gate_values_m": 0,
+            "nsweeps": 0,
+        }
+    )
+    plan = plan_radclss(
+        volumes,
+        synthetic_site_dict,
+        nexrad=True,
+        cost_model=cost_model,
+        max_workers=4,
+        memory_limit=int(64e9),
+    )
+    assert plan["time_coords"] == "radar_csapr2"
+    assert plan["nexrad_columns"] == 4
+    assert plan["stage_seconds"]["radar_extraction"] == 480.0
+    assert plan["parallel_seconds"] < plan["serial_seconds"]
+    assert not plan["recommendation"]["serial"]
+    assert plan["recommendation"]["n_workers"] == 4
+    assert plan["recommendation"]["memory_budget"] is None
+    assert not plan["recommendation"]["batch_volumes"]
+
+    # Several volumes per parallel task are batched
+    plan = plan_radclss(
+        volumes,
+        synthetic_site_dict,
+        nexrad=False,
+        cost_model=cost_model,
+        max_workers=2,
+        memory_limit=int(64e9),
+        tasks_per_worker=1,
+    )
+    assert not plan["recommendation"]["serial"]
+    assert plan["recommendation"]["batch_volumes"]
+
+    # A small memory limit limits the workers and sets a memory budget
+    plan = plan_radclss(
+        volumes,
+        synthetic_site_dict,
+        cost_model=cost_model,
+        max_workers=4,
+        memory_limit=int(1e9),
+        coefficients={"worker_memory_factor": 500.0},
+    )
+    assert plan["recommendation"]["n_workers"] < 4
+    assert plan["recommendation"]["memory_budget"] is not None
+
+
+def test_compare_plan(tmp_path, synthetic_site_dict, write_synthetic_volumes):
+    files = write_synthetic_volumes(ngates=(60,) * 2, rays_per_sweep=90)
+    volumes = {"date": "20250619", "radar_csapr2": files}
+    plan = plan_radclss(volumes, synthetic_site_dict, max_workers=1)
+    metrics = {
+        "stage_seconds": {
+            "radar_extraction": 1.0,
+            "nexrad": 2 * plan["stage_seconds"]["nexrad"],
+            "assembly": plan["stage_seconds"]["assembly"],
+        },
+        "total_seconds": 10.0,
+        "peak_memory": None,
+    }
+    comparison = compare_plan(plan, metrics)
+    assert comparison["nexrad"]["ratio"] == 2.0
+    assert comparison["assembly"]["ratio"] == 1.0
+    assert comparison["insitu"]["actual"] is None
+    assert comparison["client_memory"]["ratio"] is None
+
+    coefficients = calibrate_plan(plan, metrics, weight=1.0)
+    assert coefficients["nexrad_seconds_per_column"] == 12.0
+    assert coefficients["assembly_seconds"] == 2.0
@@ -0,0 +1,55 @@
+import json
+import os
+
+from radclss.util import RunProfiler, get_profile_paths
+from radclss.util.profiling import _accumulate_profile
+
+
+def read_radar(n):
+    return sum(range(n))
+
+
+def test_get_profile_paths():
+    html, json_path = get_profile_paths("/data/bnf-radclss.c2.20250619.000000.nc")
+    assert html == "/data/bnf-radclss.c2.20250619.000000.profile.html"
+    assert json_path == "/data/bnf-radclss.c2.20250619.000000.profile.json"
+
+
+def test_run_profiler_serial(tmp_path):
+    filename = os.path.join(tmp_path, "radclss.nc")
+    with RunProfiler(filename) as profiler:
+        read_radar(100000)
+
+    summary = profiler.summary
+    assert summary["mode"] == "serial"
+    assert summary["phases"]["read"] > 0
+    assert summary["phases"]["packing"] == 0
+    assert any(f["name"] == "read_radar" for f in summary["functions"])
+    with open(get_profile_paths(filename)[1]) as fi:
+        assert json.load(fi)["phases"] == summary["phases"]
+
+
+def test_accumulate_profile():
+    def node(name, count, children=()):
+        return {
+            "description": {"filename": "a.py", "line_number": 1, "name": name},
+            "count": count,
+            "children": {str(i): child for i, child in enumerate(children)},
+        }
+
+    tree = {
+        "count": 10,
+        "children": {
+            "0": node(
+                "_extract_site_columns",
+                8,
+                [node("pack_variables", 2), node("_extract_site_columns", 3)],
+            )
+        },
+    }
+    functions = {}
+    _accumulate_profile(tree, functions, 0.01)
+    seconds = {f["name"]: f["seconds"] for f in functions.values()}
+    # Recursive calls are only counted once
+    assert abs(seconds["_extract_site_columns"] - 0.08) < 1e-9
+    assert abs(seconds["pack_variables"] - 0.02) < 1e-9
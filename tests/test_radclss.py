@@ -2,11 +2,16 @@ import radclss
 import arm_test_data
 import os
 import glob
+import json
+import datetime
 import xarray as xr
 import act
 import numpy as np
+import pytest
 
+from unittest.mock import patch
 from distributed import Client, LocalCluster
+from distributed.core import Status
 
 
 def test_radclss_serial():
@@ -984,3 +989,269 @@ def test_match_datasets_act():
     assert matched_ds_mean.dims["time"] == radclss_ds.dims["time"]
     assert matched_ds_skip.dims["time"] == radclss_ds.dims["time"]
     assert matched_ds_sum.dims["time"] == radclss_ds.dims["time"]
+
+
+def _write_dod(path):
+    # A radclss DOD holding the variables of the synthetic run, with the
+    # radar velocity stored as scaled integers
+    def var(name, dims, dtype="float", **atts):
+        atts = [{"name": key, "value": value} for key, value in atts.items()]
+        return {"name": name, "type": dtype, "dims": dims, "atts": atts}
+
+    column = ["time", "station", "height"]
+    variables = [
+        var("base_time", [], "int"),
+        var("time_offset", ["time"], "double"),
+        var("time", ["time"], "double"),
+        var("station", ["station"], "char"),
+        var("height", ["height"]),
+        var("lat", ["station"]),
+        var("lon", ["station"]),
+        var("alt", ["station"]),
+        var("csapr2_reflectivity", column, _FillValue=-9999.0),
+        var("csapr2_velocity", column, "short", _FillValue=-32768, scale_factor=0.01),
+        var("nexrad_reflectivity", column, _FillValue=-9999.0),
+        var("temp_mean", ["time", "station"], missing_value=-9999.0),
+    ]
+    dims = [{"name": name, "length": 0} for name in ["time", "station", "height"]]
+    dod = {"versions": {"1.0": {"atts": [], "dims": dims, "vars": variables}}}
+    with open(path, "w") as fi:
+        json.dump(dod, fi)
+    return str(path)
+
+
+def _read_synthetic_nexrad(path, make_volume):
+    # The NEXRAD volumes are synthetic volumes at the time of the file name
+    scan_time = datetime.datetime.strptime(path.split("/")[-1], "KHTX%Y%m%d_%H%M%S_V06")
+    radar = make_volume()
+    radar.time["units"] = f"seconds since {scan_time:%Y-%m-%dT%H:%M:%S}Z"
+    return radar
+
+
+def _patch_dod(dod_path):
+    # Serve the output DOD from a local file
+    get_dod_variables = radclss.util.dod_utils.get_dod_variables
+    create_ds_from_arm_dod = act.io.create_ds_from_arm_dod
+    patch(
+        "radclss.core.radclss_core.get_dod_variables",
+        side_effect=lambda process, version="": get_dod_variables(
+            dod_path, version, local_file=True
+        ),
+    ).start()
+    patch(
+        "radclss.core.radclss_core.act.io.create_ds_from_arm_dod",
+        side_effect=lambda process, dims, version="": create_ds_from_arm_dod(
+            dod_path, dims, version=version, local_file=True
+        ),
+    ).start()
+
+
+def _patch_nexrad_archive(keys, make_volume):
+    # Serve the listing and the volumes of the NEXRAD archive in the calling
+    # process, which is either the client or a Dask worker
+    s3_client = patch("radclss.util.column_utils.boto3.client").start()
+    s3_client.return_value.list_objects_v2.return_value = {"Contents": keys}
+    patch(
+        "radclss.util.column_utils.pyart.io.read_nexrad_archive",
+        side_effect=lambda path, include_fields=None: _read_synthetic_nexrad(
+            path, make_volume
+        ),
+    ).start()
+
+
+def test_radclss_synthetic(
+    tmp_path,
+    synthetic_site_dict,
+    synthetic_volume,
+    write_synthetic_volumes,
+    write_synthetic_insitu,
+):
+    """
+    Run RadCLss end to end on synthetic radar and in-situ files, in serial
+    and parallel mode, with the DOD and the NEXRAD archive mocked. The
+    NEXRAD volumes are the synthetic radar volumes.
+    """
+    radar_dir = tmp_path / "testcsapr2.a1"
+    radar_dir.mkdir()
+    radar_files = write_synthetic_volumes(
+        ngates=(120,) * 4, datastream="testcsapr2.a1", directory=radar_dir
+    )
+    volumes = {"date": "20250619", "radar_csapr2": radar_files, "sonde": None}
+    for site in ["M1", "S2"]:
+        volumes[f"met_{site}"] = [
+            write_synthetic_insitu(
+                tmp_path / f"testmet{site}.b1.20250619.110000.nc",
+                "2025-06-19T11:00",
+                "2025-06-19T13:00",
+                interval=1,
+            )
+        ]
+    catalog = str(tmp_path / "catalog.sqlite")
+    with radclss.io.FileCatalog(catalog) as file_catalog:
+        file_catalog.scan(str(radar_dir))
+
+    dod_path = _write_dod(tmp_path / "radclss.c2.json")
+
+    nexrad_keys = [
+        {"Key": f"2025/06/19/KHTX/KHTX20250619_12{minute:02d}00_V06"}
+        for minute in range(0, 30, 5)
+    ]
+
+    # Prefetching in serial mode needs a thread-safe HDF5
+    runs = {
+        "serial": dict(serial=True, prefetch_insitu=False),
+        "batched": dict(serial=True, prefetch_insitu=False, batch_volumes=True),
+        "parallel": dict(serial=False, prefetch_insitu=True, batch_volumes=True),
+        "auto": dict(serial="auto", prefetch_insitu=False),
+    }
+    results = {}
+    all_metrics = {}
+    all_events = {}
+    with (
+        LocalCluster(n_workers=2, threads_per_worker=1) as cluster,
+        Client(cluster) as client,
+    ):
+        _patch_dod(dod_path)
+        _patch_nexrad_archive(nexrad_keys, synthetic_volume)
+        try:
+            for mode, options in runs.items():
+                # The workers are restarted at the end of each run
+                client.run(_patch_nexrad_archive, nexrad_keys, synthetic_volume)
+                metrics = {}
+                events = []
+                results[mode] = radclss.core.radclss(
+                    volumes,
+                    synthetic_site_dict,
+                    "radar_csapr2",
+                    current_client=client,
+                    metrics=metrics,
+                    callbacks=events.append,
+                    profile=str(tmp_path / f"{mode}.nc"),
+                    memory_budget="1B",
+                    column_cache=str(tmp_path / f"{mode}_columns"),
+                    catalog=catalog,
+                    **options,
+                )
+                all_metrics[mode] = metrics
+                all_events[mode] = events
+        finally:
+            patch.stopall()
+
+    for mode, ds in results.items():
+        metrics = all_metrics[mode]
+        assert ds.sizes == {"time": 4, "station": 3, "height": 32}
+        assert list(ds["station"].values) == list(synthetic_site_dict)
+        assert (ds["csapr2_reflectivity"] != -9999.0).any()
+        assert (ds["csapr2_velocity"] != -9999.0).any()
+        # The NEXRAD volumes are the radar volumes, without the rounding of
+        # the geometry written to the radar files
+        np.testing.assert_allclose(
+            ds["nexrad_reflectivity"], ds["csapr2_reflectivity"], atol=0.01
+        )
+        # The met data is at M1 and S2 only
+        temp_mean = ds["temp_mean"].sel(station=["M1", "S2"])
+        assert ((temp_mean > 10) & (temp_mean < 20)).all()
+        assert (ds["temp_mean"].sel(station="S3") == -9999.0).all()
+
+        assert metrics["scan_types"]["radar_csapr2"] == {"ppi": 4}
+        assert metrics["spilled_bytes"] > 0
+        prefetched = ["met"] if runs[mode]["prefetch_insitu"] else []
+        assert metrics["prefetched_insitu"] == prefetched
+        assert "plan" in metrics and "plan_comparison" in metrics
+        assert os.path.exists(str(tmp_path / f"{mode}.profile.json"))
+        assert not metrics["profile"]["failed"]
+        assert len(os.listdir(tmp_path / f"{mode}_columns")) > 0
+
+        stages = {
+            event.stage for event in all_events[mode] if event.kind == "stage_finished"
+        }
+        assert {"radar_extraction", "nexrad", "assembly", "insitu"} <= stages
+        assert not any(event.kind == "task_failed" for event in all_events[mode])
+        xr.testing.assert_allclose(ds, results["serial"])
+
+
+def test_radclss_auto_cluster_closed(
+    tmp_path, synthetic_site_dict, write_synthetic_volumes
+):
+    """
+    The cluster started in auto mode is closed when the run fails.
+    """
+    files = write_synthetic_volumes(ngates=(60,) * 2, rays_per_sweep=90)
+    volumes = {"date": "20250619", "radar_csapr2": files, "sonde": None}
+    plan = {
+        "serial_seconds": 10.0,
+        "parallel_seconds": 5.0,
+        "client_memory": 0.0,
+        "recommendation": {
+            "serial": False,
+            "n_workers": 1,
+            "batch_volumes": False,
+            "tasks_per_worker": 4,
+            "memory_budget": None,
+        },
+    }
+    clusters = []
+
+    def local_cluster(**kwargs):
+        clusters.append(LocalCluster(processes=False, **kwargs))
+        return clusters[-1]
+
+    with (
+        patch("radclss.core.radclss_core.plan_radclss", return_value=plan),
+        patch("radclss.core.radclss_core.LocalCluster", side_effect=local_cluster),
+        patch(
+            "radclss.core.radclss_core._filter_radar_files",
+            side_effect=RuntimeError("unreadable"),
+        ),
+    ):
+        with pytest.raises(RuntimeError, match="unreadable"):
+            radclss.core.radclss(
+                volumes,
+                synthetic_site_dict,
+                "radar_csapr2",
+                serial="auto",
+                use_dod_allowlist=False,
+                pack_columns=False,
+            )
+    assert len(clusters) == 1
+    assert clusters[0].status == Status.closed
+
+
+def test_radclss_serial_reads_headers_once(
+    tmp_path, synthetic_site_dict, synthetic_volume, write_synthetic_volumes
+):
+    """
+    In serial mode the header read to classify each radar file is reused to
+    record its cost.
+    """
+    files = write_synthetic_volumes(
+        ngates=(60,) * 3, rays_per_sweep=90, datastream="testcsapr2.a1"
+    )
+    volumes = {"date": "20250619", "radar_csapr2": files, "sonde": None}
+    nexrad_keys = [
+        {"Key": f"2025/06/19/KHTX/KHTX20250619_12{minute:02d}00_V06"}
+        for minute in range(0, 15, 5)
+    ]
+    cost_model = radclss.util.FileCostModel()
+    try:
+        _patch_dod(_write_dod(tmp_path / "radclss.c2.json"))
+        _patch_nexrad_archive(nexrad_keys, synthetic_volume)
+        with patch(
+            "radclss.util.scheduling.read_radar_header",
+            wraps=radclss.io.read_radar_header,
+        ) as read_header:
+            ds = radclss.core.radclss(
+                volumes,
+                synthetic_site_dict,
+                "radar_csapr2",
+                serial=True,
+                cost_model=cost_model,
+                use_dod_allowlist=False,
+                pack_columns=False,
+                prefetch_insitu=False,
+            )
+    finally:
+        patch.stopall()
+    assert ds.sizes["time"] == len(files)
+    assert len(cost_model.history) == len(files)
+    assert sorted(x.args[0] for x in read_header.call_args_list) == sorted(files)
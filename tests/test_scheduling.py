@@ -0,0 +1,34 @@
+import numpy as np
+import radclss
+
+
+def test_file_cost_model(tmp_path, write_empty_radar):
+    small = write_empty_radar("small.nc", 20, 36, 1)
+    large = write_empty_radar("large.nc", 200, 360, 6)
+    model = radclss.util.FileCostModel()
+    assert model.estimate(large) > model.estimate(small)
+
+    # Recorded costs proportional to number of sweeps should be learned
+    for _ in range(3):
+        model.record(small, 1.0)
+        model.record(large, 6.0)
+    assert np.isclose(model.estimate(small), 1.0, atol=1e-6)
+    assert np.isclose(model.estimate(large), 6.0, atol=1e-6)
+    assert all(v >= 0 for v in model.coefficients.values())
+
+    model.save(str(tmp_path / "model.json"))
+    loaded = radclss.util.FileCostModel.load(str(tmp_path / "model.json"))
+    assert loaded.coefficients == model.coefficients
+    assert len(loaded.history) == 6
+
+
+def test_schedule_files(tmp_path, write_empty_radar):
+    files = [write_empty_radar(f"small{i}.nc", 20, 36, 1) for i in range(8)]
+    files.append(write_empty_radar("large.nc", 500, 360, 8))
+    batches = radclss.util.schedule_files(files, n_workers=2)
+
+    # Every file is scheduled exactly once and the largest file goes first
+    assert sorted(f for batch in batches for f in batch) == sorted(files)
+    assert batches[0] == [files[-1]]
+    # Small files are grouped together
+    assert len(batches) < len(files)
@@ -0,0 +1,119 @@
+import os
+import tracemalloc
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+from radclss.util.spill import ColumnStore, enforce_memory_budget
+
+
+def _make_column(i):
+    ds = xr.Dataset(
+        {
+            "reflectivity": (
+                ("station", "height"),
+                np.full((2, 4), float(i)),
+                {"units": "dBZ", "_FillValue": -9999.0},
+            ),
+            "velocity": (("station", "height"), np.full((2, 4), np.nan, "float32")),
+            "time_offset": (
+                ("station", "height"),
+                np.full((2, 4), i, "timedelta64[s]"),
+                {"units": "s"},
+            ),
+            "base_time": (
+                "station",
+                np.full(2, "2025-06-19T12:00:00", "datetime64[s]"),
+            ),
+        },
+        coords={"station": ["M1", "S2"], "height": np.arange(500, 1500, 250)},
+        attrs={"azimuth": "38.77 degrees"},
+    )
+    return ds
+
+
+def test_column_store(tmp_path):
+    store = ColumnStore(scratch_dir=str(tmp_path))
+    columns = [_make_column(i) for i in range(3)]
+    for ds in columns:
+        store.append(ds)
+    store.append(None)
+    assert store.nbytes == sum(ds.nbytes for ds in columns)
+
+    assert store.spill() == sum(ds.nbytes for ds in columns)
+    assert store.nbytes == 0
+    assert store.nspilled == 3
+    assert len(store) == 4
+
+    loaded = list(store)
+    assert loaded[-1] is None
+    for ds, expected in zip(loaded[:-1], columns):
+        xr.testing.assert_identical(ds.load(), expected)
+    xr.testing.assert_identical(
+        xr.concat(loaded[:-1], dim="time"), xr.concat(columns, dim="time")
+    )
+    # The spilled files are only opened once
+    assert all(a is b for a, b in zip(list(store)[:-1], loaded[:-1]))
+
+    # Columns added after a spill are counted on their own
+    extra = _make_column(3)
+    store.append(extra)
+    assert store.nbytes == extra.nbytes
+    assert store.spill() == extra.nbytes
+    assert store.nspilled == 4
+
+    store.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_enforce_memory_budget(tmp_path):
+    small = ColumnStore(scratch_dir=str(tmp_path))
+    large = ColumnStore(scratch_dir=str(tmp_path))
+    small.append(_make_column(0))
+    for i in range(3):
+        large.append(_make_column(i))
+
+    assert enforce_memory_budget([small, large], None) == 0
+    budget = small.nbytes + large.nbytes
+    assert enforce_memory_budget([small, large], budget) == 0
+
+    # Only the largest store needs to be spilled to fit in the budget
+    spilled = enforce_memory_budget([small, large], f"{budget - 1}B")
+    assert spilled > 0
+    assert large.nspilled == 3
+    assert small.nspilled == 0
+
+    small.close()
+    large.close()
+
+
+def test_column_store_concat(tmp_path):
+    store = ColumnStore(scratch_dir=str(tmp_path))
+    columns = []
+    for i in range(20):
+        ds = _make_column(i)
+        ds["reflectivity"] = (("station", "gate"), np.full((2, 20000), float(i)))
+        columns.append(ds)
+        store.append(ds)
+    store.append(None)
+    # A column in memory is concatenated with the spilled columns
+    store.spill()
+    store.append(columns[0])
+    expected = xr.concat(columns + [columns[0]], dim="time")
+
+    # The spilled columns are read one at a time into the assembled dataset
+    list(store)
+    tracemalloc.start()
+    try:
+        ds = store.concat("time")
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 1.5 * expected.nbytes
+    assert not isinstance(ds["reflectivity"].data, da.Array)
+    xr.testing.assert_identical(ds, expected)
+    assert store._opened == {}
+
+    store.close()
+    assert os.listdir(tmp_path) == []